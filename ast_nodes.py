@@ -0,0 +1,543 @@
+# AST nodes: Slotted node classes as a compact alternative to the parser's tuple nodes
+from main import (BINARY_OPERATORS, BREAK, Interpreter, add, contains_loop_exit, divide, list_length, str_split,
+                  vector_get_item)
+from values import PersistentVector, numeric_literal
+
+# Integer kind tags, one per node class
+(NUMBER, STRING, IDENTIFIER, UMINUS, ADD, SUB, MUL, DIV, GREATER, SMALLER, EQUAL, NOTEQUAL,
+ ARRAY, ARRAY_ACCESS, ARRAY_FUNCTION_CALL, FUNCTION_CALL, TUPLE,
+ ASSIGN, ARRAY_ASSIGN, AUG_ASSIGN, ARRAY_AUG_ASSIGN, IF, WHILE, FOR, PRINT,
+ INT_ADD, LIST_LENGTH, STR_SPLIT, VECTOR_GET_ITEM, GENERIC) = range(30)
+
+
+class Node:
+    __slots__ = ()
+    kind = GENERIC
+    tag = None      # first element of the equivalent tuple node
+    fields = ()
+
+    def __getitem__(self, index):
+        # Tuple-style access, so code written against the tuple nodes keeps working
+        if index == 0:
+            return self.tag
+        return getattr(self, self.fields[index - 1])
+
+    def __len__(self):
+        return len(self.fields) + 1
+
+    def __iter__(self):
+        yield self.tag
+        for field in self.fields:
+            yield getattr(self, field)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple(self) == tuple(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        values = ', '.join(repr(getattr(self, field)) for field in self.fields)
+        return f"{type(self).__name__}({values})"
+
+
+class Number(Node):
+    __slots__ = ('value',)
+    kind, tag, fields = NUMBER, 'NUMBER', ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class String(Node):
+    __slots__ = ('value',)
+    kind, tag, fields = STRING, 'STRING', ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Identifier(Node):
+    __slots__ = ('name',)
+    kind, tag, fields = IDENTIFIER, 'IDENTIFIER', ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class UnaryMinus(Node):
+    __slots__ = ('operand',)
+    kind, tag, fields = UMINUS, 'UMINUS', ('operand',)
+
+    def __init__(self, operand):
+        self.operand = operand
+
+
+class BinaryOperation(Node):
+    __slots__ = ('left', 'right')
+    fields = ('left', 'right')
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+
+class Add(BinaryOperation):
+    __slots__ = ()
+    kind, tag = ADD, '+'
+
+
+class Subtract(BinaryOperation):
+    __slots__ = ()
+    kind, tag = SUB, '-'
+
+
+class Multiply(BinaryOperation):
+    __slots__ = ()
+    kind, tag = MUL, '*'
+
+
+class Divide(BinaryOperation):
+    __slots__ = ()
+    kind, tag = DIV, '/'
+
+
+class Greater(BinaryOperation):
+    __slots__ = ()
+    kind, tag = GREATER, 'Greater'
+
+
+class Smaller(BinaryOperation):
+    __slots__ = ()
+    kind, tag = SMALLER, 'Smaller'
+
+
+class Equal(BinaryOperation):
+    __slots__ = ()
+    kind, tag = EQUAL, 'EQUAL'
+
+
+class NotEqual(BinaryOperation):
+    __slots__ = ()
+    kind, tag = NOTEQUAL, 'NOTEQUAL'
+
+
+class Array(Node):
+    __slots__ = ('elements',)
+    kind, tag, fields = ARRAY, 'ARRAY', ('elements',)
+
+    def __init__(self, elements):
+        self.elements = elements
+
+
+class ArrayAccess(Node):
+    __slots__ = ('array', 'index')
+    kind, tag, fields = ARRAY_ACCESS, 'ARRAY_ACCESS', ('array', 'index')
+
+    def __init__(self, array, index):
+        self.array = array
+        self.index = index
+
+
+class ArrayFunctionCall(Node):
+    __slots__ = ('name', 'args')
+    kind, tag, fields = ARRAY_FUNCTION_CALL, 'ARRAY_FUNCTION_CALL', ('name', 'args')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+
+class FunctionCall(Node):
+    __slots__ = ('name', 'args')
+    kind, tag, fields = FUNCTION_CALL, 'FUNCTION_CALL', ('name', 'args')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+
+class Tuple(Node):
+    __slots__ = ('elements',)
+    kind, tag, fields = TUPLE, 'TUPLE', ('elements',)
+
+    def __init__(self, elements):
+        self.elements = elements
+
+
+class Assign(Node):
+    __slots__ = ('name', 'value')
+    kind, tag, fields = ASSIGN, 'ASSIGN', ('name', 'value')
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class ArrayAssign(Node):
+    __slots__ = ('name', 'index', 'value')
+    kind, tag, fields = ARRAY_ASSIGN, 'ARRAY_ASSIGN', ('name', 'index', 'value')
+
+    def __init__(self, name, index, value):
+        self.name = name
+        self.index = index
+        self.value = value
+
+
+class AugAssign(Node):
+    __slots__ = ('name', 'operator', 'value')
+    kind, tag, fields = AUG_ASSIGN, 'AUG_ASSIGN', ('name', 'operator', 'value')
+
+    def __init__(self, name, operator, value):
+        self.name = name
+        self.operator = operator
+        self.value = value
+
+
+class ArrayAugAssign(Node):
+    __slots__ = ('name', 'index', 'operator', 'value')
+    kind, tag, fields = ARRAY_AUG_ASSIGN, 'ARRAY_AUG_ASSIGN', ('name', 'index', 'operator', 'value')
+
+    def __init__(self, name, index, operator, value):
+        self.name = name
+        self.index = index
+        self.operator = operator
+        self.value = value
+
+
+# If, While and For each have an Exiting subclass, which from_tuple picks when their
+# blocks break or continue the loop around them (see contains_loop_exit). Blocks of the
+# plain classes run without checking for either; exits is a class attribute, so it costs
+# no space in each node.
+
+class If(Node):
+    __slots__ = ('condition', 'body', 'else_body')
+    kind, tag, fields = IF, 'IF', ('condition', 'body', 'else_body')
+    exits = False
+
+    def __init__(self, condition, body, else_body):
+        self.condition = condition
+        self.body = body
+        self.else_body = else_body
+
+
+class While(Node):
+    __slots__ = ('condition', 'body')
+    kind, tag, fields = WHILE, 'WHILE', ('condition', 'body')
+    exits = False
+
+    def __init__(self, condition, body):
+        self.condition = condition
+        self.body = body
+
+
+class For(Node):
+    __slots__ = ('variable', 'iterable', 'body')
+    kind, tag, fields = FOR, 'FOR', ('variable', 'iterable', 'body')
+    exits = False
+
+    def __init__(self, variable, iterable, body):
+        self.variable = variable
+        self.iterable = iterable
+        self.body = body
+
+
+class ExitingIf(If):
+    __slots__ = ()
+    exits = True
+
+
+class ExitingWhile(While):
+    __slots__ = ()
+    exits = True
+
+
+class ExitingFor(For):
+    __slots__ = ()
+    exits = True
+
+
+class Print(Node):
+    __slots__ = ('value',)
+    kind, tag, fields = PRINT, 'PRINT', ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+# Nodes of the optimizer's types pass
+
+class IntAdd(BinaryOperation):
+    __slots__ = ()
+    kind, tag = INT_ADD, 'INT_ADD'
+
+
+class ListLength(Node):
+    __slots__ = ('array',)
+    kind, tag, fields = LIST_LENGTH, 'LIST_LENGTH', ('array',)
+
+    def __init__(self, array):
+        self.array = array
+
+
+class StrSplit(Node):
+    __slots__ = ('string', 'delimiter')
+    kind, tag, fields = STR_SPLIT, 'STR_SPLIT', ('string', 'delimiter')
+
+    def __init__(self, string, delimiter):
+        self.string = string
+        self.delimiter = delimiter
+
+
+class VectorGetItem(Node):
+    __slots__ = ('vector', 'index')
+    kind, tag, fields = VECTOR_GET_ITEM, 'VECTOR_GET_ITEM', ('vector', 'index')
+
+    def __init__(self, vector, index):
+        self.vector = vector
+        self.index = index
+
+
+class Generic(Node):
+    # Any tuple node without a dedicated class; keeps its tag and items as they are
+    __slots__ = ('tag', 'items')
+    kind = GENERIC
+
+    def __init__(self, tag, *items):
+        self.tag = tag
+        self.items = items
+
+    def __getitem__(self, index):
+        if index == 0:
+            return self.tag
+        return self.items[index - 1]
+
+    def __len__(self):
+        return len(self.items) + 1
+
+    def __iter__(self):
+        yield self.tag
+        yield from self.items
+
+    def __repr__(self):
+        return f"Generic({', '.join(map(repr, (self.tag,) + self.items))})"
+
+
+NODE_CLASSES = {cls.tag: cls for cls in (
+    Number, String, Identifier, UnaryMinus, Add, Subtract, Multiply, Divide,
+    Greater, Smaller, Equal, NotEqual, Array, ArrayAccess, ArrayFunctionCall,
+    FunctionCall, Tuple, Assign, ArrayAssign, AugAssign, ArrayAugAssign, If, While, For, Print,
+    IntAdd, ListLength, StrSplit, VectorGetItem,
+)}
+EXITING_CLASSES = {If: ExitingIf, While: ExitingWhile, For: ExitingFor}
+KIND_NAMES = ['GENERIC'] * (GENERIC + 1)
+for _cls in NODE_CLASSES.values():
+    KIND_NAMES[_cls.kind] = _cls.tag
+
+
+def from_tuple(node):
+    # Converts a tuple node (or a list of them) produced by Parser into node objects
+    if isinstance(node, list):
+        return [from_tuple(item) for item in node]
+    if not isinstance(node, tuple) or not node or not isinstance(node[0], str):
+        return node
+    items = [from_tuple(item) if isinstance(item, (tuple, list)) else item for item in node[1:]]
+    cls = NODE_CLASSES.get(node[0])
+    if cls is None:
+        return Generic(node[0], *items)
+    if cls in EXITING_CLASSES and any(contains_loop_exit(item) for item in items if isinstance(item, list)):
+        cls = EXITING_CLASSES[cls]
+    return cls(*items)
+
+
+def to_tuple(node):
+    # Converts node objects (or a list of them) back into the parser's tuple form
+    if isinstance(node, list):
+        return [to_tuple(item) for item in node]
+    if not isinstance(node, Node):
+        return node
+    return tuple(to_tuple(item) if isinstance(item, (Node, list)) else item for item in node)
+
+
+class NodeVisitor:
+    # Dispatches on node.kind through a list of bound methods, so visiting a node costs
+    # one list index instead of a chain of string comparisons. Subclasses define
+    # visit_<TAG> methods, with non-identifier tags spelled as in KIND_METHODS.
+    KIND_METHODS = {'+': 'ADD', '-': 'SUB', '*': 'MUL', '/': 'DIV'}
+
+    def __init__(self):
+        self.dispatch = []
+        for name in KIND_NAMES:
+            method = 'visit_' + self.KIND_METHODS.get(name, name)
+            self.dispatch.append(getattr(self, method, self.generic_visit))
+
+    def visit(self, node):
+        return self.dispatch[node.kind](node)
+
+    def generic_visit(self, node):
+        for item in node:
+            if isinstance(item, Node):
+                self.visit(item)
+            elif isinstance(item, list):
+                for child in item:
+                    if isinstance(child, Node):
+                        self.visit(child)
+
+
+# NodeInterpreter: Executes a tree of node objects through NodeVisitor dispatch
+class NodeInterpreter(Interpreter, NodeVisitor):
+    def __init__(self, syntax_tree):
+        Interpreter.__init__(self, syntax_tree)
+        NodeVisitor.__init__(self)
+
+    def evaluate_statement(self, statement):
+        return self.dispatch[statement.kind](statement)
+
+    def evaluate_expression(self, expression):
+        return self.dispatch[expression.kind](expression)
+
+    def generic_visit(self, node):
+        # Kinds without a visitor below fall back to the tuple-style implementation,
+        # which reads the node through Node.__getitem__
+        handler = self.statement_handlers.get(node.tag)
+        if handler is not None:
+            return handler(self, node)
+        return Interpreter.evaluate_expression(self, node)
+
+    def visit_NUMBER(self, node):
+        return node.value
+
+    def visit_STRING(self, node):
+        return node.value
+
+    def visit_IDENTIFIER(self, node):
+        return self.variables[node.name]
+
+    def visit_UMINUS(self, node):
+        operand = node.operand
+        return -self.dispatch[operand.kind](operand)
+
+    # The visitors below index self.dispatch directly instead of going through visit(),
+    # which saves one Python call per child node
+
+    def visit_ADD(self, node):
+        dispatch, left, right = self.dispatch, node.left, node.right
+        return add(dispatch[left.kind](left), dispatch[right.kind](right))
+
+    def visit_SUB(self, node):
+        dispatch, left, right = self.dispatch, node.left, node.right
+        return dispatch[left.kind](left) - dispatch[right.kind](right)
+
+    def visit_MUL(self, node):
+        dispatch, left, right = self.dispatch, node.left, node.right
+        return dispatch[left.kind](left) * dispatch[right.kind](right)
+
+    def visit_DIV(self, node):
+        dispatch, left, right = self.dispatch, node.left, node.right
+        return divide(dispatch[left.kind](left), dispatch[right.kind](right))
+
+    def visit_Greater(self, node):
+        dispatch, left, right = self.dispatch, node.left, node.right
+        return dispatch[left.kind](left) > dispatch[right.kind](right)
+
+    def visit_Smaller(self, node):
+        dispatch, left, right = self.dispatch, node.left, node.right
+        return dispatch[left.kind](left) < dispatch[right.kind](right)
+
+    def visit_EQUAL(self, node):
+        dispatch, left, right = self.dispatch, node.left, node.right
+        return dispatch[left.kind](left) == dispatch[right.kind](right)
+
+    def visit_NOTEQUAL(self, node):
+        dispatch, left, right = self.dispatch, node.left, node.right
+        return dispatch[left.kind](left) != dispatch[right.kind](right)
+
+    def visit_ARRAY(self, node):
+        elements = [self.visit(element) for element in node.elements]
+        if self.numeric_arrays:
+            return numeric_literal(elements)
+        return elements
+
+    def visit_TUPLE(self, node):
+        return PersistentVector([self.visit(element) for element in node.elements])
+
+    def visit_ARRAY_ACCESS(self, node):
+        return self.evaluate_array_access(node)
+
+    def visit_FUNCTION_CALL(self, node):
+        handler = self.builtins.get(node.name)
+        if handler is None:
+            function = self.lookup_function(node.name)
+            return self.call_function(function, [self.visit(arg) for arg in node.args])
+        return handler(self, node.args)
+
+    def visit_ASSIGN(self, node):
+        value = node.value
+        self.variables[node.name] = self.dispatch[value.kind](value)
+
+    def visit_ARRAY_ASSIGN(self, node):
+        self.evaluate_array_assignment(node)
+
+    def visit_AUG_ASSIGN(self, node):
+        variables, name, value = self.variables, node.name, node.value
+        current = variables[name]
+        variables[name] = BINARY_OPERATORS[node.operator](current, self.dispatch[value.kind](value))
+
+    def visit_ARRAY_AUG_ASSIGN(self, node):
+        self.evaluate_array_augmented_assignment(node)
+
+    def visit_IF(self, node):
+        dispatch, condition = self.dispatch, node.condition
+        block = node.body if dispatch[condition.kind](condition) else node.else_body
+        if node.exits:
+            return self.execute_block(block)
+        for statement in block:
+            dispatch[statement.kind](statement)
+
+    def visit_WHILE(self, node):
+        dispatch, condition, body = self.dispatch, node.condition, node.body
+        condition_handler = dispatch[condition.kind]
+        if node.exits:
+            execute_block = self.execute_block
+            while condition_handler(condition):
+                if execute_block(body) is BREAK:
+                    break
+            return
+        while condition_handler(condition):
+            for statement in body:
+                dispatch[statement.kind](statement)
+
+    def visit_FOR(self, node):
+        dispatch, variables, variable, body = self.dispatch, self.variables, node.variable, node.body
+        if node.exits:
+            execute_block = self.execute_block
+            for value in self.visit(node.iterable):
+                variables[variable] = value
+                if execute_block(body) is BREAK:
+                    break
+            return
+        for value in self.visit(node.iterable):
+            variables[variable] = value
+            for statement in body:
+                dispatch[statement.kind](statement)
+
+    def visit_PRINT(self, node):
+        print(self.visit(node.value))
+
+    def visit_INT_ADD(self, node):
+        dispatch, left, right = self.dispatch, node.left, node.right
+        left = dispatch[left.kind](left)
+        right = dispatch[right.kind](right)
+        if left.__class__ is right.__class__ is int:
+            return left + right
+        return add(left, right)
+
+    def visit_LIST_LENGTH(self, node):
+        return list_length(self.visit(node.array))
+
+    def visit_STR_SPLIT(self, node):
+        string = self.visit(node.string)
+        return str_split(string, self.visit(node.delimiter))
+
+    def visit_VECTOR_GET_ITEM(self, node):
+        tuple_value = self.visit(node.vector)
+        return vector_get_item(tuple_value, self.visit(node.index))
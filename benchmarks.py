@@ -0,0 +1,558 @@
+# Benchmarks: throughput comparisons between interpreter components
+# Run all of them with `python benchmarks.py`, or a single one by name,
+# e.g. `python benchmarks.py lexer`.
+import contextlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from main import (DEMO_SOURCE, ENGINES, INTERPRETER_VERSION, Interpreter, Lexer, Parser, compile_source,
+                  create_interpreter, run_stream)
+
+# A loop-heavy script: arithmetic, comparisons, array reads and builtin calls
+LOOP_SOURCE = """
+total = 0;
+arr = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10];
+i = 0;
+while i < 100000 {
+    total = total + i * 2 - arr[i - i];
+    if total > 1000000 {
+        total = total + -1000000;
+    }
+    i = i + 1;
+}
+for j in range(0, 20000) {
+    total = total + max(j, 10);
+}
+print(total);
+"""
+
+# Short sources the two lexer engines must tokenize alike, for shapes the demo lacks
+LEXER_CASES = (
+    "x -= 10; x -=5; x-=10; y+=1; y*=2; y/=4;",
+    "a = b-5; c = -3; d = e - f;",
+)
+
+
+def demo_source():
+    # The demo program is a good mix of every token kind
+    return DEMO_SOURCE
+
+
+def parse(source):
+    return Parser(Lexer(source, engine='regex').tokenize()).parse()
+
+
+def best_of(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def allocated_by(function):
+    tracemalloc.start()
+    try:
+        result = function()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def peak_memory_of(function):
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+@contextlib.contextmanager
+def quiet():
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def bench_lexer(copies=200):
+    source = demo_source() * copies
+    size_mb = len(source) / (1024 * 1024)
+
+    for case in LEXER_CASES:
+        if Lexer(case, engine='regex').tokenize() != Lexer(case, engine='scan').tokenize():
+            raise AssertionError(f"regex engine produced a different token stream for {case!r}")
+    expected = Lexer(source, engine='scan').tokenize()
+    if Lexer(source, engine='regex').tokenize() != expected:
+        raise AssertionError("regex engine produced a different token stream")
+
+    print(f"Lexer: {size_mb:.2f} MB of source, {len(expected)} tokens")
+    results = {}
+    for engine in Lexer.ENGINES:
+        elapsed = best_of(lambda: Lexer(source, engine=engine).tokenize())
+        results[engine] = elapsed
+        print(f"  {engine:<6} {elapsed:8.3f}s  {size_mb / elapsed:8.2f} MB/s")
+    print(f"  speedup: {results['scan'] / results['regex']:.1f}x")
+
+
+def bench_token_stream(copies=200):
+    source = demo_source() * copies
+    tokens, list_size = allocated_by(lambda: Lexer(source, engine='regex').tokenize())
+    stream, stream_size = allocated_by(lambda: Lexer(source, engine='regex').tokenize_stream())
+
+    print(f"Token storage: {len(source) / 1024:.0f} KB of source, {len(tokens)} tokens")
+    print(f"  list of tuples {list_size / 1024:10.0f} KB")
+    print(f"  TokenStream    {stream_size / 1024:10.0f} KB  ({list_size / stream_size:.1f}x smaller)")
+
+    list_time = best_of(lambda: Parser(tokens).parse())
+    stream_time = best_of(lambda: Parser(stream).parse())
+    print(f"  parse from list   {list_time:8.3f}s (includes conversion to a TokenStream)")
+    print(f"  parse from stream {stream_time:8.3f}s")
+
+
+def bench_streaming(statements=20000):
+    lines = ["total = 0;", "count = 0;"]
+    for i in range(statements):
+        lines.append(f"total = total + {i};" if i % 2 else f"count = count + 1;")
+    lines.append("print(total);")
+    source = "\n".join(lines)
+
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as script:
+        script.write(source)
+    try:
+        def batch():
+            with open(script.name) as source_file:
+                tokens = Lexer(source_file.read(), engine='regex').tokenize()
+            Interpreter(Parser(tokens).parse()).evaluate()
+
+        def stream():
+            with open(script.name) as source_file:
+                run_stream(source_file)
+
+        with quiet():
+            batch_peak = peak_memory_of(batch)
+            stream_peak = peak_memory_of(stream)
+            batch_time = best_of(batch)
+            stream_time = best_of(stream)
+    finally:
+        os.unlink(script.name)
+
+    print(f"Streaming: {statements} top-level statements, {len(source) / 1024:.0f} KB of source")
+    print(f"  batch  peak {batch_peak / 1024:8.0f} KB  {batch_time:8.3f}s")
+    print(f"  stream peak {stream_peak / 1024:8.0f} KB  {stream_time:8.3f}s")
+
+
+def bench_ast_nodes(copies=200):
+    from ast_nodes import from_tuple
+
+    source = demo_source() * copies
+    tree, tuple_size = allocated_by(lambda: parse(source))
+    nodes, node_size = allocated_by(lambda: from_tuple(parse(source)))
+    print(f"AST memory: {len(tree)} statements")
+    print(f"  tuples {tuple_size / 1024:10.0f} KB")
+    print(f"  nodes  {node_size / 1024:10.0f} KB  ({tuple_size / node_size:.2f}x smaller)")
+
+    syntax_tree = parse(LOOP_SOURCE)
+    with quiet():
+        for engine in ('tree', 'nodes'):
+            elapsed = best_of(lambda: create_interpreter(syntax_tree, engine).evaluate())
+            print(f"  {engine:<6} loop script {elapsed:8.3f}s", file=sys.stderr)
+
+
+def bench_compile_cache(copies=200):
+    from compile_cache import CompileCache
+
+    source = demo_source() * copies
+    with tempfile.TemporaryDirectory() as directory:
+        cache = CompileCache(directory, INTERPRETER_VERSION)
+        cold = best_of(lambda: compile_source(source), repeat=1)
+        cache.load(source, compile_source)
+        warm = best_of(lambda: cache.load(source, compile_source))
+        stats = cache.stats()
+    print(f"Compile cache: {len(source) / 1024:.0f} KB of source, {stats['bytes'] / 1024:.0f} KB cached")
+    print(f"  cold (lex + parse) {cold:8.3f}s")
+    print(f"  warm (cache hit)   {warm:8.3f}s  ({cold / warm:.1f}x faster)")
+    print(f"  {stats}")
+
+
+def bench_builtin_dispatch(iterations=20000):
+    # Builtins listed in the order of the former if/elif chain, with cheap arguments, so
+    # the time per call shows whether lookup cost depends on the builtin's position
+    calls = [
+        ('power', 'power(2, 1)'),
+        ('min', 'min(2, 1)'),
+        ('length', 'length(arr)'),
+        ('split', 'split(s, ",")'),
+        ('Stringlength', 'Stringlength(s)'),
+        ('getItem', 'getItem(tup, 0)'),
+        ('tuplelength', 'tuplelength(tup)'),
+    ]
+    print(f"Builtin dispatch: {iterations} calls per builtin inside a while loop")
+    for name, call in calls:
+        source = f"""
+        arr = [1]; s = "a"; tup = ^1^; i = 0;
+        while i < {iterations} {{ x = {call}; i = i + 1; }}
+        """
+        syntax_tree = parse(source)
+        elapsed = best_of(lambda: Interpreter(syntax_tree).evaluate())
+        print(f"  {name:<13} {elapsed * 1e6 / iterations:6.2f} us per iteration")
+
+
+def bench_vm(terms=20000):
+    from vm import VMInterpreter
+
+    # A left-nested chain this long is beyond the reach of the recursive engines
+    syntax_tree = parse("x = " + " + ".join(["1"] * terms) + ";")
+    interpreter = VMInterpreter(syntax_tree)
+    code = interpreter.compile(syntax_tree)
+    elapsed = best_of(lambda: VMInterpreter(syntax_tree).evaluate())
+    print(f"VM: expression of {terms} terms, {len(code.instructions) // 2} instructions "
+          f"({code.instructions.itemsize * len(code.instructions) / 1024:.0f} KB)")
+    print(f"  compile + run {elapsed:8.3f}s")
+
+
+def bench_optimizer(iterations=50000):
+    from optimizer import Optimizer
+
+    # Constant subexpressions and loop invariants in a hot loop
+    source = f"""
+    n = {iterations}; k = 7; total = 0; i = 0;
+    while i < n {{
+        total = total + k * k * 2 + power(2, 10) - (3 * 4 + 1) + i;
+        i = i + 1;
+    }}
+    print(total);
+    """
+    syntax_tree = parse(source)
+    optimizer = Optimizer()
+    optimized = optimizer.optimize(syntax_tree)
+    print(f"Optimizer: while loop of {iterations} iterations")
+    with quiet():
+        for engine in ('tree', 'closure'):
+            plain = best_of(lambda: create_interpreter(syntax_tree, engine).evaluate(), 5)
+            fast = best_of(lambda: create_interpreter(optimized, engine).evaluate(), 5)
+            print(f"  {engine:<8} {plain:8.3f}s -> {fast:8.3f}s  ({plain / fast:.1f}x)", file=sys.stderr)
+    for name, stats in optimizer.stats.items():
+        print(f"  {name:<8} {stats['rewrites']:4} rewrites  {stats['seconds'] * 1000:8.3f} ms")
+
+    # A single cheap invariant in a for loop, which only pays if hoisting it adds no
+    # work to each iteration
+    loop = parse(f"n = {iterations}; k = 7; total = 0; for i in range(0, n) {{ total = total + k * k + i; }}")
+    hoisted = Optimizer(['hoist']).optimize(loop)
+    print("  for loop with k * k hoisted:")
+    with quiet():
+        for engine in ('tree', 'closure'):
+            plain = best_of(lambda: create_interpreter(loop, engine).evaluate(), 5)
+            fast = best_of(lambda: create_interpreter(hoisted, engine).evaluate(), 5)
+            print(f"  {engine:<8} {plain:8.3f}s -> {fast:8.3f}s  ({plain / fast:.1f}x)", file=sys.stderr)
+
+
+def bench_range(count=1000000):
+    # The same loop over a lazy range and over the array it used to be
+    print(f"Range: for loop over {count} values")
+    for label, iterable in (('lazy range', f"range(0, {count})"), ('array', f"toArray(range(0, {count}))")):
+        syntax_tree = parse(f"total = 0; for i in {iterable} {{ total = total + i; }}")
+        peak = peak_memory_of(lambda: Interpreter(syntax_tree).evaluate())
+        elapsed = best_of(lambda: Interpreter(syntax_tree).evaluate())
+        print(f"  {label:<10} peak {peak / 1024:10.0f} KB  {elapsed:8.3f}s")
+
+
+def bench_streams(count=200000):
+    # The same pipeline as chained stream builtins and as loops that build arrays
+    print(f"Streams: map, filter and sum over {count} values")
+    pipelines = (
+        ('streams', f"print(sum(filter(y, map(x, range(0, {count}), x * 3), y > 1000)));"),
+        ('arrays', f"""
+        tripled = []; for x in range(0, {count}) {{ append(tripled, x * 3); }}
+        evens = []; for y in tripled {{ if y > 1000 {{ append(evens, y); }} }}
+        total = 0; for y in evens {{ total = total + y; }}
+        print(total);
+        """),
+    )
+    with quiet():
+        results = []
+        for label, source in pipelines:
+            syntax_tree = parse(source)
+            peak = peak_memory_of(lambda: Interpreter(syntax_tree).evaluate())
+            elapsed = best_of(lambda: Interpreter(syntax_tree).evaluate())
+            results.append((label, peak, elapsed))
+    for label, peak, elapsed in results:
+        print(f"  {label:<8} peak {peak / 1024:10.0f} KB  {elapsed:8.3f}s")
+
+
+def bench_numeric(count=200000):
+    # Scaling and adding two arrays with a loop over lists, and with numeric array operators
+    from values import numpy
+
+    print(f"Numeric arrays: element-wise a * 3 + b over {count} values")
+    loop = parse(f"""
+    a = toArray(range(0, {count})); b = toArray(range(0, {count})); c = [];
+    for i in range(0, {count}) {{ append(c, a[i] * 3 + b[i]); }}
+    """)
+    vectorised = parse(f"a = numarray(range(0, {count})); b = numarray(range(0, {count})); c = a * 3 + b;")
+    for label, syntax_tree in (('loop', loop), ('numarray', vectorised)):
+        if label == 'numarray' and numpy is None:
+            print(f"  {label:<9} skipped, NumPy is not installed")
+            continue
+        elapsed = best_of(lambda: Interpreter(syntax_tree).evaluate())
+        print(f"  {label:<9} {elapsed:8.3f}s")
+
+
+def bench_typed_arrays(count=1000000):
+    # A buffer of count ints grown with append, and pre-sized with zeros
+    print(f"Typed arrays: buffer of {count} ints")
+    buffers = (
+        ('list', f"buf = []; for i in range(0, {count}) {{ append(buf, i); }}"),
+        ('zeros', f"buf = zeros({count}); for i in range(0, {count}) {{ buf[i] = i; }}"),
+    )
+    for label, source in buffers:
+        syntax_tree = parse(source)
+
+        def run():
+            interpreter = Interpreter(syntax_tree)
+            interpreter.evaluate()
+            return interpreter.variables['buf']
+        _, size = allocated_by(run)
+        elapsed = best_of(run)
+        print(f"  {label:<6} {size / 1024:10.0f} KB held  {elapsed:8.3f}s")
+
+
+def bench_tuples(sizes=(25000, 50000, 100000), plain_limit=50000):
+    # Building a tuple one item at a time, with persistent vectors and with the plain
+    # Python tuples that tuple literals used to make, which copy on every concatenation;
+    # those take too long beyond plain_limit items
+    class PlainTupleInterpreter(Interpreter):
+        def evaluate_tuple_creation(self, elements):
+            return tuple(self.evaluate_expression(e) for e in elements)
+
+    print("Tuples: acc = acc + ^i^ in a loop")
+    for size in sizes:
+        syntax_tree = parse(f"acc = ^^; for i in range(0, {size}) {{ acc = acc + ^i^; }}")
+        vector = best_of(lambda: Interpreter(syntax_tree).evaluate(), 1)
+        line = f"  {size:>7} items  vector {vector:8.3f}s"
+        if size <= plain_limit:
+            plain = best_of(lambda: PlainTupleInterpreter(syntax_tree).evaluate(), 1)
+            line += f"  plain tuple {plain:8.3f}s"
+        print(line)
+
+
+def bench_ropes(sizes=(50000, 100000, 200000)):
+    # Building a string piece by piece, with ropes and with plain str concatenation
+    class PlainStringInterpreter(Interpreter):
+        def evaluate_plus(self, expression):
+            return self.evaluate_expression(expression[1]) + self.evaluate_expression(expression[2])
+
+        expression_handlers = {**Interpreter.expression_handlers, '+': evaluate_plus}
+
+    print('Ropes: s = s + "abcd" in a while loop')
+    for size in sizes:
+        syntax_tree = parse(f's = ""; i = 0; while i < {size} {{ s = s + "abcd"; i = i + 1; }} n = Stringlength(s);')
+        rope = best_of(lambda: Interpreter(syntax_tree).evaluate(), 1)
+        plain = best_of(lambda: PlainStringInterpreter(syntax_tree).evaluate(), 1)
+        print(f"  {size:>7} pieces  rope {rope:8.3f}s  plain str {plain:8.3f}s")
+
+
+def bench_matrix(size=40):
+    # Matrix product of two size x size grids: interpreted loops over flat arrays, and matmul
+    from values import numpy
+
+    print(f"Matrix: product of two {size}x{size} matrices")
+    if numpy is None:
+        print("  skipped, NumPy is not installed")
+        return
+    loops = parse(f"""
+    n = {size}; a = toArray(range(0, n * n)); b = toArray(range(0, n * n)); c = [];
+    for i in range(0, n) {{
+        for j in range(0, n) {{
+            total = 0;
+            for k in range(0, n) {{ total = total + a[i * n + k] * b[k * n + j]; }}
+            append(c, total);
+        }}
+    }}
+    """)
+    rows = "[" + ", ".join(f"toArray(range({i * size}, {(i + 1) * size}))" for i in range(size)) + "]"
+    vectorised = parse(f"a = matrix({rows}); c = matmul(a, a);")
+    for label, syntax_tree in (('loops', loops), ('matmul', vectorised)):
+        elapsed = best_of(lambda: Interpreter(syntax_tree).evaluate())
+        print(f"  {label:<7} {elapsed * 1000:10.2f} ms")
+
+
+def bench_dicts(size=5000):
+    # Membership tests against a set and against an array holding the same values
+    print(f"Dicts and sets: {size} has() lookups among {size} values")
+    for label, container in (('set', f"toSet(range(0, {size}))"), ('array', f"toArray(range(0, {size}))")):
+        syntax_tree = parse(f"""
+        seen = {container}; hits = 0;
+        for i in range(0, {size}) {{ if has(seen, i * 2) {{ hits = hits + 1; }} }}
+        """)
+        elapsed = best_of(lambda: Interpreter(syntax_tree).evaluate())
+        print(f"  {label:<6} {elapsed:8.3f}s")
+
+
+def bench_tables(count=100000):
+    # Rows held as an array of tuples and as a columnar table: memory held, and the time
+    # to total one column over the rows that pass a filter
+    print(f"Tables: {count} rows of ^id, price, qty^")
+    rows = f"toArray(map(i, range(0, {count}), ^i, i * 3, 1^))"
+    layouts = (
+        ('tuples', f"data = {rows};", """
+        total = 0;
+        for r in data { if getItem(r, 1) > 1000 { total = total + getItem(r, 1); } }
+        """),
+        ('table', f'data = table({rows}, ["id", "price", "qty"]);',
+         'total = sum(column(where(data, "price", ">", 1000), "price"));'),
+    )
+    for label, build, scan in layouts:
+        build_tree, scan_tree = parse(build), parse(scan)
+
+        def run():
+            interpreter = Interpreter(build_tree)
+            interpreter.evaluate()
+            return interpreter.variables['data']
+        data, size = allocated_by(run)
+
+        def run_scan():
+            interpreter = Interpreter(scan_tree)
+            interpreter.variables['data'] = data
+            interpreter.evaluate()
+        elapsed = best_of(run_scan)
+        print(f"  {label:<7} {size / 1024:10.0f} KB held  scan {elapsed:8.3f}s")
+
+
+def bench_functions(n=22):
+    # Naive recursive Fibonacci as a plain and as a pure (memoised) function, and the
+    # time of a loop that calls a small function once per iteration
+    print(f"Functions: fib({n}) plain and pure, and 100000 calls of a small function")
+    # A stream a function returns keeps evaluating in that function's frame
+    syntax_tree = parse("def scaled(k) { return map(v, [1, 2, 3], v * k); } result = toArray(scaled(10));")
+    for engine in ENGINES:
+        interpreter = create_interpreter(syntax_tree, engine)
+        interpreter.evaluate()
+        if interpreter.variables['result'] != [10, 20, 30]:
+            raise AssertionError(f"{engine} engine evaluated a returned stream outside its frame")
+    fib = f"def fib(n) {{ if n < 2 {{ return n; }} return fib(n-1) + fib(n-2); }} result = fib({n});"
+    cases = (
+        ('plain', parse(fib)),
+        ('pure', parse("pure " + fib)),
+        ('calls', parse("def inc(x) { return x + 1; } total = 0; "
+                        "for i in range(0, 100000) { total = inc(total); }")),
+    )
+    for label, syntax_tree in cases:
+        elapsed = best_of(lambda: Interpreter(syntax_tree).evaluate())
+        print(f"  {label:<6} {elapsed:8.3f}s")
+    # Function bodies run in the engine's own form, compiled once for all calls
+    calls = cases[-1][1]
+    for engine in ('closure', 'vm', 'python'):
+        elapsed = best_of(lambda: create_interpreter(calls, engine).evaluate())
+        print(f"  calls on {engine:<7} {elapsed:8.3f}s")
+
+
+def bench_break(count=200000):
+    # Finding the first match in a large array: a flag that every iteration checks,
+    # and a break that leaves the loop at the match
+    print(f"Break: search a {count}-element array for a value at position {count // 10}")
+    setup = f"data = toArray(range(0, {count})); target = {count // 10}; "
+    searches = (
+        ('flag', setup + "found = 0; for x in data { if found == 0 { if x == target { found = 1; } } }"),
+        ('break', setup + "for x in data { if x == target { break; } }"),
+    )
+    for label, source in searches:
+        syntax_tree = parse(source)
+        elapsed = best_of(lambda: Interpreter(syntax_tree).evaluate())
+        print(f"  {label:<6} {elapsed:8.3f}s")
+
+
+def bench_augmented(count=100000):
+    # Running totals and array counters written out in full and with augmented assignment
+    print(f"Augmented assignment: {count} updates of a variable and of an array element")
+    setup = "total = 0; counts = zeros(10); "
+    cases = (
+        ('total = total + i', setup + f"for i in range(0, {count}) {{ total = total + i; }}"),
+        ('total += i', setup + f"for i in range(0, {count}) {{ total += i; }}"),
+        ('a[j] = a[j] + 1', setup + f"j = 3; for i in range(0, {count}) {{ counts[j * 2] = counts[j * 2] + 1; }}"),
+        ('a[j] += 1', setup + f"j = 3; for i in range(0, {count}) {{ counts[j * 2] += 1; }}"),
+    )
+    for label, source in cases:
+        syntax_tree = parse(source)
+        elapsed = best_of(lambda: Interpreter(syntax_tree).evaluate())
+        print(f"  {label:<18} {elapsed:8.3f}s")
+
+
+def bench_types(count=50000):
+    from optimizer import PASSES, Optimizer
+
+    # Counters, string splitting, array lengths and tuple reads with and without the
+    # nodes the types pass specialises them into
+    source = f"""
+    line = "a,b,c"; pair = ^3, 4^; sizes = [1, 2, 3]; total = 0;
+    for i in range(0, {count}) {{
+        parts = split(line, ",");
+        total = total + length(parts) + getItem(pair, 1) + sizes[1] + i;
+    }}
+    print(total);
+    """
+    # INT_ADD on its own: a counter summed with nothing else in the loop
+    int_add_source = f"t = 0; for i in range(0, {count * 10}) {{ t = t + i; }} print(t);"
+    for title, text, iterations in (("Type inference", source, count),
+                                    ("INT_ADD alone", int_add_source, count * 10)):
+        syntax_tree = parse(text)
+        generic = Optimizer([name for name in PASSES if name != 'types']).optimize(syntax_tree)
+        optimizer = Optimizer()
+        specialised = optimizer.optimize(syntax_tree)
+        print(f"{title}: {iterations} iterations, {optimizer.stats['types']['rewrites']} specialised nodes")
+        with quiet():
+            for engine in ('tree', 'nodes', 'closure', 'vm'):
+                plain = best_of(lambda: create_interpreter(generic, engine).evaluate())
+                fast = best_of(lambda: create_interpreter(specialised, engine).evaluate())
+                print(f"  {engine:<8} {plain:8.3f}s -> {fast:8.3f}s  ({plain / fast:.2f}x)", file=sys.stderr)
+
+
+def bench_engines(repeat=3):
+    syntax_tree = parse(LOOP_SOURCE)
+    print("Engines on the loop-heavy script:")
+    results = {}
+    with quiet():
+        for engine in ENGINES:
+            elapsed = best_of(lambda: create_interpreter(syntax_tree, engine).evaluate(), repeat)
+            results[engine] = elapsed
+    for engine, elapsed in results.items():
+        print(f"  {engine:<8} {elapsed:8.3f}s  ({results['tree'] / elapsed:.1f}x the tree-walker)")
+
+
+BENCHMARKS = {
+    'lexer': bench_lexer,
+    'tokens': bench_token_stream,
+    'stream': bench_streaming,
+    'ast': bench_ast_nodes,
+    'cache': bench_compile_cache,
+    'dispatch': bench_builtin_dispatch,
+    'vm': bench_vm,
+    'optimizer': bench_optimizer,
+    'range': bench_range,
+    'streams': bench_streams,
+    'numeric': bench_numeric,
+    'typed': bench_typed_arrays,
+    'tuples': bench_tuples,
+    'ropes': bench_ropes,
+    'matrix': bench_matrix,
+    'dicts': bench_dicts,
+    'tables': bench_tables,
+    'functions': bench_functions,
+    'break': bench_break,
+    'augmented': bench_augmented,
+    'types': bench_types,
+    'engines': bench_engines,
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,127 @@
+# CompileCache: Content-addressed on-disk cache of parsed programs
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+
+# The marshal format depends on the Python version, so it is part of every key
+FORMAT = f"marshal-{marshal.version}-py{sys.version_info[0]}.{sys.version_info[1]}"
+SUFFIX = '.ast'
+
+
+class CompileCache:
+    def __init__(self, directory, version, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.version = version
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source_code, variant=''):
+        # variant tells apart different compilations of the same source (e.g. optimised)
+        digest = hashlib.sha256()
+        for part in (FORMAT, self.version, variant):
+            digest.update(part.encode())
+            digest.update(b'\0')
+        digest.update(source_code.encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as cache_file:
+                syntax_tree = marshal.loads(cache_file.read())
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (EOFError, ValueError, TypeError):
+            # A damaged entry is dropped and treated as a miss
+            self.remove(path)
+            self.misses += 1
+            return None
+        # The modification time doubles as the last-use time for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return syntax_tree
+
+    def put(self, key, syntax_tree):
+        try:
+            data = marshal.dumps(syntax_tree)
+        except ValueError:
+            # Trees nested deeper than marshal allows are simply not cached
+            return
+        # Write to a temporary file and rename it, so readers never see a partial entry
+        descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            self.remove(temp_path)
+            raise
+        self.evict()
+
+    def load(self, source_code, compile_source, variant=''):
+        # Returns the cached syntax tree for source_code, compiling and storing it on a miss
+        key = self.key(source_code, variant)
+        syntax_tree = self.get(key)
+        if syntax_tree is None:
+            syntax_tree = compile_source(source_code)
+            self.put(key, syntax_tree)
+        return syntax_tree
+
+    def entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        # Removes least recently used entries until the cache fits in max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if self.remove(path):
+                self.evictions += 1
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self.remove(path)
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+        }
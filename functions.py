@@ -0,0 +1,99 @@
+# Functions: User-defined functions, their call frames and the memo of pure functions
+from collections import OrderedDict
+
+# Entries a pure function's memo keeps before it evicts the least recently used one
+MEMO_SIZE = 4096
+# Frames a pool keeps for reuse; deeper recursion allocates the rest
+FRAME_POOL_SIZE = 256
+
+
+class FunctionReturn(Exception):
+    # Raised by a return statement and caught by the call that runs the function body,
+    # which unwinds any loops and ifs the return sits in
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Function:
+    # A function defined with `def`. compiled is free for the engine that runs it to
+    # cache its own form of the body (resolved slots, bytecode, a Python function).
+    __slots__ = ('name', 'params', 'body', 'memo', 'compiled')
+
+    def __init__(self, name, params, body, memo=None):
+        self.name = name
+        self.params = tuple(params)
+        self.body = body
+        self.memo = memo
+        self.compiled = None
+
+    def __repr__(self):
+        return f"<function {self.name}({', '.join(self.params)})>"
+
+
+class FramePool:
+    # Call frames are handed back after each call and reused by the next one, so a call
+    # does not allocate a new frame. new makes a frame and reset empties one.
+    __slots__ = ('frames', 'new', 'reset', 'limit')
+
+    def __init__(self, new, reset, limit=FRAME_POOL_SIZE):
+        self.frames = []
+        self.new = new
+        self.reset = reset
+        self.limit = limit
+
+    def acquire(self):
+        frames = self.frames
+        return frames.pop() if frames else self.new()
+
+    def release(self, frame):
+        if len(self.frames) < self.limit:
+            self.reset(frame)
+            self.frames.append(frame)
+
+
+class Memo:
+    # Least-recently-used cache of a pure function's results by argument values
+    __slots__ = ('size', 'entries', 'hits', 'misses', 'evictions', 'uncached')
+
+    def __init__(self, size=MEMO_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncached = 0  # calls with unhashable arguments, which always run
+
+    def call(self, args, compute):
+        # The result for args, from the cache or from compute(). Values that compare
+        # equal but differ in type (1 and 1.0) get separate entries.
+        key = tuple(args) + tuple(map(type, args))
+        entries = self.entries
+        try:
+            result = entries[key]
+        except KeyError:
+            pass
+        except TypeError:
+            self.uncached += 1
+            return compute()
+        else:
+            self.hits += 1
+            entries.move_to_end(key)
+            return result
+        self.misses += 1
+        result = compute()
+        entries[key] = result
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return result
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'uncached': self.uncached,
+            'entries': len(self.entries),
+        }
@@ -1,7 +1,256 @@
+import argparse
+import itertools
+import operator
+import re
+import sys
+from array import array
+
+import values
+from functions import MEMO_SIZE, FramePool, Function, FunctionReturn, Memo
+from values import (AGGREGATIONS, COMPARISONS, TYPECODES, LazyRange, Matrix, NumericArray, PersistentVector, Rope,
+                    Stream, Table, TypedArray, filled_array, numeric_array, numeric_literal, zeros_array)
+
+# Part of every compile cache key; bump it whenever the parser's output changes
+INTERPRETER_VERSION = '1.1'
+
+# Each call of a user-defined function nests several Python calls, so scripts get a
+# higher Python recursion limit than the default of 1000 for their recursion
+RECURSION_LIMIT = 30000
+
+
+# Master pattern for the regex tokenizer engine. The alternatives are tried in the
+# same order as the branches of Lexer.tokenize, so both engines emit the same stream.
+TOKEN_PATTERN = re.compile(r'''\s*(?:
+    (?P<WORD>[^\W\d_][^\W_]*)
+  | (?P<AUG_ASSIGN>[-+*/]=)       # before NEGATIVE, so `x -=5` is not read as -5
+  | (?P<NEGATIVE>-(?=.\d)\d*)     # peek_next_char looks two characters past the '-'
+  | (?P<NUMBER>\d+)
+  | (?P<EQUAL>==)
+  | (?P<NOTEQUAL>!.(?==))         # likewise, '!' only needs a '=' two characters ahead
+  | (?P<OPERATOR>[-+*/])
+  | (?P<STRING>"[^"]*")
+  | (?P<UNTERMINATED>")
+  | (?P<PUNCTUATION>[{}();=><,\[\]^:])
+  | (?P<MISMATCH>.)
+  | \Z)                          # trailing whitespace
+''', re.VERBOSE | re.DOTALL)
+
+KEYWORDS = frozenset({'if', 'else', 'while', 'for', 'in', 'print', 'def', 'pure', 'return', 'break', 'continue'})
+
+PUNCTUATION_TOKENS = {
+    '{': ('LBRACE', '{'),
+    '}': ('RBRACE', '}'),
+    '(': ('LPAREN', '('),
+    ')': ('RPAREN', ')'),
+    ';': ('SEMICOLON', ';'),
+    '=': ('ASSIGN', '='),
+    '>': ('Greater', '>'),
+    '<': ('Smaller', '<'),
+    ',': ('COMMA', ','),
+    '[': ('LBRACKET', '['),
+    ']': ('RBRACKET', ']'),
+    '^': ('CARET', '^'),
+    ':': ('COLON', ':'),
+}
+
+# Token kinds in the order of their integer codes inside a TokenStream
+TOKEN_KINDS = (
+    'IDENTIFIER', 'KEYWORD', 'NUMBER', 'STRING', 'OPERATOR', 'EQUAL', 'NOTEQUAL',
+    'LBRACE', 'RBRACE', 'LPAREN', 'RPAREN', 'SEMICOLON', 'ASSIGN', 'Greater', 'Smaller',
+    'COMMA', 'LBRACKET', 'RBRACKET', 'CARET', 'COLON', 'AUG_ASSIGN',
+)
+TOKEN_CODES = {kind: code for code, kind in enumerate(TOKEN_KINDS)}
+
+T_IDENTIFIER = TOKEN_CODES['IDENTIFIER']
+T_KEYWORD = TOKEN_CODES['KEYWORD']
+T_NUMBER = TOKEN_CODES['NUMBER']
+T_STRING = TOKEN_CODES['STRING']
+T_EQUAL = TOKEN_CODES['EQUAL']
+T_NOTEQUAL = TOKEN_CODES['NOTEQUAL']
+T_RBRACE = TOKEN_CODES['RBRACE']
+T_GREATER = TOKEN_CODES['Greater']
+T_SMALLER = TOKEN_CODES['Smaller']
+T_LBRACKET = TOKEN_CODES['LBRACKET']
+T_COLON = TOKEN_CODES['COLON']
+T_SEMICOLON = TOKEN_CODES['SEMICOLON']
+T_AUG_ASSIGN = TOKEN_CODES['AUG_ASSIGN']
+
+# Tokens (or keywords) after which a '{' opens a dict or set literal rather than a block
+LITERAL_CONTEXT = frozenset({
+    'ASSIGN', 'AUG_ASSIGN', 'LPAREN', 'COMMA', 'LBRACKET', 'OPERATOR', 'EQUAL', 'NOTEQUAL',
+    'Greater', 'Smaller', 'CARET', 'COLON', 'print', 'in', 'return',
+})
+
+
+
+# Strings built by concatenation become ropes once the left side reaches this length;
+# shorter strings are cheaper to copy than to keep in pieces
+ROPE_MIN_LENGTH = 256
+
+
+def add(left, right):
+    if left.__class__ is str and right.__class__ is str and len(left) >= ROPE_MIN_LENGTH:
+        return Rope([left, right], 2, len(left) + len(right))
+    return left + right
+
+
+def divide(left, right):
+    # Numeric arrays check their own elements for zero
+    if not isinstance(right, NumericArray) and right == 0:
+        raise ZeroDivisionError("Cannot divide by zero")
+    return left / right
+
+
+# Value-level binary operators by node type, for engines that compile the tree
+BINARY_OPERATORS = {
+    '+': add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': divide,
+    'Greater': operator.gt,
+    'Smaller': operator.lt,
+    'EQUAL': operator.eq,
+    'NOTEQUAL': operator.ne,
+}
+
+# Builtins that also have their own call syntax or dispatch entry point
+ARRAY_FUNCTIONS = ('length', 'index', 'append', 'remove', 'add')
+TUPLE_FUNCTIONS = ('sort', 'getItem', 'tupleindex', 'tuplelength')
+# Builtins whose first argument is the name of an array variable rather than a value
+NAME_BUILTINS = ('append', 'remove', 'add')
+# Builtins that bind a variable for each element, by (number of leading arguments that
+# name variables, position of the argument that is evaluated once per element)
+BINDER_BUILTINS = {'map': (1, 2), 'filter': (1, 2), 'reduce': (2, 4)}
+# Arrays that can be modified in place
+ARRAY_TYPES = (list, TypedArray, NumericArray)
+# Values that array reads, length and index accept
+SEQUENCE_TYPES = ARRAY_TYPES + (LazyRange,)
+# Tuple values: tuple literals make persistent vectors; zip makes Python tuples
+TUPLE_TYPES = (PersistentVector, tuple)
+# String values: literals are str, long concatenations are ropes
+STRING_TYPES = (str, Rope)
+# Dict and set values, from literals and the set builtins; lookups hash the key
+HASHED_TYPES = (dict, set)
+# Values that indexed reads accept: sequences by position, dicts by key, table rows
+INDEXED_TYPES = SEQUENCE_TYPES + (dict, Table)
+# Values that length accepts
+SIZED_TYPES = SEQUENCE_TYPES + HASHED_TYPES + (Table,)
+# Values that indexed assignment accepts
+ITEM_TYPES = ARRAY_TYPES + (dict,)
+# Values the stream builtins and toArray accept
+ITERABLE_TYPES = TUPLE_TYPES + STRING_TYPES + (Stream, Matrix, Table) + SEQUENCE_TYPES + HASHED_TYPES
+
+# What a break or continue statement hands back to the loop it stops, through the ifs
+# it sits in; other statements return None
+BREAK = object()
+CONTINUE = object()
+
+
+def contains_loop_exit(statements):
+    # Whether a break or continue among statements stops the loop around them. The ones
+    # inside nested loops stop those loops instead.
+    for statement in statements:
+        kind = statement[0]
+        if kind == 'BREAK' or kind == 'CONTINUE':
+            return True
+        if kind == 'IF' and (contains_loop_exit(statement[2]) or contains_loop_exit(statement[3])):
+            return True
+    return False
+
+
+# The checks of the length, split and getItem builtins on evaluated arguments
+
+def checked_length(array):
+    if not isinstance(array, SIZED_TYPES):
+        raise ValueError("Argument to 'length' must be an array.")
+    return len(array)
+
+
+def checked_split(string, delimiter):
+    if not isinstance(string, STRING_TYPES) or not isinstance(delimiter, STRING_TYPES):
+        raise ValueError("Arguments to split must be strings")
+    return str(string).split(str(delimiter))
+
+
+def checked_get_item(tuple_value, index):
+    if not isinstance(tuple_value, TUPLE_TYPES):
+        raise ValueError("First argument to getItem must be a tuple")
+    if not isinstance(index, int):
+        raise ValueError("Second argument to getItem must be an integer")
+    return tuple_value[index]
+
+
+# The same builtins for arguments the optimizer's types pass proved to have one exact
+# type. A variable can still hold another type at run time, from an assignment outside
+# the statements the pass saw; such values take the checked path.
+
+def list_length(array):
+    if array.__class__ is list:
+        return len(array)
+    return checked_length(array)
+
+
+def str_split(string, delimiter):
+    if string.__class__ is str and delimiter.__class__ is str:
+        return string.split(delimiter)
+    return checked_split(string, delimiter)
+
+
+def vector_get_item(tuple_value, index):
+    if tuple_value.__class__ is PersistentVector and index.__class__ is int:
+        return tuple_value[index]
+    return checked_get_item(tuple_value, index)
+
+
+# Node types of the types pass, for engines that compile the tree: builtin calls with a
+# fixed number of arguments as (type, *args). INT_ADD, '+' of operands proved to be
+# ints, is (type, left, right); each engine inlines it, as a helper call would cost
+# more than the class test it saves.
+SPECIALISED_BUILTINS = {'LIST_LENGTH': list_length, 'STR_SPLIT': str_split, 'VECTOR_GET_ITEM': vector_get_item}
+
+
+def array_error(array_name, value):
+    # The error for modifying array_name when it holds value, which is not a list
+    if isinstance(value, LazyRange):
+        return ValueError(f"Array '{array_name}' is a range; convert it with toArray to modify it.")
+    return ValueError(f"Array '{array_name}' is not defined.")
+
+
+def regex_token(kind, text):
+    # Converts one TOKEN_PATTERN match into a (type, value) token
+    if kind == 'PUNCTUATION':
+        return PUNCTUATION_TOKENS[text]
+    elif kind == 'WORD':
+        return ('KEYWORD' if text in KEYWORDS else 'IDENTIFIER', text)
+    elif kind == 'NUMBER':
+        return ('NUMBER', int(text))
+    elif kind == 'OPERATOR':
+        return ('OPERATOR', text)
+    elif kind == 'STRING':
+        return ('STRING', text[1:-1])
+    elif kind == 'NEGATIVE':
+        return ('NUMBER', int(text[1:]) * -1)
+    elif kind == 'EQUAL':
+        return ('EQUAL', '==')
+    elif kind == 'NOTEQUAL':
+        return ('NOTEQUAL', '!=')
+    elif kind == 'AUG_ASSIGN':
+        return ('AUG_ASSIGN', text)
+    elif kind == 'UNTERMINATED':
+        raise ValueError("Unterminated string literal")
+    else:
+        raise ValueError(f"Unknown character: {text}")
+
+
 # Lexer: Tokenizes the source code
 class Lexer:
-    def __init__(self, source_code):
+    ENGINES = ('scan', 'regex')
+
+    def __init__(self, source_code, engine='scan'):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown lexer engine: {engine}")
         self.source_code = source_code
+        self.engine = engine
         self.tokens = []
         self.current_char = ''
         self.index = 0
@@ -14,12 +263,18 @@ class Lexer:
             self.current_char = None
 
     def tokenize(self):
+        if self.engine == 'regex':
+            return self.tokenize_regex()
         self.next_char()
         while self.current_char is not None:
             if self.current_char.isspace():
                 self.next_char()
             elif self.current_char.isalpha():
                 self.tokenize_identifier_or_keyword()
+            elif self.current_char in "+-*/" and self.source_code[self.index:self.index + 1] == '=':
+                self.tokens.append(('AUG_ASSIGN', self.current_char + '='))
+                self.index += 1
+                self.next_char()
             elif self.current_char.isdigit() or (self.current_char == '-' and self.peek_next_char().isdigit()):
                 # Handles negative numbers: check if '-' is followed by a digit
                 self.tokenize_number()
@@ -70,6 +325,9 @@ class Lexer:
             elif self.current_char == '^':
                 self.tokens.append(('CARET', '^'))
                 self.next_char()
+            elif self.current_char == ':':
+                self.tokens.append(('COLON', ':'))
+                self.next_char()
 
             elif self.current_char == '"':
                 self.tokenize_string()
@@ -88,8 +346,7 @@ class Lexer:
             identifier += self.current_char
             self.next_char()
 
-        keywords = {'if', 'else', 'while', 'for', 'in', 'print'}
-        if identifier in keywords:
+        if identifier in KEYWORDS:
             self.tokens.append(('KEYWORD', identifier))
         else:
             self.tokens.append(('IDENTIFIER', identifier))
@@ -119,28 +376,207 @@ class Lexer:
         self.next_char()  # Skip the closing quote
         self.tokens.append(('STRING', string))
 
+    def tokenize_regex(self):
+        # Single pass over TOKEN_PATTERN; produces the same tokens as the character scanner
+        tokens = self.tokens
+        append = tokens.append
+        for match in TOKEN_PATTERN.finditer(self.source_code):
+            kind = match.lastgroup
+            if kind is not None:
+                append(regex_token(kind, match.group(kind)))
+        self.index = len(self.source_code)
+        return tokens
+
+    def iter_tokens(self, chunk_size=65536):
+        # Lazily yields the tokens of tokenize_regex; source_code may also be a file object,
+        # which is then read chunk_size characters at a time
+        if self.engine != 'regex':
+            raise ValueError(f"The {self.engine} lexer cannot tokenize a stream; use the regex lexer")
+        read = getattr(self.source_code, 'read', None)
+        if read is None:
+            buffer, at_eof = self.source_code, True
+        else:
+            buffer, at_eof = read(chunk_size), False
+        position = 0
+        while True:
+            match = TOKEN_PATTERN.match(buffer, position)
+            kind = match.lastgroup
+            # A match that ends close to the end of the buffer could continue (or be
+            # decided by a two-character lookahead) in the next chunk
+            if not at_eof and (match.end() > len(buffer) - 2 or kind == 'UNTERMINATED'):
+                chunk = read(chunk_size)
+                at_eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            if kind is None:
+                return
+            yield regex_token(kind, match.group(kind))
+            position = match.end()
+
+    def tokenize_stream(self):
+        # Same tokens as tokenize_regex, stored compactly with 1-based line/column positions
+        source = self.source_code
+        stream = TokenStream()
+        append = stream.append
+        line, line_start, position = 1, 0, 0
+        for match in TOKEN_PATTERN.finditer(source):
+            kind = match.lastgroup
+            if kind is None:
+                continue
+            text = match.group(kind)
+            start = match.start(kind)
+            newlines = source.count('\n', position, start)
+            if newlines:
+                line += newlines
+                line_start = source.rfind('\n', position, start) + 1
+            position = start
+            column = start - line_start + 1
+            if kind == 'PUNCTUATION':
+                token_type, value = PUNCTUATION_TOKENS[text]
+                append(TOKEN_CODES[token_type], value, line, column)
+            elif kind == 'WORD':
+                append(T_KEYWORD if text in KEYWORDS else T_IDENTIFIER, sys.intern(text), line, column)
+            elif kind == 'NUMBER':
+                append(T_NUMBER, int(text), line, column)
+            elif kind == 'OPERATOR':
+                append(TOKEN_CODES['OPERATOR'], text, line, column)
+            elif kind == 'STRING':
+                append(T_STRING, text[1:-1], line, column)
+            elif kind == 'NEGATIVE':
+                append(T_NUMBER, int(text[1:]) * -1, line, column)
+            elif kind == 'EQUAL':
+                append(T_EQUAL, '==', line, column)
+            elif kind == 'NOTEQUAL':
+                append(T_NOTEQUAL, '!=', line, column)
+            elif kind == 'AUG_ASSIGN':
+                append(T_AUG_ASSIGN, text, line, column)
+            elif kind == 'UNTERMINATED':
+                raise ValueError(f"Unterminated string literal at line {line}, column {column}")
+            else:
+                raise ValueError(f"Unknown character: {text}")
+        self.index = len(source)
+        return stream
+
+
+# TokenStream: Compact token storage with kinds as byte codes and values in a side table
+class TokenStream:
+    __slots__ = ('kinds', 'values', 'lines', 'columns')
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.values = []
+        self.lines = array('I')
+        self.columns = array('I')
+
+    @classmethod
+    def from_tokens(cls, tokens):
+        # Tokens produced by Lexer.tokenize carry no positions, so those are left as 0
+        stream = cls()
+        for token_type, value in tokens:
+            if token_type in ('IDENTIFIER', 'KEYWORD'):
+                value = sys.intern(value)
+            stream.append(TOKEN_CODES[token_type], value)
+        return stream
+
+    def append(self, kind, value, line=0, column=0):
+        self.kinds.append(kind)
+        self.values.append(value)
+        self.lines.append(line)
+        self.columns.append(column)
+
+    def position(self, index):
+        return self.lines[index], self.columns[index]
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        return TOKEN_KINDS[self.kinds[index]], self.values[index]
+
+    def __iter__(self):
+        for kind, value in zip(self.kinds, self.values):
+            yield TOKEN_KINDS[kind], value
+
 
 # Parser: Builds a syntax tree from tokens
 class Parser:
     def __init__(self, tokens):
+        # tokens may also be a lazy iterator (see Lexer.iter_tokens), which is only
+        # consumed through iter_statements
+        self.pending = None
+        self.lookahead = None
+        self.in_function = False  # whether a function body is being parsed
+        self.loop_depth = 0  # how many loops enclose the statement being parsed
+        if hasattr(tokens, '__next__'):
+            self.pending = tokens
+            tokens = TokenStream()
+        elif not isinstance(tokens, TokenStream):
+            tokens = TokenStream.from_tokens(tokens)
+        self.load(tokens)
+
+    def load(self, tokens):
         self.tokens = tokens
+        self.kinds = tokens.kinds
+        self.values = tokens.values
         self.index = 0
 
     def parse(self):
         statements = []
-        while self.index < len(self.tokens):
+        while self.index < len(self.kinds):
             statements.append(self.parse_statement())
         return statements
 
+    def iter_statements(self):
+        # Yields top-level statements one at a time
+        while True:
+            while self.index < len(self.kinds):
+                yield self.parse_statement()
+            if self.pending is None or not self.load_next_statement():
+                return
+
+    def load_next_statement(self):
+        # Pulls the tokens of the next top-level statement from the pending iterator.
+        # A statement ends at a ';' or at the '}' closing its last block, unless an
+        # 'else' follows that '}'. Braces that open dict and set literals do not count.
+        tokens = TokenStream()
+        braces = []  # for each open '{', whether it opened a literal
+        previous = None
+        while True:
+            if self.lookahead is not None:
+                token, self.lookahead = self.lookahead, None
+            else:
+                token = next(self.pending, None)
+                if token is None:
+                    break
+            token_type, token_value = token
+            tokens.append(TOKEN_CODES[token_type], token_value)
+            if token_type == 'LBRACE':
+                braces.append(previous in LITERAL_CONTEXT)
+            elif token_type == 'RBRACE':
+                literal = braces.pop() if braces else False
+                if not literal and not braces:
+                    self.lookahead = next(self.pending, None)
+                    if self.lookahead != ('KEYWORD', 'else'):
+                        break
+            elif token_type == 'SEMICOLON' and not braces:
+                break
+            previous = token_value if token_type == 'KEYWORD' else token_type
+        self.load(tokens)
+        return len(tokens) > 0
+
     def parse_statement(self):
-        token_type, token_value = self.tokens[self.index]
+        token_type = self.kinds[self.index]
+        token_value = self.values[self.index]
 
-        if token_type == 'IDENTIFIER':
-            if self.tokens[self.index + 1][0] == 'LBRACKET':
+        if token_type == T_IDENTIFIER:
+            if self.kinds[self.index + 1] == T_LBRACKET:
                 return self.parse_array_assignment()
-            elif self.tokens[self.index + 1][1] == '=':
+            elif self.values[self.index + 1] == '=':
                 return self.parse_assignment()
-            elif self.tokens[self.index + 1][1] == '(':
+            elif self.kinds[self.index + 1] == T_AUG_ASSIGN:
+                return self.parse_augmented_assignment()
+            elif self.values[self.index + 1] == '(':
                 expr = self.parse_expression()
                 self.index += 1  # skip ';'
                 return expr
@@ -152,15 +588,21 @@ class Parser:
             return self.parse_for_statement()
         elif token_value == 'print':
             return self.parse_print_statement()
+        elif token_value == 'def' or token_value == 'pure':
+            return self.parse_function_definition()
+        elif token_value == 'return':
+            return self.parse_return_statement()
+        elif token_value == 'break' or token_value == 'continue':
+            return self.parse_loop_exit()
         else:
             expr = self.parse_expression()
             self.index += 1  # skip ';'
             return expr
 
     def parse_assignment(self):
-        if self.tokens[self.index + 1][1] == '[':
+        if self.values[self.index + 1] == '[':
             # Array assignment
-            array_name = self.tokens[self.index][1]
+            array_name = self.values[self.index]
             self.index += 1  # skip array name
             index = self.parse_array_access(('IDENTIFIER', array_name))[2]
             self.index += 1  # skip '='
@@ -169,35 +611,50 @@ class Parser:
             return ('ARRAY_ASSIGN', array_name, index, expression)
         else:
             # Regular assignment
-            variable_name = self.tokens[self.index][1]
+            variable_name = self.values[self.index]
             self.index += 2  # skip variable name and '='
             expression = self.parse_expression()
             self.index += 1  # skip ';'
             return ('ASSIGN', variable_name, expression)
 
     def parse_array_assignment(self):
-        array_name = self.tokens[self.index][1]
+        array_name = self.values[self.index]
         self.index += 1  # skip array name
         self.index += 1  # skip '['
         index = self.parse_expression()
         self.index += 1  # skip ']'
+        if self.kinds[self.index] == T_AUG_ASSIGN:
+            operator = self.values[self.index][0]
+            self.index += 1  # skip the operator
+            value = self.parse_expression()
+            self.index += 1  # skip ';'
+            return ('ARRAY_AUG_ASSIGN', array_name, index, operator, value)
         self.index += 1  # skip '='
         value = self.parse_expression()
         self.index += 1  # skip ';'
         return ('ARRAY_ASSIGN', array_name, index, value)
 
+    def parse_augmented_assignment(self):
+        # `x += value` and the like; operator is the binary node kind ('+', '-', '*', '/')
+        variable_name = self.values[self.index]
+        operator = self.values[self.index + 1][0]
+        self.index += 2  # skip variable name and operator
+        value = self.parse_expression()
+        self.index += 1  # skip ';'
+        return ('AUG_ASSIGN', variable_name, operator, value)
+
     def parse_if_statement(self):
         self.index += 1  # skip 'if'
         condition = self.parse_expression()
         self.index += 1  # skip '{'
         if_body = []
-        while self.tokens[self.index][0] != 'RBRACE':
+        while self.kinds[self.index] != T_RBRACE:
             if_body.append(self.parse_statement())
         self.index += 1  # skip '}'
         else_body = []
-        if self.index < len(self.tokens) and self.tokens[self.index][1] == 'else':
+        if self.index < len(self.kinds) and self.values[self.index] == 'else':
             self.index += 2  # skip 'else' and '{'
-            while self.tokens[self.index][0] != 'RBRACE':
+            while self.kinds[self.index] != T_RBRACE:
                 else_body.append(self.parse_statement())
             self.index += 1  # skip '}'
         return ('IF', condition, if_body, else_body)
@@ -205,12 +662,76 @@ class Parser:
     def parse_while_statement(self):
         self.index += 1  # skip 'while'
         condition = self.parse_expression()
+        body = self.parse_loop_body()
+        return ('WHILE', condition, body)
+
+    def parse_loop_body(self):
+        # The statements between '{' and '}' of a loop, where break and continue are allowed
         self.index += 1  # skip '{'
         body = []
-        while self.tokens[self.index][0] != 'RBRACE':
-            body.append(self.parse_statement())
+        self.loop_depth += 1
+        try:
+            while self.kinds[self.index] != T_RBRACE:
+                body.append(self.parse_statement())
+        finally:
+            self.loop_depth -= 1
         self.index += 1  # skip '}'
-        return ('WHILE', condition, body)
+        return body
+
+    def parse_loop_exit(self):
+        keyword = self.values[self.index]
+        if not self.loop_depth:
+            raise ValueError(f"'{keyword}' outside a loop")
+        self.index += 2  # skip the keyword and ';'
+        return ('BREAK',) if keyword == 'break' else ('CONTINUE',)
+
+    def parse_function_definition(self):
+        pure = self.values[self.index] == 'pure'
+        if pure:
+            self.index += 1  # skip 'pure'
+            if self.values[self.index] != 'def':
+                raise ValueError("Expected 'def' after 'pure'")
+        if self.in_function:
+            raise ValueError("Functions cannot be defined inside other functions")
+        self.index += 1  # skip 'def'
+        name = self.values[self.index]
+        if self.kinds[self.index] != T_IDENTIFIER or self.values[self.index + 1] != '(':
+            raise ValueError("Expected a function name and '(' after 'def'")
+        self.index += 2  # skip name and '('
+        params = []
+        while self.values[self.index] != ')':
+            if self.kinds[self.index] != T_IDENTIFIER:
+                raise ValueError(f"Parameters of {name} must be names")
+            params.append(self.values[self.index])
+            self.index += 1
+            if self.values[self.index] == ',':
+                self.index += 1
+        self.index += 1  # skip ')'
+        if len(set(params)) != len(params):
+            raise ValueError(f"Parameters of {name} must have different names")
+        self.index += 1  # skip '{'
+        body = []
+        # A loop around the definition does not extend into the body
+        loop_depth, self.loop_depth = self.loop_depth, 0
+        self.in_function = True
+        try:
+            while self.kinds[self.index] != T_RBRACE:
+                body.append(self.parse_statement())
+        finally:
+            self.in_function = False
+            self.loop_depth = loop_depth
+        self.index += 1  # skip '}'
+        return ('DEF', name, params, body, pure)
+
+    def parse_return_statement(self):
+        if not self.in_function:
+            raise ValueError("'return' outside a function")
+        self.index += 1  # skip 'return'
+        value = None
+        if self.kinds[self.index] != T_SEMICOLON:
+            value = self.parse_expression()
+        self.index += 1  # skip ';'
+        return ('RETURN', value)
 
     def parse_print_statement(self):
         self.index += 1  # skip 'print'
@@ -220,8 +741,8 @@ class Parser:
 
     def parse_expression(self):
         left = self.parse_comparison()
-        while self.index < len(self.tokens) and self.tokens[self.index][0] in ('EQUAL', 'NOTEQUAL'):
-            op = self.tokens[self.index][0]
+        while self.index < len(self.kinds) and self.kinds[self.index] in (T_EQUAL, T_NOTEQUAL):
+            op = TOKEN_KINDS[self.kinds[self.index]]
             self.index += 1
             right = self.parse_comparison()
             left = (op, left, right)
@@ -229,8 +750,8 @@ class Parser:
 
     def parse_comparison(self):
         left = self.parse_term()
-        while self.index < len(self.tokens) and self.tokens[self.index][0] in ('Greater', 'Smaller'):
-            op = self.tokens[self.index][0]
+        while self.index < len(self.kinds) and self.kinds[self.index] in (T_GREATER, T_SMALLER):
+            op = TOKEN_KINDS[self.kinds[self.index]]
             self.index += 1
             right = self.parse_term()
             left = (op, left, right)
@@ -238,27 +759,28 @@ class Parser:
 
     def parse_term(self):
         node = self.parse_factor()
-        while self.index < len(self.tokens) and self.tokens[self.index][1] in ('+', '-'):
-            token_type, operator = self.tokens[self.index]
+        while self.index < len(self.kinds) and self.values[self.index] in ('+', '-'):
+            operator = self.values[self.index]
             self.index += 1
             node = (operator, node, self.parse_factor())
         return node
 
     def parse_factor(self):
         node = self.parse_primary()
-        while self.index < len(self.tokens) and self.tokens[self.index][1] in ('*', '/'):
-            token_type, operator = self.tokens[self.index]
+        while self.index < len(self.kinds) and self.values[self.index] in ('*', '/'):
+            operator = self.values[self.index]
             self.index += 1
             node = (operator, node, self.parse_primary())
         return node
 
     def parse_primary(self):
-        token_type, token_value = self.tokens[self.index]
+        token_type = self.kinds[self.index]
+        token_value = self.values[self.index]
 
         if token_value == '(':
             self.index += 1  # skip '('
             node = self.parse_expression()
-            if self.tokens[self.index][1] == ')':
+            if self.values[self.index] == ')':
                 self.index += 1  # skip ')'
                 return node
             else:
@@ -268,63 +790,61 @@ class Parser:
             return ('UMINUS', self.parse_primary())
         elif token_value == '[':
             return self.parse_array_literal()
-        elif token_type == 'NUMBER':
+        elif token_type == T_NUMBER:
             self.index += 1
             return ('NUMBER', token_value)
         elif token_value == '(':
             return self.parse_tuple()
-        elif token_type == 'IDENTIFIER':
-            if self.tokens[self.index + 1][1] == '(':
+        elif token_type == T_IDENTIFIER:
+            if self.values[self.index + 1] == '(':
                 return self.parse_function_call()
-            elif token_value in ['length', 'index', 'append', 'remove', 'add']:
+            elif token_value in ARRAY_FUNCTIONS:
                 return self.parse_array_function_call(token_value)
-            elif self.tokens[self.index + 1][1] == '[':
+            elif self.values[self.index + 1] == '[':
                 array = ('IDENTIFIER', token_value)
                 self.index += 1
                 return self.parse_array_access(array)
             else:
                 self.index += 1
                 return ('IDENTIFIER', token_value)
-        elif token_type == 'STRING':
+        elif token_type == T_STRING:
             self.index += 1
             return ('STRING', token_value)
         elif token_value == '^':
             return self.parse_tuple()
+        elif token_value == '{':
+            return self.parse_dict_or_set()
         else:
             raise ValueError(f"Unexpected token: {token_value}")
 
     def parse_function_call(self):
-        function_name = self.tokens[self.index][1]
+        function_name = self.values[self.index]
         self.index += 2  # skip identifier and '('
         args = []
-        while self.tokens[self.index][1] != ')':
+        while self.values[self.index] != ')':
             args.append(self.parse_expression())
-            if self.tokens[self.index][1] == ',':
+            if self.values[self.index] == ',':
                 self.index += 1
         self.index += 1  # skip ')'
         return ('FUNCTION_CALL', function_name, args)
 
     def parse_for_statement(self):
         self.index += 1  # skip 'for'
-        variable = self.tokens[self.index][1]
+        variable = self.values[self.index]
         self.index += 1  # skip variable
-        if self.tokens[self.index][1] != 'in':
+        if self.values[self.index] != 'in':
             raise ValueError("Expected 'in' in for loop")
         self.index += 1  # skip 'in'
         iterable = self.parse_expression()
-        self.index += 1  # skip '{'
-        body = []
-        while self.tokens[self.index][0] != 'RBRACE':
-            body.append(self.parse_statement())
-        self.index += 1  # skip '}'
+        body = self.parse_loop_body()
         return ('FOR', variable, iterable, body)
 
     def parse_array_literal(self):
         self.index += 1  # skip '['
         elements = []
-        while self.tokens[self.index][1] != ']':
+        while self.values[self.index] != ']':
             elements.append(self.parse_expression())
-            if self.tokens[self.index][1] == ',':
+            if self.values[self.index] == ',':
                 self.index += 1
         self.index += 1  # skip ']'
         return ('ARRAY', elements)
@@ -338,9 +858,9 @@ class Parser:
     def parse_array_function_call(self, function_name):
         self.index += 2  # skip identifier and '('
         args = []
-        while self.tokens[self.index][1] != ')':
+        while self.values[self.index] != ')':
             args.append(self.parse_expression())
-            if self.tokens[self.index][1] == ',':
+            if self.values[self.index] == ',':
                 self.index += 1
         self.index += 1  # skip ')'
         return ('ARRAY_FUNCTION_CALL', function_name, args)
@@ -348,43 +868,87 @@ class Parser:
     def parse_tuple(self):
         self.index += 1  # skip '^'
         elements = []
-        while self.tokens[self.index][1] != '^':
+        while self.values[self.index] != '^':
             elements.append(self.parse_expression())
-            if self.tokens[self.index][1] == ',':
+            if self.values[self.index] == ',':
                 self.index += 1
         self.index += 1  # skip closing '^'
         return ('TUPLE', elements)
 
+    def parse_dict_or_set(self):
+        # '{}' is an empty dict, '{key: value, ...}' a dict and '{element, ...}' a set
+        self.index += 1  # skip '{'
+        keys, elements = [], []
+        while self.values[self.index] != '}':
+            element = self.parse_expression()
+            if self.kinds[self.index] == T_COLON:
+                self.index += 1  # skip ':'
+                keys.append(element)
+                element = self.parse_expression()
+            elements.append(element)
+            if self.values[self.index] == ',':
+                self.index += 1
+        self.index += 1  # skip '}'
+        if not elements:
+            return ('DICT', [], [])
+        if not keys:
+            return ('SET', elements)
+        if len(keys) != len(elements):
+            raise ValueError("Dict literal mixes 'key: value' pairs with set elements")
+        return ('DICT', keys, elements)
+
 
 # Interpreter: Executes the syntax tree
 class Interpreter:
+    # Whether array literals of only ints or only floats become numeric arrays, which
+    # need NumPy; set by create_interpreter for --numeric-arrays
+    numeric_arrays = False
+    # Entries in the memo of each pure function
+    memo_size = MEMO_SIZE
+
     def __init__(self, syntax_tree):
         self.syntax_tree = syntax_tree
         self.variables = {}
         self.functions = {}
+        # Local variables of a call live in a dict from this pool while it runs
+        self.frames = FramePool(dict, dict.clear)
 
     def evaluate(self):
         for statement in self.syntax_tree:
             self.evaluate_statement(statement)
 
     def evaluate_statement(self, statement):
-        stmt_type = statement[0]
-
-        if stmt_type == 'ASSIGN':
-            self.evaluate_assignment(statement)
-        elif stmt_type == 'ARRAY_ASSIGN':
-            self.evaluate_array_assignment(statement)
-        elif stmt_type == 'IF':
-            self.evaluate_if_statement(statement)
-        elif stmt_type == 'WHILE':
-            self.evaluate_while_statement(statement)
-        elif stmt_type == 'FOR':
-            self.evaluate_for_statement(statement)
-        elif stmt_type == 'PRINT':
-            self.evaluate_print_statement(statement)
-        else:
+        handler = self.statement_handlers.get(statement[0])
+        if handler is None:
             # Handle expression statements (including function calls)
             self.evaluate_expression(statement)
+            return None
+        # BREAK and CONTINUE come back from here to the loop they stop
+        return handler(self, statement)
+
+    def execute_block(self, statements):
+        # Runs statements until one of them is (or contains) a break or continue, and
+        # returns that signal, so loops unwind without raising an exception
+        for statement in statements:
+            signal = self.evaluate_statement(statement)
+            if signal is BREAK or signal is CONTINUE:
+                return signal
+        return None
+
+    @classmethod
+    def register_builtin(cls, name, handler, lazy=()):
+        # handler(interpreter, args) receives the unevaluated argument nodes. lazy lists
+        # the positions of arguments the handler may leave unevaluated; engines that
+        # evaluate arguments before the call hand those over as thunks instead.
+        if 'builtins' not in cls.__dict__:
+            cls.builtins = dict(cls.builtins)
+        if 'lazy_builtins' not in cls.__dict__:
+            cls.lazy_builtins = dict(cls.lazy_builtins)
+        cls.builtins[name] = handler
+        if lazy:
+            cls.lazy_builtins[name] = tuple(lazy)
+        else:
+            cls.lazy_builtins.pop(name, None)
 
     def evaluate_assignment(self, statement):
         variable_name = statement[1]
@@ -395,22 +959,53 @@ class Interpreter:
         array_name = statement[1]
         index = self.evaluate_expression(statement[2])
         value = self.evaluate_expression(statement[3])
-        if array_name not in self.variables or not isinstance(self.variables[array_name], list):
+        self.lookup_array(array_name, ITEM_TYPES)[index] = value
+
+    # `x += value` reads x once; `arr[i] += value` evaluates i once and updates the array
+    # in place. Both combine the values with the engines' BINARY_OPERATORS.
+
+    def evaluate_augmented_assignment(self, statement):
+        variables, variable_name = self.variables, statement[1]
+        current = variables[variable_name]
+        variables[variable_name] = BINARY_OPERATORS[statement[2]](current, self.evaluate_expression(statement[3]))
+
+    def evaluate_array_augmented_assignment(self, statement):
+        index = self.evaluate_expression(statement[2])
+        array = self.lookup_array(statement[1], ITEM_TYPES)
+        array[index] = BINARY_OPERATORS[statement[3]](array[index], self.evaluate_expression(statement[4]))
+
+    def lookup_array(self, array_name, types=ARRAY_TYPES):
+        array = self.variables.get(array_name)
+        if not isinstance(array, types):
+            raise array_error(array_name, array)
+        return array
+
+    def lookup_sequence(self, array_name):
+        # Like lookup_array, for reads, which also accept ranges and dicts
+        array = self.variables.get(array_name)
+        if not isinstance(array, INDEXED_TYPES):
             raise ValueError(f"Array '{array_name}' is not defined.")
-        self.variables[array_name][index] = value
+        return array
 
     def evaluate_if_statement(self, statement):
         condition = self.evaluate_expression(statement[1])
-        if condition:
-            for stmt in statement[2]:
-                self.evaluate_statement(stmt)
-        elif statement[3]:  # else part
-            for stmt in statement[3]:
-                self.evaluate_statement(stmt)
+        for stmt in statement[2] if condition else statement[3]:  # else part
+            signal = self.evaluate_statement(stmt)
+            if signal is BREAK or signal is CONTINUE:
+                return signal
+        return None
+
+    # Loops whose body has no break or continue run it without checking for one
 
     def evaluate_while_statement(self, statement):
-        while self.evaluate_expression(statement[1]):
-            for stmt in statement[2]:
+        condition, body = statement[1], statement[2]
+        if contains_loop_exit(body):
+            while self.evaluate_expression(condition):
+                if self.execute_block(body) is BREAK:
+                    break
+            return
+        while self.evaluate_expression(condition):
+            for stmt in body:
                 self.evaluate_statement(stmt)
 
     def evaluate_for_statement(self, statement):
@@ -418,163 +1013,232 @@ class Interpreter:
         iterable = self.evaluate_expression(statement[2])
         body = statement[3]
 
+        if contains_loop_exit(body):
+            for value in iterable:
+                self.variables[variable] = value
+                if self.execute_block(body) is BREAK:
+                    break
+            return
         for value in iterable:
             self.variables[variable] = value
             for stmt in body:
                 self.evaluate_statement(stmt)
 
+    def evaluate_break_statement(self, statement):
+        return BREAK
+
+    def evaluate_continue_statement(self, statement):
+        return CONTINUE
+
     def evaluate_print_statement(self, statement):
         print(self.evaluate_expression(statement[1]))
 
+    def evaluate_delete_statement(self, statement):
+        # Removes the optimizer's temporaries once the loop that uses them is done
+        for name in statement[1]:
+            self.variables.pop(name, None)
+
+    # User-defined functions. A call runs the body in a frame of its own that holds the
+    # parameters and the variables the body assigns; script variables are not visible.
+
+    def evaluate_function_definition(self, statement):
+        name, params, body, pure = statement[1], statement[2], statement[3], statement[4]
+        if name in self.builtins:
+            raise ValueError(f"Cannot define function '{name}': it is a builtin")
+        self.functions[name] = Function(name, params, body, Memo(self.memo_size) if pure else None)
+
+    def evaluate_return_statement(self, statement):
+        raise FunctionReturn(None if statement[1] is None else self.evaluate_expression(statement[1]))
+
+    def lookup_function(self, name):
+        function = self.functions.get(name)
+        if function is None:
+            raise ValueError(f"Unknown function: {name}")
+        return function
+
+    def call_function(self, function, args):
+        if len(args) != len(function.params):
+            raise ValueError(f"{function.name} expects {len(function.params)} arguments, got {len(args)}")
+        if function.memo is None:
+            return self.run_function(function, args)
+        return function.memo.call(args, lambda: self.run_function(function, args))
+
+    def run_function(self, function, args):
+        frame = self.frames.acquire()
+        frame.update(zip(function.params, args))
+        saved, self.variables = self.variables, frame
+        try:
+            result = self.execute_body(function)
+        finally:
+            self.variables = saved
+        # A returned stream binds its variables in the frame when it is consumed later
+        if not isinstance(result, Stream):
+            self.frames.release(frame)
+        return result
+
+    def current_scope(self):
+        # What enter_scope needs to make the variables in scope now current again
+        return self.variables
+
+    def enter_scope(self, scope):
+        self.variables = scope
+
+    def evaluate_in_scope(self, scope, expression):
+        # Evaluates expression with the variables of scope, a value of current_scope().
+        # Streams use this when they are consumed outside the scope that made them, such
+        # as the frame of a function that has since returned the stream.
+        saved = self.current_scope()
+        self.enter_scope(scope)
+        try:
+            return self.evaluate_expression(expression)
+        finally:
+            self.enter_scope(saved)
+
+    def execute_body(self, function, body=None):
+        # The function's return value, or None if the body ends without a return. body
+        # is the function's body in the form the engine runs, if it is not the parsed one.
+        try:
+            for statement in function.body if body is None else body:
+                self.evaluate_statement(statement)
+        except FunctionReturn as signal:
+            return signal.value
+        return None
+
+    def memo_stats(self):
+        return {name: function.memo.stats() for name, function in self.functions.items() if function.memo}
+
     def evaluate_expression(self, expression):
-        expr_type = expression[0]
-
-        if expr_type == 'NUMBER':
-            return expression[1]
-        elif expr_type == 'UMINUS':
-            return -self.evaluate_expression(expression[1])
-        elif expr_type == 'IDENTIFIER':
-            return self.variables[expression[1]]
-        elif expr_type == 'ARRAY':
-            return self.evaluate_array_literal(expression)
-        elif expr_type == 'ARRAY_ACCESS':
-            return self.evaluate_array_access(expression)
-        elif expr_type == 'ARRAY_FUNCTION_CALL':
-            function_name = expression[1]
-            args = expression[2]
-            return self.evaluate_array_function_call(function_name, args)
-        elif expr_type in ('+', '-', '*', '/'):
-            left = self.evaluate_expression(expression[1])
-            right = self.evaluate_expression(expression[2])
-            if expr_type == '+':
-                return left + right
-            elif expr_type == '-':
-                return left - right
-            elif expr_type == '*':
-                return left * right
-            elif expr_type == '/':
-                if right == 0:
-                    raise ZeroDivisionError("Cannot divide by zero")
-                return left / right
-        elif expr_type in ('Greater', 'Smaller', 'EQUAL', 'NOTEQUAL'):
-            left = self.evaluate_expression(expression[1])
-            right = self.evaluate_expression(expression[2])
-            if expr_type == 'Greater':
-                return left > right
-            elif expr_type == 'Smaller':
-                return left < right
-            elif expr_type == 'EQUAL':
-                return left == right
-            elif expr_type == 'NOTEQUAL':
-                return left != right
-        elif expr_type == 'FUNCTION_CALL':
-            function_name = expression[1]
-            args = expression[2]
-            if function_name == 'power':
-                return self.evaluate_power(args)
-            elif function_name == 'square':
-                return self.evaluate_square(args)
-            elif function_name == 'min':
-                return self.evaluate_min(args)
-            elif function_name == 'max':
-                return self.evaluate_max(args)
-            elif function_name == 'and':
-                return self.evaluate_and(args)
-            elif function_name == 'or':
-                return self.evaluate_or(args)
-            elif function_name == 'range':
-                return self.evaluate_range(args)
-            elif function_name == 'length':
-                return self.evaluate_length(args)
-            elif function_name == 'index':
-                return self.evaluate_index(args)
-            elif function_name == 'append':
-                return self.evaluate_append(args)
-            elif function_name == 'remove':
-                return self.evaluate_remove(args)
-            elif function_name == 'add':
-                return self.evaluate_add(args)
-            elif function_name == 'split':
-                return self.evaluate_split(args)
-            elif function_name == 'replace':
-                return self.evaluate_replace(args)
-            elif function_name == 'isUpper':
-                return self.evaluate_isUpper(args)
-            elif function_name == 'isLower':
-                return self.evaluate_isLower(args)
-            elif function_name == 'Stringlength':
-                return self.evaluate_Stringlength(args)
-            if function_name in ['sort', 'getItem', 'tupleindex', 'tuplelength']:
-                return self.evaluate_tuple_function_call(function_name, args)
-            else:
-                raise ValueError(f"Unknown function: {function_name}")
-        elif expr_type == 'TUPLE':
-            return self.evaluate_tuple_creation(expression[1])
-        elif expr_type == 'STRING':
-            return expression[1]
+        handler = self.expression_handlers.get(expression[0])
+        if handler is not None:
+            return handler(self, expression)
+
+    def evaluate_number(self, expression):
+        return expression[1]
+
+    def evaluate_uminus(self, expression):
+        return -self.evaluate_expression(expression[1])
+
+    def evaluate_identifier(self, expression):
+        return self.variables[expression[1]]
+
+    def evaluate_array_function_call_expression(self, expression):
+        return self.evaluate_array_function_call(expression[1], expression[2])
+
+    def evaluate_plus(self, expression):
+        return add(self.evaluate_expression(expression[1]), self.evaluate_expression(expression[2]))
+
+    def evaluate_minus(self, expression):
+        return self.evaluate_expression(expression[1]) - self.evaluate_expression(expression[2])
+
+    def evaluate_multiply(self, expression):
+        return self.evaluate_expression(expression[1]) * self.evaluate_expression(expression[2])
+
+    def evaluate_divide(self, expression):
+        return divide(self.evaluate_expression(expression[1]), self.evaluate_expression(expression[2]))
+
+    def evaluate_greater(self, expression):
+        return self.evaluate_expression(expression[1]) > self.evaluate_expression(expression[2])
+
+    def evaluate_smaller(self, expression):
+        return self.evaluate_expression(expression[1]) < self.evaluate_expression(expression[2])
+
+    def evaluate_equal(self, expression):
+        return self.evaluate_expression(expression[1]) == self.evaluate_expression(expression[2])
+
+    def evaluate_not_equal(self, expression):
+        return self.evaluate_expression(expression[1]) != self.evaluate_expression(expression[2])
+
+    def evaluate_function_call(self, expression):
+        function_name = expression[1]
+        handler = self.builtins.get(function_name)
+        if handler is None:
+            function = self.lookup_function(function_name)
+            return self.call_function(function, [self.evaluate_expression(arg) for arg in expression[2]])
+        return handler(self, expression[2])
+
+    def evaluate_tuple(self, expression):
+        return self.evaluate_tuple_creation(expression[1])
+
+    def evaluate_string(self, expression):
+        return expression[1]
+
+    def evaluate_int_add(self, expression):
+        # A guess of the types pass that turns out wrong at run time takes add() as before
+        left = self.evaluate_expression(expression[1])
+        right = self.evaluate_expression(expression[2])
+        if left.__class__ is right.__class__ is int:
+            return left + right
+        return add(left, right)
+
+    def evaluate_list_length(self, expression):
+        return list_length(self.evaluate_expression(expression[1]))
+
+    def evaluate_str_split(self, expression):
+        string = self.evaluate_expression(expression[1])
+        return str_split(string, self.evaluate_expression(expression[2]))
+
+    def evaluate_vector_get_item(self, expression):
+        tuple_value = self.evaluate_expression(expression[1])
+        return vector_get_item(tuple_value, self.evaluate_expression(expression[2]))
+
+    def evaluate_thunk(self, expression):
+        # A lazy builtin argument that an engine has already compiled: ('THUNK', function)
+        return expression[1]()
 
     def evaluate_array_literal(self, expression):
         elements = [self.evaluate_expression(e) for e in expression[1]]
+        if self.numeric_arrays:
+            return numeric_literal(elements)
         return elements
 
+    def evaluate_dict(self, expression):
+        return {self.evaluate_expression(key): self.evaluate_expression(value)
+                for key, value in zip(expression[1], expression[2])}
+
+    def evaluate_set(self, expression):
+        return {self.evaluate_expression(element) for element in expression[1]}
+
     def evaluate_array_access(self, expression):
         array_name = expression[1][1]
         index = self.evaluate_expression(expression[2])
-        if array_name not in self.variables or not isinstance(self.variables[array_name], list):
-            raise ValueError(f"Array '{array_name}' is not defined.")
-        return self.variables[array_name][index]
+        return self.lookup_sequence(array_name)[index]
 
     def evaluate_array_function_call(self, function_name, args):
-        if function_name == 'length':
-            return self.evaluate_length(args)
-        elif function_name == 'index':
-            return self.evaluate_index(args)
-        elif function_name == 'append':
-            return self.evaluate_append(args)
-        elif function_name == 'remove':
-            return self.evaluate_remove(args)
-        elif function_name == 'add':
-            return self.evaluate_add(args)
-        else:
+        if function_name not in ARRAY_FUNCTIONS:
             raise ValueError(f"Unknown array function: {function_name}")
+        return self.builtins[function_name](self, args)
 
     def evaluate_length(self, args):
-        array = self.evaluate_expression(args[0])
-        if not isinstance(array, list):
-            raise ValueError("Argument to 'length' must be an array.")
-        return len(array)
+        return checked_length(self.evaluate_expression(args[0]))
 
     def evaluate_index(self, args):
         array = self.evaluate_expression(args[0])
         value = self.evaluate_expression(args[1])
-        if not isinstance(array, list):
+        if not isinstance(array, SEQUENCE_TYPES):
             raise ValueError("Argument to 'index' must be an array.")
         return array.index(value)
 
     def evaluate_append(self, args):
         array_name = args[0][1]
         value = self.evaluate_expression(args[1])
-        if array_name not in self.variables or not isinstance(self.variables[array_name], list):
-            raise ValueError(f"Array '{array_name}' is not defined.")
-        self.variables[array_name].append(value)
-        return self.variables[array_name]
+        array = self.lookup_array(array_name)
+        array.append(value)
+        return array
 
     def evaluate_remove(self, args):
         array_name = args[0][1]
         value = self.evaluate_expression(args[1])
-        if array_name not in self.variables or not isinstance(self.variables[array_name], list):
-            raise ValueError(f"Array '{array_name}' is not defined.")
-        self.variables[array_name].remove(value)
-        return self.variables[array_name]
+        array = self.lookup_array(array_name)
+        array.remove(value)
+        return array
 
     def evaluate_add(self, args):
         array_name = args[0][1]
         index = self.evaluate_expression(args[1])
         value = self.evaluate_expression(args[2])
-        if array_name not in self.variables or not isinstance(self.variables[array_name], list):
-            raise ValueError(f"Array '{array_name}' is not defined.")
-        self.variables[array_name].insert(index, value)
-        return self.variables[array_name]
+        array = self.lookup_array(array_name)
+        array.insert(index, value)
+        return array
 
     def evaluate_power(self, args):
         if len(args) != 2:
@@ -603,28 +1267,32 @@ class Interpreter:
         value2 = self.evaluate_expression(args[1])
         return max(value1, value2)
 
+    # and, or and ifElse only evaluate the arguments they need (see lazy_builtins)
+
     def evaluate_and(self, args):
         if len(args) != 2:
             raise ValueError("and function expects two arguments")
         value1 = self.evaluate_expression(args[0])
-        value2 = self.evaluate_expression(args[1])
-        return value1 and value2
+        return value1 and self.evaluate_expression(args[1])
 
     def evaluate_or(self, args):
         if len(args) != 2:
             raise ValueError("or function expects two arguments")
         value1 = self.evaluate_expression(args[0])
-        value2 = self.evaluate_expression(args[1])
-        return value1 or value2
+        return value1 or self.evaluate_expression(args[1])
+
+    def evaluate_if_else(self, args):
+        if len(args) != 3:
+            raise ValueError("ifElse function expects three arguments: condition, value if true, value if false")
+        if self.evaluate_expression(args[0]):
+            return self.evaluate_expression(args[1])
+        return self.evaluate_expression(args[2])
 
     def evaluate_split(self, args):
         if len(args) != 2:
             raise ValueError("split function expects two arguments: string and delimiter")
         string = self.evaluate_expression(args[0])
-        delimiter = self.evaluate_expression(args[1])
-        if not isinstance(string, str) or not isinstance(delimiter, str):
-            raise ValueError("Arguments to split must be strings")
-        return string.split(delimiter)
+        return checked_split(string, self.evaluate_expression(args[1]))
 
     def evaluate_replace(self, args):
         if len(args) != 3:
@@ -632,51 +1300,75 @@ class Interpreter:
         string = self.evaluate_expression(args[0])
         old = self.evaluate_expression(args[1])
         new = self.evaluate_expression(args[2])
-        if not isinstance(string, str) or not isinstance(old, str) or not isinstance(new, str):
+        if not all(isinstance(value, STRING_TYPES) for value in (string, old, new)):
             raise ValueError("Arguments to replace must be strings")
-        return string.replace(old, new)
+        return str(string).replace(str(old), str(new))
 
     def evaluate_isUpper(self, args):
         if len(args) != 1:
             raise ValueError("isUpper function expects one argument")
         string = self.evaluate_expression(args[0])
-        if not isinstance(string, str):
+        if not isinstance(string, STRING_TYPES):
             raise ValueError("Argument to isUpper must be a string")
-        return string.isupper()
+        return str(string).isupper()
 
     def evaluate_isLower(self, args):
         if len(args) != 1:
             raise ValueError("isLower function expects one argument")
         string = self.evaluate_expression(args[0])
-        if not isinstance(string, str):
+        if not isinstance(string, STRING_TYPES):
             raise ValueError("Argument to isLower must be a string")
-        return string.islower()
+        return str(string).islower()
 
     def evaluate_Stringlength(self, args):
         if len(args) != 1:
             raise ValueError("length function expects one argument")
         string = self.evaluate_expression(args[0])
-        if not isinstance(string, str):
+        if not isinstance(string, STRING_TYPES):
             raise ValueError("Argument to length must be a string")
         return len(string)
 
+    def evaluate_join(self, args):
+        if len(args) != 2:
+            raise ValueError("join function expects two arguments: strings and separator")
+        strings = self.evaluate_iterable(args[0], 'join')
+        separator = self.evaluate_expression(args[1])
+        if not isinstance(separator, STRING_TYPES):
+            raise ValueError("Separator of join must be a string")
+        parts = []
+        for string in strings:
+            if not isinstance(string, STRING_TYPES):
+                raise ValueError("First argument to join must contain only strings")
+            parts.append(str(string))
+        return str(separator).join(parts)
+
+    def evaluate_concat(self, args):
+        # Joins any number of strings at once, without the intermediate strings of +
+        return ''.join(self.string_part(self.evaluate_expression(arg), 'concat') for arg in args)
+
+    @staticmethod
+    def string_part(value, function_name):
+        if not isinstance(value, STRING_TYPES):
+            raise ValueError(f"Arguments to {function_name} must be strings")
+        return str(value)
+
     def evaluate_tuple_creation(self, elements):
-        return tuple(self.evaluate_expression(e) for e in elements)
+        return PersistentVector([self.evaluate_expression(e) for e in elements])
 
     def evaluate_tuple_sort(self, args):
         if len(args) != 1:
             raise ValueError("sort function expects one tuple argument")
         tuple_arg = self.evaluate_expression(args[0])
-        if not isinstance(tuple_arg, tuple):
+        if not isinstance(tuple_arg, TUPLE_TYPES):
             raise ValueError("Argument to sort must be a tuple")
-        return tuple(sorted(tuple_arg))
+        return PersistentVector(sorted(tuple_arg))
 
     def evaluate_tuple_concat(self, args):
         if len(args) != 2:
             raise ValueError("Tuple concatenation expects two tuple arguments")
         tuple1 = self.evaluate_expression(args[0])
         tuple2 = self.evaluate_expression(args[1])
-        if not isinstance(tuple1, tuple) or not isinstance(tuple2, tuple):
+        if not isinstance(tuple1, TUPLE_TYPES) or not isinstance(tuple2, TUPLE_TYPES):
             raise ValueError("Both arguments must be tuples for concatenation")
         return tuple1 + tuple2
 
@@ -684,19 +1376,14 @@ class Interpreter:
         if len(args) != 2:
             raise ValueError("getItem function expects two arguments: tuple and index")
         tuple_arg = self.evaluate_expression(args[0])
-        index = self.evaluate_expression(args[1])
-        if not isinstance(tuple_arg, tuple):
-            raise ValueError("First argument to getItem must be a tuple")
-        if not isinstance(index, int):
-            raise ValueError("Second argument to getItem must be an integer")
-        return tuple_arg[index]
+        return checked_get_item(tuple_arg, self.evaluate_expression(args[1]))
 
     def evaluate_tuple_index(self, args):
         if len(args) != 2:
             raise ValueError("index function expects two arguments: tuple and value")
         tuple_arg = self.evaluate_expression(args[0])
         value = self.evaluate_expression(args[1])
-        if not isinstance(tuple_arg, tuple):
+        if not isinstance(tuple_arg, TUPLE_TYPES):
             raise ValueError("First argument to index must be a tuple")
         return tuple_arg.index(value)
 
@@ -704,21 +1391,14 @@ class Interpreter:
         if len(args) != 1:
             raise ValueError("length function expects one argument")
         arg = self.evaluate_expression(args[0])
-        if not isinstance(arg, (tuple, list, str)):
+        if not isinstance(arg, TUPLE_TYPES + STRING_TYPES + SEQUENCE_TYPES):
             raise ValueError("Argument to length must be a tuple, list, or string")
         return len(arg)
 
     def evaluate_tuple_function_call(self, function_name, args):
-        if function_name == 'sort':
-            return self.evaluate_tuple_sort(args)
-        elif function_name == 'getItem':
-            return self.evaluate_tuple_getitem(args)
-        elif function_name == 'tupleindex':
-            return self.evaluate_tuple_index(args)
-        elif function_name == 'tuplelength':
-            return self.evaluate_tuple_length(args)
-        else:
+        if function_name not in TUPLE_FUNCTIONS:
             raise ValueError(f"Unknown tuple function: {function_name}")
+        return self.builtins[function_name](self, args)
 
     def evaluate_range(self, args):
         if len(args) == 1:
@@ -733,12 +1413,533 @@ class Interpreter:
         else:
             raise ValueError("range() takes 1-3 arguments")
 
-        return list(range(start, stop, step))
+        return LazyRange(start, stop, step)
+
+    def evaluate_to_array(self, args):
+        if len(args) != 1:
+            raise ValueError("toArray function expects one argument")
+        value = self.evaluate_expression(args[0])
+        if not isinstance(value, ITERABLE_TYPES):
+            raise ValueError("Argument to toArray must be an array, range, tuple, string or stream")
+        if isinstance(value, Matrix):
+            return value.data.tolist()
+        return list(value)
+
+    def evaluate_numarray(self, args):
+        if len(args) != 1:
+            raise ValueError("numarray function expects one argument")
+        value = self.evaluate_expression(args[0])
+        if not isinstance(value, ITERABLE_TYPES) or isinstance(value, STRING_TYPES):
+            raise ValueError("Argument to numarray must be an array, range, tuple or stream")
+        return numeric_array(value)
+
+    def evaluate_integer_argument(self, node, function_name):
+        value = self.evaluate_expression(node)
+        if not isinstance(value, int):
+            raise ValueError(f"Arguments to {function_name} must be integers")
+        return value
+
+    # Typed arrays: fixed-size element types, stored without a Python object per element
+
+    def evaluate_zeros(self, args):
+        if len(args) not in (1, 2):
+            raise ValueError("zeros function expects one or two arguments: count and element type")
+        count = self.evaluate_integer_argument(args[0], 'zeros')
+        kind = self.evaluate_expression(args[1]) if len(args) == 2 else 'int'
+        if kind not in TYPECODES:
+            raise ValueError(f"Element type of zeros must be one of: {', '.join(TYPECODES)}")
+        if count < 0:
+            raise ValueError("Count of zeros must not be negative")
+        return zeros_array(count, TYPECODES[kind])
+
+    def evaluate_fill(self, args):
+        if len(args) != 2:
+            raise ValueError("fill function expects two arguments: count and value")
+        count = self.evaluate_integer_argument(args[0], 'fill')
+        value = self.evaluate_expression(args[1])
+        if not isinstance(value, (int, float)):
+            raise ValueError("Second argument to fill must be a number")
+        if count < 0:
+            raise ValueError("Count of fill must not be negative")
+        return filled_array(count, value)
+
+    # Matrices: 2-D grids of numbers, which need NumPy. The builtins also take arrays of
+    # equally long rows wherever they take a matrix.
+
+    def evaluate_matrix_argument(self, node, function_name):
+        return values.matrix_of(self.evaluate_expression(node), function_name)
+
+    def evaluate_matrix(self, args):
+        if len(args) != 1:
+            raise ValueError("matrix function expects one argument: an array of rows")
+        return self.evaluate_matrix_argument(args[0], 'matrix')
+
+    def evaluate_matrix_zeros(self, args):
+        if len(args) != 2:
+            raise ValueError("matrixZeros function expects two arguments: rows and columns")
+        rows = self.evaluate_integer_argument(args[0], 'matrixZeros')
+        columns = self.evaluate_integer_argument(args[1], 'matrixZeros')
+        if rows < 0 or columns < 0:
+            raise ValueError("Arguments to matrixZeros must not be negative")
+        return values.zeros_matrix(rows, columns)
+
+    def evaluate_identity(self, args):
+        if len(args) != 1:
+            raise ValueError("identity function expects one argument: the size")
+        size = self.evaluate_integer_argument(args[0], 'identity')
+        if size < 0:
+            raise ValueError("Argument to identity must not be negative")
+        return values.identity_matrix(size)
+
+    def evaluate_row(self, args):
+        if len(args) != 2:
+            raise ValueError("row function expects two arguments: matrix and index")
+        value = self.evaluate_expression(args[0])
+        index = self.evaluate_integer_argument(args[1], 'row')
+        if isinstance(value, Table):
+            return value[index]
+        return values.matrix_row(values.matrix_of(value, 'row'), index)
+
+    def evaluate_column(self, args):
+        if len(args) != 2:
+            raise ValueError("column function expects two arguments: matrix and index, or table and field")
+        value = self.evaluate_expression(args[0])
+        if isinstance(value, Table):
+            return value.column(self.evaluate_field(args[1], 'column'))
+        matrix = values.matrix_of(value, 'column')
+        return values.matrix_column(matrix, self.evaluate_integer_argument(args[1], 'column'))
+
+    def evaluate_element(self, args):
+        if len(args) != 3:
+            raise ValueError("element function expects three arguments: matrix, row and column")
+        matrix = self.evaluate_matrix_argument(args[0], 'element')
+        row = self.evaluate_integer_argument(args[1], 'element')
+        column = self.evaluate_integer_argument(args[2], 'element')
+        return values.matrix_element(matrix, row, column)
+
+    def evaluate_submatrix(self, args):
+        if len(args) != 5:
+            raise ValueError("submatrix function expects five arguments: matrix, first row, end row, "
+                             "first column, end column")
+        matrix = self.evaluate_matrix_argument(args[0], 'submatrix')
+        bounds = [self.evaluate_integer_argument(arg, 'submatrix') for arg in args[1:]]
+        return values.submatrix(matrix, *bounds)
+
+    def evaluate_shape(self, args):
+        if len(args) != 1:
+            raise ValueError("shape function expects one argument")
+        return tuple(values.numeric_data(self.evaluate_expression(args[0]), 'shape').shape)
+
+    def evaluate_transpose(self, args):
+        if len(args) != 1:
+            raise ValueError("transpose function expects one argument")
+        return values.transpose(self.evaluate_matrix_argument(args[0], 'transpose'))
+
+    def evaluate_matmul(self, args):
+        if len(args) != 2:
+            raise ValueError("matmul function expects two arguments")
+        return values.matmul(self.evaluate_expression(args[0]), self.evaluate_expression(args[1]))
+
+    def evaluate_dot(self, args):
+        if len(args) != 2:
+            raise ValueError("dot function expects two arguments")
+        return values.dot(self.evaluate_expression(args[0]), self.evaluate_expression(args[1]))
+
+    def evaluate_reduction(self, args, function_name, reduction):
+        # Reduces a matrix or array of numbers to one number, or with an axis argument to
+        # one number per column (0) or per row (1)
+        if len(args) not in (1, 2):
+            raise ValueError(f"{function_name} function expects one or two arguments: numbers and axis")
+        value = self.evaluate_expression(args[0])
+        axis = self.evaluate_integer_argument(args[1], function_name) if len(args) == 2 else None
+        return values.reduce_numbers(value, function_name, reduction, axis)
+
+    def evaluate_matrix_sum(self, args):
+        return self.evaluate_reduction(args, 'matrixSum', 'sum')
+
+    def evaluate_matrix_min(self, args):
+        return self.evaluate_reduction(args, 'matrixMin', 'min')
+
+    def evaluate_matrix_max(self, args):
+        return self.evaluate_reduction(args, 'matrixMax', 'max')
+
+    def evaluate_matrix_mean(self, args):
+        return self.evaluate_reduction(args, 'matrixMean', 'mean')
+
+    # Streams: lazy pipelines over arrays, tuples, strings, ranges and other streams.
+    # map, filter and reduce bind a variable to each element, like a for loop does, and
+    # evaluate their expression argument once per element when the stream is consumed.
+
+    def binder_name(self, node, function_name):
+        if node[0] != 'IDENTIFIER':
+            raise ValueError(f"{function_name} expects a variable name as its first argument")
+        return node[1]
+
+    def evaluate_iterable(self, node, function_name):
+        value = self.evaluate_expression(node)
+        if not isinstance(value, ITERABLE_TYPES):
+            raise ValueError(f"Argument to {function_name} must be an array, range, tuple, string or stream")
+        return value
+
+    def evaluate_map(self, args):
+        if len(args) != 3:
+            raise ValueError("map function expects three arguments: variable, iterable, expression")
+        name = self.binder_name(args[0], 'map')
+        source = self.evaluate_iterable(args[1], 'map')
+        expression = args[2]
+        variables, scope = self.variables, self.current_scope()
+
+        def values():
+            for value in source:
+                variables[name] = value
+                if self.variables is variables:
+                    yield self.evaluate_expression(expression)
+                else:
+                    yield self.evaluate_in_scope(scope, expression)
+        return Stream(values)
+
+    def evaluate_filter(self, args):
+        if len(args) != 3:
+            raise ValueError("filter function expects three arguments: variable, iterable, condition")
+        name = self.binder_name(args[0], 'filter')
+        source = self.evaluate_iterable(args[1], 'filter')
+        condition = args[2]
+        variables, scope = self.variables, self.current_scope()
+
+        def values():
+            for value in source:
+                variables[name] = value
+                if self.variables is variables:
+                    keep = self.evaluate_expression(condition)
+                else:
+                    keep = self.evaluate_in_scope(scope, condition)
+                if keep:
+                    yield value
+        return Stream(values)
+
+    def evaluate_reduce(self, args):
+        if len(args) != 5:
+            raise ValueError("reduce function expects five arguments: accumulator, variable, iterable, "
+                             "initial value, expression")
+        accumulator = self.binder_name(args[0], 'reduce')
+        name = self.binder_name(args[1], 'reduce')
+        source = self.evaluate_iterable(args[2], 'reduce')
+        result = self.evaluate_expression(args[3])
+        expression = args[4]
+        variables = self.variables
+        for value in source:
+            variables[accumulator] = result
+            variables[name] = value
+            result = self.evaluate_expression(expression)
+        return result
+
+    def evaluate_take(self, args):
+        if len(args) != 2:
+            raise ValueError("take function expects two arguments: iterable and count")
+        source = self.evaluate_iterable(args[0], 'take')
+        count = self.evaluate_expression(args[1])
+        if not isinstance(count, int):
+            raise ValueError("Second argument to take must be an integer")
+        return Stream(lambda: itertools.islice(source, max(count, 0)))
+
+    def evaluate_zip(self, args):
+        if len(args) != 2:
+            raise ValueError("zip function expects two arguments")
+        first = self.evaluate_iterable(args[0], 'zip')
+        second = self.evaluate_iterable(args[1], 'zip')
+        return Stream(lambda: zip(first, second))
+
+    def evaluate_sum(self, args):
+        if len(args) != 1:
+            raise ValueError("sum function expects one argument")
+        return sum(self.evaluate_iterable(args[0], 'sum'))
+
+    def evaluate_count(self, args):
+        if len(args) != 1:
+            raise ValueError("count function expects one argument")
+        source = self.evaluate_iterable(args[0], 'count')
+        if isinstance(source, Stream):
+            return sum(1 for _ in source)
+        return len(source)
+
+    def evaluate_read_lines(self, args):
+        if len(args) != 1:
+            raise ValueError("readLines function expects one argument: a file path")
+        path = self.evaluate_expression(args[0])
+        if not isinstance(path, STRING_TYPES):
+            raise ValueError("Argument to readLines must be a string")
+        path = str(path)
+
+        def lines():
+            # The file is opened when the stream is consumed, and read a line at a time
+            with open(path) as lines_file:
+                for line in lines_file:
+                    yield line.rstrip('\n')
+        return Stream(lines)
+
+    # Dicts and sets: hash-based containers. d[key] reads and assigns dict entries;
+    # delete and insert change their container in place and return it.
+
+    def evaluate_hashed_argument(self, node, function_name, types=HASHED_TYPES):
+        value = self.evaluate_expression(node)
+        if not isinstance(value, types):
+            expected = {dict: 'a dict', set: 'a set'}.get(types, 'a dict or set')
+            raise ValueError(f"Argument to {function_name} must be {expected}")
+        return value
+
+    def evaluate_has(self, args):
+        if len(args) != 2:
+            raise ValueError("has function expects two arguments: container and key")
+        container = self.evaluate_expression(args[0])
+        if not isinstance(container, HASHED_TYPES + SEQUENCE_TYPES + TUPLE_TYPES + STRING_TYPES):
+            raise ValueError("First argument to has must be a dict, set, array, tuple or string")
+        return self.evaluate_expression(args[1]) in container
+
+    def evaluate_keys(self, args):
+        if len(args) != 1:
+            raise ValueError("keys function expects one argument")
+        return list(self.evaluate_hashed_argument(args[0], 'keys', dict))
+
+    def evaluate_values(self, args):
+        if len(args) != 1:
+            raise ValueError("values function expects one argument")
+        return list(self.evaluate_hashed_argument(args[0], 'values', dict).values())
+
+    def evaluate_delete(self, args):
+        if len(args) != 2:
+            raise ValueError("delete function expects two arguments: container and key")
+        container = self.evaluate_hashed_argument(args[0], 'delete')
+        key = self.evaluate_expression(args[1])
+        if key not in container:
+            raise ValueError(f"Key {key!r} not found in {type(container).__name__}")
+        if isinstance(container, dict):
+            del container[key]
+        else:
+            container.remove(key)
+        return container
+
+    def evaluate_insert(self, args):
+        if len(args) != 2:
+            raise ValueError("insert function expects two arguments: set and element")
+        container = self.evaluate_hashed_argument(args[0], 'insert', set)
+        container.add(self.evaluate_expression(args[1]))
+        return container
+
+    def evaluate_set_operands(self, args, function_name):
+        if len(args) != 2:
+            raise ValueError(f"{function_name} function expects two arguments")
+        first = self.evaluate_hashed_argument(args[0], function_name)
+        second = self.evaluate_hashed_argument(args[1], function_name)
+        if type(first) is not type(second):
+            raise ValueError(f"Arguments to {function_name} must both be dicts or both be sets")
+        return first, second
+
+    def evaluate_union(self, args):
+        first, second = self.evaluate_set_operands(args, 'union')
+        # Entries of the second dict win, as in an assignment
+        return first | second
+
+    def evaluate_intersection(self, args):
+        first, second = self.evaluate_set_operands(args, 'intersection')
+        if isinstance(first, set):
+            return first & second
+        return {key: value for key, value in first.items() if key in second}
+
+    def evaluate_to_set(self, args):
+        if len(args) != 1:
+            raise ValueError("toSet function expects one argument")
+        return set(self.evaluate_iterable(args[0], 'toSet'))
+
+    # Tables: columnar record arrays with named fields. row and column (see the matrix
+    # builtins) also read tables, and t[i] is the i-th row as a tuple.
+
+    def evaluate_table_argument(self, node, function_name):
+        value = self.evaluate_expression(node)
+        if not isinstance(value, Table):
+            raise ValueError(f"First argument to {function_name} must be a table")
+        return value
+
+    def evaluate_field(self, node, function_name):
+        field = self.evaluate_expression(node)
+        if not isinstance(field, STRING_TYPES):
+            raise ValueError(f"Field names given to {function_name} must be strings")
+        return str(field)
+
+    def evaluate_table(self, args):
+        if len(args) != 2:
+            raise ValueError("table function expects two arguments: rows and field names")
+        rows = self.evaluate_iterable(args[0], 'table')
+        names = self.evaluate_expression(args[1])
+        if not isinstance(names, ARRAY_TYPES + TUPLE_TYPES) or not names:
+            raise ValueError("Second argument to table must be a non-empty array of field names")
+        if not all(isinstance(name, STRING_TYPES) for name in names):
+            raise ValueError("Field names given to table must be strings")
+        fields = [str(name) for name in names]
+        if len(set(fields)) != len(fields):
+            raise ValueError("Field names of a table must be different")
+        for row in rows:
+            if not isinstance(row, TUPLE_TYPES + ARRAY_TYPES):
+                raise ValueError("Rows of a table must be tuples or arrays")
+        return Table.from_rows(fields, rows)
+
+    def evaluate_fields(self, args):
+        if len(args) != 1:
+            raise ValueError("fields function expects one argument")
+        return list(self.evaluate_table_argument(args[0], 'fields').fields)
+
+    def evaluate_where(self, args):
+        if len(args) != 4:
+            raise ValueError("where function expects four arguments: table, field, comparison and value")
+        table = self.evaluate_table_argument(args[0], 'where')
+        field = self.evaluate_field(args[1], 'where')
+        comparison = self.evaluate_expression(args[2])
+        if comparison not in COMPARISONS:
+            raise ValueError(f"Comparison of where must be one of: {', '.join(COMPARISONS)}")
+        return table.where(field, COMPARISONS[comparison], self.evaluate_expression(args[3]))
+
+    def evaluate_sort_by(self, args):
+        if len(args) not in (2, 3):
+            raise ValueError("sortBy function expects two or three arguments: table, field and order")
+        table = self.evaluate_table_argument(args[0], 'sortBy')
+        field = self.evaluate_field(args[1], 'sortBy')
+        order = self.evaluate_expression(args[2]) if len(args) == 3 else 'asc'
+        if order not in ('asc', 'desc'):
+            raise ValueError("Order of sortBy must be one of: asc, desc")
+        return table.sorted_by(field, order == 'desc')
+
+    def evaluate_group_by(self, args):
+        if len(args) != 4:
+            raise ValueError("groupBy function expects four arguments: table, key field, value field and aggregation")
+        table = self.evaluate_table_argument(args[0], 'groupBy')
+        key_field = self.evaluate_field(args[1], 'groupBy')
+        value_field = self.evaluate_field(args[2], 'groupBy')
+        aggregation = self.evaluate_expression(args[3])
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Aggregation of groupBy must be one of: {', '.join(AGGREGATIONS)}")
+        return table.grouped(key_field, value_field, aggregation)
+
+    # Dispatch tables: node type -> handler(interpreter, node). Statement types not listed
+    # here are evaluated as expressions; subclasses extend these with {**base, ...}.
+    statement_handlers = {
+        'ASSIGN': evaluate_assignment,
+        'ARRAY_ASSIGN': evaluate_array_assignment,
+        'AUG_ASSIGN': evaluate_augmented_assignment,
+        'ARRAY_AUG_ASSIGN': evaluate_array_augmented_assignment,
+        'IF': evaluate_if_statement,
+        'WHILE': evaluate_while_statement,
+        'FOR': evaluate_for_statement,
+        'PRINT': evaluate_print_statement,
+        'DEF': evaluate_function_definition,
+        'RETURN': evaluate_return_statement,
+        'BREAK': evaluate_break_statement,
+        'CONTINUE': evaluate_continue_statement,
+        'DELETE': evaluate_delete_statement,
+    }
+
+    expression_handlers = {
+        'NUMBER': evaluate_number,
+        'UMINUS': evaluate_uminus,
+        'IDENTIFIER': evaluate_identifier,
+        'ARRAY': evaluate_array_literal,
+        'ARRAY_ACCESS': evaluate_array_access,
+        'ARRAY_FUNCTION_CALL': evaluate_array_function_call_expression,
+        '+': evaluate_plus,
+        '-': evaluate_minus,
+        '*': evaluate_multiply,
+        '/': evaluate_divide,
+        'Greater': evaluate_greater,
+        'Smaller': evaluate_smaller,
+        'EQUAL': evaluate_equal,
+        'NOTEQUAL': evaluate_not_equal,
+        'FUNCTION_CALL': evaluate_function_call,
+        'TUPLE': evaluate_tuple,
+        'STRING': evaluate_string,
+        'DICT': evaluate_dict,
+        'SET': evaluate_set,
+        'THUNK': evaluate_thunk,
+        # Specialised by the optimizer's types pass
+        'INT_ADD': evaluate_int_add,
+        'LIST_LENGTH': evaluate_list_length,
+        'STR_SPLIT': evaluate_str_split,
+        'VECTOR_GET_ITEM': evaluate_vector_get_item,
+    }
+
+    # Builtin functions by name; extend with Interpreter.register_builtin
+    builtins = {
+        'power': evaluate_power,
+        'square': evaluate_square,
+        'min': evaluate_min,
+        'max': evaluate_max,
+        'and': evaluate_and,
+        'or': evaluate_or,
+        'ifElse': evaluate_if_else,
+        'range': evaluate_range,
+        'toArray': evaluate_to_array,
+        'numarray': evaluate_numarray,
+        'zeros': evaluate_zeros,
+        'fill': evaluate_fill,
+        'matrix': evaluate_matrix,
+        'matrixZeros': evaluate_matrix_zeros,
+        'identity': evaluate_identity,
+        'row': evaluate_row,
+        'column': evaluate_column,
+        'element': evaluate_element,
+        'submatrix': evaluate_submatrix,
+        'shape': evaluate_shape,
+        'transpose': evaluate_transpose,
+        'matmul': evaluate_matmul,
+        'dot': evaluate_dot,
+        'matrixSum': evaluate_matrix_sum,
+        'matrixMin': evaluate_matrix_min,
+        'matrixMax': evaluate_matrix_max,
+        'matrixMean': evaluate_matrix_mean,
+        'map': evaluate_map,
+        'filter': evaluate_filter,
+        'reduce': evaluate_reduce,
+        'take': evaluate_take,
+        'zip': evaluate_zip,
+        'sum': evaluate_sum,
+        'count': evaluate_count,
+        'readLines': evaluate_read_lines,
+        'has': evaluate_has,
+        'keys': evaluate_keys,
+        'values': evaluate_values,
+        'delete': evaluate_delete,
+        'insert': evaluate_insert,
+        'union': evaluate_union,
+        'intersection': evaluate_intersection,
+        'toSet': evaluate_to_set,
+        'table': evaluate_table,
+        'fields': evaluate_fields,
+        'where': evaluate_where,
+        'sortBy': evaluate_sort_by,
+        'groupBy': evaluate_group_by,
+        'length': evaluate_length,
+        'index': evaluate_index,
+        'append': evaluate_append,
+        'remove': evaluate_remove,
+        'add': evaluate_add,
+        'split': evaluate_split,
+        'replace': evaluate_replace,
+        'isUpper': evaluate_isUpper,
+        'isLower': evaluate_isLower,
+        'Stringlength': evaluate_Stringlength,
+        'join': evaluate_join,
+        'concat': evaluate_concat,
+        'sort': evaluate_tuple_sort,
+        'getItem': evaluate_tuple_getitem,
+        'tupleindex': evaluate_tuple_index,
+        'tuplelength': evaluate_tuple_length,
+    }
+
+    # Builtins that evaluate some arguments only when they need them, by the positions of
+    # those arguments. Engines that evaluate builtin arguments before the call (vm,
+    # python) compile these into thunks instead; see Interpreter.register_builtin.
+    lazy_builtins = {'and': (1,), 'or': (1,), 'ifElse': (1, 2)}
 
 
 # Main: Putting everything together
-def main():
-    source_code = """
+DEMO_SOURCE = """
     print("==============================");
 print("Mathematics:");
 print(2 + 3 * 4);
@@ -829,15 +2030,182 @@ print("==============================");
 
     """
 
-    lexer = Lexer(source_code)
+
+ENGINES = ('tree', 'slots', 'nodes', 'closure', 'vm', 'python')
+
+
+def compile_source(source_code, lexer_engine='regex'):
+    # The frontend: source text to syntax tree
+    return Parser(Lexer(source_code, engine=lexer_engine).tokenize()).parse()
+
+
+def create_interpreter(syntax_tree, engine='tree', numeric_arrays=False, memo_size=MEMO_SIZE):
+    interpreter = create_engine(syntax_tree, engine)
+    if numeric_arrays:
+        interpreter.numeric_arrays = True
+    if memo_size != MEMO_SIZE:
+        interpreter.memo_size = memo_size
+    return interpreter
+
+
+def create_engine(syntax_tree, engine):
+    # The alternative engines live in their own modules, which build on the classes above
+    if engine == 'slots':
+        from resolver import SlotInterpreter
+        return SlotInterpreter(syntax_tree)
+    elif engine == 'nodes':
+        from ast_nodes import NodeInterpreter, from_tuple
+        if isinstance(syntax_tree, list):
+            return NodeInterpreter(from_tuple(syntax_tree))
+        return NodeInterpreter(map(from_tuple, syntax_tree))
+    elif engine == 'closure':
+        from closure_compiler import ClosureInterpreter
+        return ClosureInterpreter(syntax_tree)
+    elif engine == 'vm':
+        from vm import VMInterpreter
+        return VMInterpreter(syntax_tree)
+    elif engine == 'python':
+        from transpiler import TranspiledInterpreter
+        return TranspiledInterpreter(syntax_tree)
+    elif engine != 'tree':
+        raise ValueError(f"Unknown engine: {engine}")
+    return Interpreter(syntax_tree)
+
+
+def run_stream(source_file, chunk_size=65536, engine='tree', optimizer=None, numeric_arrays=False,
+               memo_size=MEMO_SIZE, lexer_engine='regex'):
+    # Lex, parse and execute one top-level statement at a time, so memory is bounded
+    # by the largest statement rather than by the size of the script
+    lexer = Lexer(source_file, engine=lexer_engine)
+    parser = Parser(lexer.iter_tokens(chunk_size))
+    statements = parser.iter_statements()
+    if optimizer is not None:
+        statements = optimizer.optimize_stream(statements)
+    interpreter = create_interpreter(statements, engine, numeric_arrays, memo_size)
+    interpreter.evaluate()
+    return interpreter
+
+
+def create_optimizer(optimize, passes=None):
+    # passes is the value of --optimize-passes, a comma-separated list that implies --optimize
+    if not optimize and passes is None:
+        return None
+    from optimizer import PASSES, Optimizer
+    return Optimizer(PASSES if passes is None else passes.split(','))
+
+
+def print_listing(syntax_tree, args):
+    # The compiled form of the program, for debugging the vm and python engines
+    if args.disassemble:
+        from vm import VMInterpreter, disassemble
+        print(disassemble(VMInterpreter(syntax_tree).compile(syntax_tree)))
+    if args.show_source:
+        interpreter = create_interpreter(syntax_tree, 'python', args.numeric_arrays)
+        source, _ = interpreter.transpile(syntax_tree)
+        print(source, end='')
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Run a script, or the demo program if no script is given.")
+    arg_parser.add_argument('script', nargs='?', help="path of the script to run")
+    arg_parser.add_argument('--lexer', choices=Lexer.ENGINES,
+                            help="tokenizer engine (default: scan, or regex with --stream)")
+    arg_parser.add_argument('--engine', choices=ENGINES, default='tree', help="execution engine")
+    arg_parser.add_argument('--stream', action='store_true',
+                            help="lex, parse and execute the script one statement at a time")
+    arg_parser.add_argument('--cache-dir', help="directory of the compile cache for parsed scripts")
+    arg_parser.add_argument('--cache-size', type=int, default=64, help="compile cache size limit in MB")
+    arg_parser.add_argument('--cache-stats', action='store_true', help="print compile cache counters to stderr")
+    arg_parser.add_argument('--disassemble', action='store_true',
+                            help="print the VM bytecode of the program instead of running it")
+    arg_parser.add_argument('--show-source', action='store_true',
+                            help="print the Python source generated for the program instead of running it")
+    arg_parser.add_argument('--optimize', action='store_true', help="optimize the syntax tree before running it")
+    arg_parser.add_argument('--optimize-passes', metavar='PASSES',
+                            help="comma-separated subset of fold,branches,hoist,types to run; implies --optimize")
+    arg_parser.add_argument('--optimize-stats', action='store_true', help="print optimizer statistics to stderr")
+    arg_parser.add_argument('--numeric-arrays', action='store_true',
+                            help="store array literals of numbers as NumPy arrays, if NumPy is installed")
+    arg_parser.add_argument('--memo-size', type=int, default=MEMO_SIZE,
+                            help="results each pure function remembers before evicting the least recently used")
+    arg_parser.add_argument('--memo-stats', action='store_true', help="print memo counters of pure functions to stderr")
+    args = arg_parser.parse_args(argv)
+    if args.memo_size < 1:
+        arg_parser.error("--memo-size must be at least 1")
+    if args.stream:
+        # Stream mode never holds the whole source or syntax tree, so it cannot use these
+        if args.script is None:
+            arg_parser.error("--stream requires a script")
+        if args.lexer == 'scan':
+            arg_parser.error("--stream requires the regex lexer")
+        for option in ('cache_dir', 'disassemble', 'show_source'):
+            if getattr(args, option):
+                arg_parser.error(f"--stream cannot be combined with --{option.replace('_', '-')}")
+    if args.lexer is None:
+        args.lexer = 'regex' if args.stream else 'scan'
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), RECURSION_LIMIT))
+    try:
+        optimizer = create_optimizer(args.optimize, args.optimize_passes)
+    except ValueError as error:
+        arg_parser.error(str(error))
+
+    def frontend(source):
+        syntax_tree = compile_source(source, args.lexer)
+        if optimizer is not None:
+            syntax_tree = optimizer.optimize(syntax_tree)
+        return syntax_tree
+
+    if args.script is not None:
+        with open(args.script) as source_file:
+            if args.stream:
+                interpreter = run_stream(source_file, engine=args.engine, optimizer=optimizer,
+                                         numeric_arrays=args.numeric_arrays, memo_size=args.memo_size,
+                                         lexer_engine=args.lexer)
+                if optimizer is not None and args.optimize_stats:
+                    print("Optimizer:", optimizer.stats, file=sys.stderr)
+                if args.memo_stats:
+                    print("Memo:", interpreter.memo_stats(), file=sys.stderr)
+                return
+            source_code = source_file.read()
+        if args.cache_dir:
+            from compile_cache import CompileCache
+            cache = CompileCache(args.cache_dir, INTERPRETER_VERSION, args.cache_size * 1024 * 1024)
+            variant = '' if optimizer is None else 'optimize:' + ','.join(optimizer.passes)
+            syntax_tree = cache.load(source_code, frontend, variant)
+            if args.cache_stats:
+                print("Compile cache:", cache.stats(), file=sys.stderr)
+        else:
+            syntax_tree = frontend(source_code)
+        if optimizer is not None and args.optimize_stats:
+            print("Optimizer:", optimizer.stats, file=sys.stderr)
+        if args.disassemble or args.show_source:
+            print_listing(syntax_tree, args)
+            return
+        interpreter = create_interpreter(syntax_tree, args.engine, args.numeric_arrays, args.memo_size)
+        interpreter.evaluate()
+        if args.memo_stats:
+            print("Memo:", interpreter.memo_stats(), file=sys.stderr)
+        return
+
+    source_code = DEMO_SOURCE
+
+    lexer = Lexer(source_code, engine=args.lexer)
     tokens = lexer.tokenize()
     print("Tokens:", tokens)
 
     parser = Parser(tokens)
     syntax_tree = parser.parse()
+    if optimizer is not None:
+        syntax_tree = optimizer.optimize(syntax_tree)
+        if args.optimize_stats:
+            print("Optimizer:", optimizer.stats, file=sys.stderr)
     print("Syntax Tree:", syntax_tree)
 
-    interpreter = Interpreter(syntax_tree)
+    if args.disassemble or args.show_source:
+        print_listing(syntax_tree, args)
+        return
+
+    interpreter = create_interpreter(syntax_tree, args.engine, args.numeric_arrays, args.memo_size)
     interpreter.evaluate()
 
 
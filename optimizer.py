@@ -0,0 +1,654 @@
+# Optimizer: Rewrites the syntax tree before execution
+import time
+
+from main import ARRAY_FUNCTIONS, BINARY_OPERATORS, BINDER_BUILTINS, NAME_BUILTINS, Interpreter, contains_loop_exit
+
+PASSES = ('fold', 'branches', 'hoist', 'types')
+
+# Builtins without side effects, with the number of arguments their handler accepts
+PURE_BUILTINS = {'power': 2, 'square': 1, 'min': 2, 'max': 2}
+
+# Builtins that pick one of their arguments by the value of the first, with the number
+# of arguments their handler accepts
+CONDITIONAL_BUILTINS = {'and': 2, 'or': 2, 'ifElse': 3}
+
+# Builtins that change an array, dict or set in place
+MUTATING_BUILTINS = frozenset({'append', 'remove', 'add', 'delete', 'insert'})
+
+# Folded strings longer than this stay as they are, to keep the tree small
+MAX_FOLDED_STRING = 4096
+# power() is only folded for exponents up to this size
+MAX_FOLDED_EXPONENT = 256
+
+CONTROL_KINDS = frozenset({'IF', 'WHILE', 'FOR'})
+
+# Types the types pass tracks: 'int', 'float', 'bool', 'str', 'range', 'tuple', 'dict',
+# 'set' and ('list', element type), where element types are the scalar ones. None is
+# any type; NO_TYPE is the type of a variable or element nothing has been assigned to.
+NO_TYPE = object()
+SCALAR_TYPES = frozenset({'int', 'float', 'bool', 'str'})
+NUMBER_TYPES = frozenset({'int', 'float', 'bool'})
+LITERAL_TYPES = {int: 'int', float: 'float', bool: 'bool'}
+
+# Result types of stock builtins that do not depend on their arguments
+BUILTIN_TYPES = {
+    'length': 'int', 'index': 'int', 'Stringlength': 'int', 'tuplelength': 'int', 'tupleindex': 'int',
+    'split': ('list', 'str'), 'toArray': ('list', None), 'range': 'range',
+}
+
+# Builtin calls the types pass specialises, by name: the node type of the specialised
+# call and the argument types it needs (see main.SPECIALISED_BUILTINS)
+SPECIALISED_CALLS = {
+    'length': ('LIST_LENGTH', ('list',)),
+    'split': ('STR_SPLIT', ('str', 'str')),
+    'getItem': ('VECTOR_GET_ITEM', ('tuple', 'int')),
+}
+
+
+def constant_value(node):
+    # (True, value) for NUMBER and STRING nodes, (False, None) for anything else
+    if node[0] == 'NUMBER' or node[0] == 'STRING':
+        return True, node[1]
+    return False, None
+
+
+def constant_node(value):
+    # The node for a folded value, or None if the value cannot be a literal
+    if isinstance(value, str):
+        if len(value) > MAX_FOLDED_STRING:
+            return None
+        return ('STRING', value)
+    if isinstance(value, (bool, int, float)):
+        return ('NUMBER', value)
+    return None
+
+
+def evaluate_pure_builtin(name, args):
+    # Mirrors Interpreter.evaluate_power/square/min/max for constant arguments
+    if name == 'power':
+        base, exponent = args
+        if isinstance(exponent, (int, float)) and abs(exponent) > MAX_FOLDED_EXPONENT:
+            raise OverflowError("exponent too large to fold")
+        return base ** exponent
+    if name == 'square':
+        return args[0] ** 0.5
+    if name == 'min':
+        return min(args[0], args[1])
+    return max(args[0], args[1])
+
+
+def join(first, second):
+    # The type of a value that has either of two types
+    if first is NO_TYPE:
+        return second
+    if second is NO_TYPE or first == second:
+        return first
+    if isinstance(first, tuple) and isinstance(second, tuple):
+        return ('list', join(first[1], second[1]))
+    return None
+
+
+def list_of(element):
+    # Lists of lists are only tracked as lists, which keeps the inference finite
+    return ('list', element if element is NO_TYPE or element in SCALAR_TYPES else None)
+
+
+def base_type(value_type):
+    # 'list' for list types, the type itself for the others
+    return value_type[0] if isinstance(value_type, tuple) else value_type
+
+
+def operator_type(operator, left, right):
+    # The type of `left operator right`, as BINARY_OPERATORS computes it
+    if left is NO_TYPE or right is NO_TYPE:
+        return NO_TYPE
+    if left in NUMBER_TYPES and right in NUMBER_TYPES:
+        if operator in ('+', '-', '*', '/'):
+            if operator == '/' or 'float' in (left, right):
+                return 'float'
+            return 'int'
+        return 'bool'
+    if operator in ('+', '-', '*', '/'):
+        if operator == '+' and isinstance(left, tuple) and isinstance(right, tuple):
+            return join(left, right)
+        # Long strings concatenate to ropes, so str + str is not a str
+        return None
+    if left == right == 'str':
+        return 'bool'
+    return None
+
+
+def element_type(iterable):
+    # The type of the values a for loop over an iterable of this type binds
+    if iterable is NO_TYPE:
+        return NO_TYPE
+    if iterable == 'range':
+        return 'int'
+    if iterable == 'str':
+        return 'str'
+    if isinstance(iterable, tuple):
+        return iterable[1]
+    return None
+
+
+class Optimizer:
+    def __init__(self, passes=PASSES, builtins=None):
+        unknown = set(passes) - set(PASSES)
+        if unknown:
+            raise ValueError(f"Unknown optimizer pass: {', '.join(sorted(unknown))}")
+        self.passes = [name for name in PASSES if name in passes]
+        self.builtins = Interpreter.builtins if builtins is None else builtins
+        # Per pass: how many rewrites it made and how long it took
+        self.stats = {name: {'rewrites': 0, 'seconds': 0.0} for name in self.passes}
+        self.temporaries = 0
+
+    def optimize(self, statements):
+        for name in self.passes:
+            start = time.perf_counter()
+            statements = getattr(self, 'pass_' + name)(statements)
+            self.stats[name]['seconds'] += time.perf_counter() - start
+        return statements
+
+    def optimize_stream(self, statements):
+        # Optimizes one top-level statement at a time, for streamed execution
+        for statement in statements:
+            yield from self.optimize([statement])
+
+    def count(self, name):
+        self.stats[name]['rewrites'] += 1
+
+    def is_stock(self, name):
+        # Only builtins that still have their stock handler have known behaviour
+        return name in Interpreter.builtins and self.builtins.get(name) is Interpreter.builtins[name]
+
+    # Walking
+
+    def map_statements(self, statements, rewrite_statement):
+        # rewrite_statement returns a list of statements to put in place of one statement
+        result = []
+        for statement in statements:
+            result.extend(rewrite_statement(statement))
+        return result
+
+    def map_children(self, node, rewrite):
+        # Applies rewrite to every child node and block of node
+        items = []
+        for item in node[1:]:
+            if isinstance(item, list):
+                item = [rewrite(child) if isinstance(child, tuple) else child for child in item]
+            elif isinstance(item, tuple) and item and isinstance(item[0], str):
+                item = rewrite(item)
+            items.append(item)
+        return (node[0],) + tuple(items)
+
+    # Constant folding
+
+    def pass_fold(self, statements):
+        return [self.fold(statement) for statement in statements]
+
+    def fold(self, node):
+        node = self.map_children(node, self.fold)
+        kind = node[0]
+        if kind in BINARY_OPERATORS:
+            left_known, left = constant_value(node[1])
+            right_known, right = constant_value(node[2])
+            if left_known and right_known:
+                try:
+                    folded = constant_node(BINARY_OPERATORS[kind](left, right))
+                except (ArithmeticError, TypeError, ValueError):
+                    # Errors are left for run time, where they are reported as before
+                    folded = None
+                if folded is not None:
+                    self.count('fold')
+                    return folded
+        elif kind == 'UMINUS':
+            known, value = constant_value(node[1])
+            if known and not isinstance(value, str):
+                self.count('fold')
+                return ('NUMBER', -value)
+        elif kind == 'FUNCTION_CALL' and node[1] in PURE_BUILTINS and self.is_stock(node[1]):
+            args = node[2]
+            if len(args) == PURE_BUILTINS[node[1]]:
+                values = [constant_value(arg) for arg in args]
+                if all(known for known, _ in values):
+                    try:
+                        folded = constant_node(evaluate_pure_builtin(node[1], [value for _, value in values]))
+                    except (ArithmeticError, TypeError, ValueError):
+                        folded = None
+                    if folded is not None:
+                        self.count('fold')
+                        return folded
+        elif kind == 'FUNCTION_CALL' and node[1] in CONDITIONAL_BUILTINS and self.is_stock(node[1]):
+            args = node[2]
+            known, value = constant_value(args[0]) if args else (False, None)
+            if known and len(args) == CONDITIONAL_BUILTINS[node[1]]:
+                # A constant first argument decides which argument is the result
+                self.count('fold')
+                if node[1] == 'and':
+                    return args[1] if value else args[0]
+                if node[1] == 'or':
+                    return args[0] if value else args[1]
+                return args[1] if value else args[2]
+        return node
+
+    # Dead-branch elimination
+
+    def pass_branches(self, statements):
+        return self.map_statements(statements, self.prune)
+
+    def prune(self, statement):
+        kind = statement[0]
+        if kind == 'IF':
+            known, value = constant_value(statement[1])
+            if known:
+                self.count('branches')
+                return self.pass_branches(statement[2] if value else statement[3])
+            return [('IF', statement[1], self.pass_branches(statement[2]),
+                     self.pass_branches(statement[3]))]
+        if kind == 'WHILE':
+            known, value = constant_value(statement[1])
+            if known and not value:
+                self.count('branches')
+                return []
+            return [('WHILE', statement[1], self.pass_branches(statement[2]))]
+        if kind == 'FOR':
+            return [('FOR', statement[1], statement[2], self.pass_branches(statement[3]))]
+        return [statement]
+
+    # Loop-invariant hoisting
+
+    def pass_hoist(self, statements):
+        return self.map_statements(statements, self.hoist)
+
+    def hoist(self, statement):
+        kind = statement[0]
+        if kind == 'IF':
+            return [('IF', statement[1], self.pass_hoist(statement[2]), self.pass_hoist(statement[3]))]
+        if kind not in ('WHILE', 'FOR'):
+            return [statement]
+        # Inner loops first, so their invariants are already out of the way
+        body = self.pass_hoist(statement[3] if kind == 'FOR' else statement[2])
+        if kind == 'FOR':
+            statement = ('FOR', statement[1], statement[2], body)
+        else:
+            statement = ('WHILE', statement[1], body)
+
+        assigned = set()
+        if kind == 'FOR':
+            assigned.add(statement[1])
+        if not self.collect_assignments(body, assigned):
+            return [statement]
+        if kind == 'WHILE' and not self.is_pure(statement[1]):
+            return [statement]
+        if kind == 'FOR' and not self.runs_are_known(statement[2]):
+            # Whether a stream or an array variable is empty cannot be told without
+            # iterating it, so nothing can be hoisted ahead of the loop
+            return [statement]
+
+        # Only expressions that every iteration evaluates before its first print, break or
+        # continue are moved, so a hoisted expression never runs unless the original would
+        condition_candidates = []
+        if kind == 'WHILE':
+            self.collect_invariants(statement[1], assigned, condition_candidates)
+        body_candidates = []
+        for body_statement in body:
+            for expression in self.evaluated_expressions(body_statement):
+                self.collect_invariants(expression, assigned, body_candidates)
+            if self.contains_print(body_statement) or contains_loop_exit([body_statement]):
+                break
+        if not condition_candidates and not body_candidates:
+            return [statement]
+
+        temporaries = {}
+        before = self.temporaries_for(condition_candidates, temporaries)
+        guarded = self.temporaries_for(body_candidates, temporaries)
+        body = [self.replace(item, temporaries) for item in body]
+
+        names = list(temporaries.values())
+        if kind == 'WHILE':
+            # The condition always runs at least once, so its invariants go first. The
+            # guard keeps the body's hoisted code from running when the loop would not;
+            # the condition is pure, so evaluating it once more is not observable.
+            condition = self.replace(statement[1], temporaries)
+            if not guarded:
+                loop = [('WHILE', condition, body)]
+            else:
+                loop = [('IF', condition, guarded + [('WHILE', condition, body)], [])]
+        else:
+            # The iterable is evaluated first, as before. A literal with elements always
+            # runs the body; a range does if it is not empty.
+            iterable = self.temporary()
+            names.append(iterable)
+            loop = guarded + [('FOR', statement[1], ('IDENTIFIER', iterable), body)]
+            if statement[2][0] != 'ARRAY':
+                loop = [('IF', ('IDENTIFIER', iterable), loop, [])]
+            loop.insert(0, ('ASSIGN', iterable, statement[2]))
+        # The temporaries are removed once the loop is done, so they never show up among
+        # the script's variables
+        return before + loop + [('DELETE', names)]
+
+    def temporary(self):
+        name = f"__hoist{self.temporaries}"
+        self.temporaries += 1
+        return name
+
+    def runs_are_known(self, iterable):
+        # Whether a for loop over iterable can tell before it starts if its body runs:
+        # always, for an array literal with elements, or by the length of a range
+        if iterable[0] == 'ARRAY':
+            return bool(iterable[1])
+        return iterable[0] == 'FUNCTION_CALL' and iterable[1] == 'range' and self.is_stock('range')
+
+    def temporaries_for(self, candidates, temporaries):
+        # Assignments of each distinct candidate to a new temporary variable
+        assignments = []
+        for expression in candidates:
+            key = repr(expression)
+            if key not in temporaries:
+                name = temporaries[key] = self.temporary()
+                assignments.append(('ASSIGN', name, expression))
+                self.count('hoist')
+        return assignments
+
+    def collect_assignments(self, statements, assigned):
+        # Adds every variable the statements assign to assigned; returns False if they
+        # change an array in place, bind variables through map/filter/reduce or call a
+        # builtin with unknown effects
+        for statement in statements:
+            kind = statement[0]
+            if kind == 'ASSIGN' or kind == 'AUG_ASSIGN':
+                assigned.add(statement[1])
+            elif kind == 'ARRAY_ASSIGN' or kind == 'ARRAY_AUG_ASSIGN':
+                return False
+            elif kind == 'FOR':
+                assigned.add(statement[1])
+            elif kind == 'DELETE':
+                assigned.update(statement[1])
+            if not self.calls_are_known(statement):
+                return False
+            for item in statement[1:]:
+                if isinstance(item, list) and not self.collect_assignments(item, assigned):
+                    return False
+        return True
+
+    def calls_are_known(self, node):
+        if node[0] in ('FUNCTION_CALL', 'ARRAY_FUNCTION_CALL'):
+            if node[1] in MUTATING_BUILTINS or node[1] in BINDER_BUILTINS or not self.is_stock(node[1]):
+                return False
+        for item in node[1:]:
+            if isinstance(item, tuple) and item and isinstance(item[0], str):
+                if not self.calls_are_known(item):
+                    return False
+            elif isinstance(item, list) and item and isinstance(item[0], tuple):
+                if node[0] in CONTROL_KINDS:
+                    continue  # blocks are checked statement by statement
+                if not all(self.calls_are_known(child) for child in item):
+                    return False
+        return True
+
+    def is_pure(self, node):
+        # Pure expressions only read variables and call builtins without side effects
+        kind = node[0]
+        if kind in ('NUMBER', 'STRING', 'IDENTIFIER'):
+            return True
+        if kind in BINARY_OPERATORS:
+            return self.is_pure(node[1]) and self.is_pure(node[2])
+        if kind == 'UMINUS':
+            return self.is_pure(node[1])
+        if kind == 'FUNCTION_CALL' and node[1] in PURE_BUILTINS and self.is_stock(node[1]):
+            return len(node[2]) == PURE_BUILTINS[node[1]] and all(self.is_pure(arg) for arg in node[2])
+        return False
+
+    def is_invariant(self, node, assigned):
+        kind = node[0]
+        if kind == 'IDENTIFIER':
+            return node[1] not in assigned
+        if kind in ('NUMBER', 'STRING'):
+            return True
+        return self.is_pure(node) and all(
+            self.is_invariant(child, assigned) for child in self.operands(node))
+
+    @staticmethod
+    def operands(node):
+        if node[0] == 'FUNCTION_CALL':
+            return node[2]
+        return [item for item in node[1:] if isinstance(item, tuple)]
+
+    def collect_invariants(self, node, assigned, candidates):
+        # Adds the largest invariant pure subexpressions of node that do some work
+        kind = node[0]
+        if kind in ('NUMBER', 'STRING', 'IDENTIFIER'):
+            return
+        if self.is_invariant(node, assigned):
+            candidates.append(node)
+            return
+        if kind == 'FUNCTION_CALL' and node[1] in Interpreter.lazy_builtins and self.is_stock(node[1]):
+            # Arguments a lazy builtin may skip are not evaluated on every iteration
+            lazy = Interpreter.lazy_builtins[node[1]]
+            for position, arg in enumerate(node[2]):
+                if position not in lazy:
+                    self.collect_invariants(arg, assigned, candidates)
+            return
+        for item in node[1:]:
+            if isinstance(item, tuple) and item and isinstance(item[0], str):
+                self.collect_invariants(item, assigned, candidates)
+            elif isinstance(item, list) and kind not in CONTROL_KINDS:
+                for child in item:
+                    if isinstance(child, tuple):
+                        self.collect_invariants(child, assigned, candidates)
+
+    @staticmethod
+    def evaluated_expressions(statement):
+        # The expressions a statement always evaluates when it runs
+        kind = statement[0]
+        if kind == 'ASSIGN':
+            return [statement[2]]
+        if kind == 'ARRAY_ASSIGN':
+            return [statement[2], statement[3]]
+        if kind == 'AUG_ASSIGN':
+            return [statement[3]]
+        if kind == 'ARRAY_AUG_ASSIGN':
+            return [statement[2], statement[4]]
+        if kind == 'IF' or kind == 'WHILE' or kind == 'PRINT':
+            return [statement[1]]
+        if kind == 'FOR':
+            return [statement[2]]
+        if kind == 'DELETE':
+            return []
+        return [statement]
+
+    def contains_print(self, statement):
+        if statement[0] == 'PRINT':
+            return True
+        return any(isinstance(item, list) and any(self.contains_print(child) for child in item)
+                   for item in statement[1:])
+
+    def replace(self, node, temporaries):
+        name = temporaries.get(repr(node))
+        if name is not None:
+            return ('IDENTIFIER', name)
+        return self.map_children(node, lambda child: self.replace(child, temporaries))
+
+    # Type inference
+
+    def pass_types(self, statements):
+        # Infers variable types and replaces '+', length, split and getItem with nodes
+        # specialised for the types it proves. The inference is flow-insensitive: a
+        # variable's type covers every assignment to it among statements. A variable can
+        # still hold another type at run time when it was assigned before them (in an
+        # earlier streamed statement, say), so the specialised nodes check their operands
+        # and take the generic path for anything else.
+        return self.specialise_block(statements, self.infer_types(statements, ()))
+
+    def infer_types(self, statements, params):
+        # Variable types in a scope: the top level or a function body with its parameters
+        if not self.calls_are_typed(statements):
+            return {}
+        types = {name: NO_TYPE for name in self.assigned_names(statements, set())}
+        types.update((param, None) for param in params)
+        while True:
+            before = dict(types)
+            self.assign_types(statements, types)
+            if types == before:
+                return types
+
+    def calls_are_typed(self, statements):
+        # Builtins with their own handler can read and write any variable; their
+        # scope is left as it is
+        stack = list(statements)
+        while stack:
+            node = stack.pop()
+            if node[0] == 'DEF':
+                continue
+            if node[0] in ('FUNCTION_CALL', 'ARRAY_FUNCTION_CALL'):
+                if node[1] in self.builtins and not self.is_stock(node[1]):
+                    return False
+            for item in node[1:]:
+                if isinstance(item, tuple) and item and isinstance(item[0], str):
+                    stack.append(item)
+                elif isinstance(item, list):
+                    stack.extend(child for child in item if isinstance(child, tuple))
+        return True
+
+    def assigned_names(self, statements, names):
+        for statement in statements:
+            kind = statement[0]
+            if kind in ('ASSIGN', 'AUG_ASSIGN', 'FOR'):
+                names.add(statement[1])
+            if kind in CONTROL_KINDS:
+                for item in statement[1:]:
+                    if isinstance(item, list):
+                        self.assigned_names(item, names)
+        return names
+
+    def assign_types(self, statements, types):
+        # Joins the type of every assignment among statements into types
+        for statement in statements:
+            kind = statement[0]
+            if kind == 'DEF':
+                continue
+            for expression in self.evaluated_expressions(statement):
+                self.call_types(expression, types)
+            if kind == 'ASSIGN':
+                types[statement[1]] = join(types[statement[1]], self.type_of(statement[2], types))
+            elif kind == 'AUG_ASSIGN':
+                current = types[statement[1]]
+                value = operator_type(statement[2], current, self.type_of(statement[3], types))
+                types[statement[1]] = join(current, value)
+            elif kind == 'ARRAY_ASSIGN':
+                self.store_element(statement[1], self.type_of(statement[3], types), types)
+            elif kind == 'ARRAY_AUG_ASSIGN':
+                current = types.get(statement[1])
+                if isinstance(current, tuple):
+                    element = current[1]
+                else:
+                    element = NO_TYPE if current is NO_TYPE else None
+                value = operator_type(statement[3], element, self.type_of(statement[4], types))
+                self.store_element(statement[1], value, types)
+            elif kind == 'FOR':
+                iterable = self.type_of(statement[2], types)
+                types[statement[1]] = join(types[statement[1]], element_type(iterable))
+                self.assign_types(statement[3], types)
+            elif kind == 'IF':
+                self.assign_types(statement[2], types)
+                self.assign_types(statement[3], types)
+            elif kind == 'WHILE':
+                self.assign_types(statement[2], types)
+
+    @staticmethod
+    def store_element(name, value, types):
+        # An array changed in place keeps its type, with the new element joined in.
+        # Arrays assigned before the statements are not tracked.
+        if name in types:
+            types[name] = join(types[name], list_of(value))
+
+    def call_types(self, node, types):
+        # Effects of the builtin calls in an expression on the types of variables
+        kind = node[0]
+        if kind in ('FUNCTION_CALL', 'ARRAY_FUNCTION_CALL'):
+            name, args = node[1], node[2]
+            if name in BINDER_BUILTINS:
+                for arg in args[:BINDER_BUILTINS[name][0]]:
+                    if arg[0] == 'IDENTIFIER':
+                        types[arg[1]] = None
+            elif name in NAME_BUILTINS and args and args[0][0] in ('IDENTIFIER', 'STRING') and self.is_stock(name):
+                if name != 'remove':
+                    self.store_element(args[0][1], self.type_of(args[-1], types), types)
+        for item in node[1:]:
+            if isinstance(item, tuple) and item and isinstance(item[0], str):
+                self.call_types(item, types)
+            elif isinstance(item, list):
+                for child in item:
+                    if isinstance(child, tuple):
+                        self.call_types(child, types)
+
+    def type_of(self, node, types):
+        kind = node[0]
+        if kind == 'NUMBER':
+            return LITERAL_TYPES.get(type(node[1]))
+        if kind == 'STRING':
+            return 'str'
+        if kind == 'IDENTIFIER':
+            return types.get(node[1])
+        if kind in BINARY_OPERATORS:
+            return operator_type(kind, self.type_of(node[1], types), self.type_of(node[2], types))
+        if kind == 'UMINUS':
+            operand = self.type_of(node[1], types)
+            return operand if operand is NO_TYPE or operand == 'float' else operator_type('-', 'int', operand)
+        if kind == 'ARRAY':
+            element = NO_TYPE
+            for item in node[1]:
+                element = join(element, self.type_of(item, types))
+            return list_of(element)
+        if kind == 'TUPLE':
+            return 'tuple'
+        if kind == 'DICT':
+            return 'dict'
+        if kind == 'SET':
+            return 'set'
+        if kind == 'ARRAY_ACCESS':
+            array = types.get(node[1][1])
+            return array[1] if isinstance(array, tuple) else None
+        if kind in ('FUNCTION_CALL', 'ARRAY_FUNCTION_CALL') and self.is_stock(node[1]):
+            name, args = node[1], node[2]
+            if kind == 'ARRAY_FUNCTION_CALL' and name not in ARRAY_FUNCTIONS:
+                return None
+            if name in BUILTIN_TYPES:
+                return BUILTIN_TYPES[name]
+            if name in ('min', 'max', 'and', 'or') and len(args) == 2:
+                return join(self.type_of(args[0], types), self.type_of(args[1], types))
+            if name == 'ifElse' and len(args) == 3:
+                return join(self.type_of(args[1], types), self.type_of(args[2], types))
+        return None
+
+    def specialise_block(self, statements, types):
+        return [self.specialise(statement, types) for statement in statements]
+
+    def specialise(self, node, types):
+        kind = node[0]
+        if kind == 'DEF':
+            # A function body is a scope of its own, with parameters of any type
+            body = node[3]
+            return node[:3] + (self.specialise_block(body, self.infer_types(body, node[2])),) + node[4:]
+        specialised = self.specialised_kind(node, types) if types else None
+        node = self.map_children(node, lambda child: self.specialise(child, types))
+        if specialised is None:
+            return node
+        self.count('types')
+        if kind == 'FUNCTION_CALL':
+            return (specialised,) + tuple(node[2])
+        return (specialised, node[1], node[2])
+
+    def specialised_kind(self, node, types):
+        # The type of the specialised node for node, or None if it has none
+        kind = node[0]
+        if kind == '+':
+            if self.type_of(node[1], types) == 'int' and self.type_of(node[2], types) == 'int':
+                return 'INT_ADD'
+        elif kind == 'FUNCTION_CALL' and node[1] in SPECIALISED_CALLS and self.is_stock(node[1]):
+            specialised, expected = SPECIALISED_CALLS[node[1]]
+            args = node[2]
+            if len(args) == len(expected) and all(base_type(self.type_of(arg, types)) == wanted
+                                                  for arg, wanted in zip(args, expected)):
+                return specialised
+        return None
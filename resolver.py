@@ -0,0 +1,232 @@
+# Resolver: Gives every variable a fixed slot before execution
+from collections.abc import MutableMapping
+
+from functions import FramePool
+from main import (ARRAY_TYPES, BINARY_OPERATORS, BREAK, INDEXED_TYPES, ITEM_TYPES, Interpreter, array_error,
+                  contains_loop_exit)
+from values import Stream
+
+# Value of a slot whose variable has not been assigned yet
+UNSET = object()
+
+
+class Resolver:
+    # Rewrites variable nodes into slot nodes. The name stays in the same position, so
+    # builtins that read a variable name from args[0][1] keep working:
+    #   ('IDENTIFIER', name)                    -> ('SLOT_LOAD', name, slot)
+    #   ('ASSIGN', name, value)                 -> ('SLOT_ASSIGN', name, value, slot)
+    #   ('ARRAY_ASSIGN', name, index, value)    -> ('SLOT_ARRAY_ASSIGN', name, index, value, slot)
+    #   ('AUG_ASSIGN', name, op, value)         -> ('SLOT_AUG_ASSIGN', name, op, value, slot)
+    #   ('ARRAY_AUG_ASSIGN', name, index, op, value)
+    #                                           -> ('SLOT_ARRAY_AUG_ASSIGN', name, index, op, value, slot)
+    #   ('FOR', name, iterable, body)           -> ('SLOT_FOR', name, iterable, body, slot)
+    # Function bodies are left as they are; each function gets its own slots when called.
+    def __init__(self):
+        self.slots = {}
+
+    def slot(self, name):
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.slots)
+        return slot
+
+    def resolve(self, node):
+        if isinstance(node, list):
+            return [self.resolve(item) for item in node]
+        if not isinstance(node, tuple) or not node or not isinstance(node[0], str):
+            return node
+        kind = node[0]
+        if kind == 'DEF':
+            return node
+        if kind == 'IDENTIFIER':
+            return ('SLOT_LOAD', node[1], self.slot(node[1]))
+        if kind == 'ASSIGN':
+            return ('SLOT_ASSIGN', node[1], self.resolve(node[2]), self.slot(node[1]))
+        if kind == 'ARRAY_ASSIGN':
+            return ('SLOT_ARRAY_ASSIGN', node[1], self.resolve(node[2]), self.resolve(node[3]),
+                    self.slot(node[1]))
+        if kind == 'AUG_ASSIGN':
+            return ('SLOT_AUG_ASSIGN', node[1], node[2], self.resolve(node[3]), self.slot(node[1]))
+        if kind == 'ARRAY_AUG_ASSIGN':
+            return ('SLOT_ARRAY_AUG_ASSIGN', node[1], self.resolve(node[2]), node[3], self.resolve(node[4]),
+                    self.slot(node[1]))
+        if kind == 'FOR':
+            return ('SLOT_FOR', node[1], self.resolve(node[2]), self.resolve(node[3]),
+                    self.slot(node[1]))
+        return (kind,) + tuple(self.resolve(item) for item in node[1:])
+
+
+class SlotVariables(MutableMapping):
+    # Name-based view of the slot list, for builtins, debugging and reading results back
+    def __init__(self, resolver, slot_values):
+        self.resolver = resolver
+        self.slot_values = slot_values
+
+    def __getitem__(self, name):
+        slot = self.resolver.slots.get(name)
+        if slot is None or self.slot_values[slot] is UNSET:
+            raise KeyError(name)
+        return self.slot_values[slot]
+
+    def __setitem__(self, name, value):
+        slot = self.resolver.slot(name)
+        while len(self.slot_values) <= slot:
+            self.slot_values.append(UNSET)
+        self.slot_values[slot] = value
+
+    def __delitem__(self, name):
+        slot = self.resolver.slots.get(name)
+        if slot is None or self.slot_values[slot] is UNSET:
+            raise KeyError(name)
+        self.slot_values[slot] = UNSET
+
+    def __iter__(self):
+        for name, slot in list(self.resolver.slots.items()):
+            if self.slot_values[slot] is not UNSET:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+# SlotInterpreter: Stores variables in a list indexed by the slots from Resolver
+class SlotInterpreter(Interpreter):
+    def __init__(self, syntax_tree):
+        super().__init__(syntax_tree)
+        self.resolver = Resolver()
+        self.slot_values = []
+        self.variables = SlotVariables(self.resolver, self.slot_values)
+
+    def evaluate(self):
+        for statement in self.syntax_tree:
+            statement = self.resolver.resolve(statement)
+            # New variables get their slot before the statement that introduces them runs
+            self.slot_values.extend([UNSET] * (len(self.resolver.slots) - len(self.slot_values)))
+            self.evaluate_statement(statement)
+
+    def run_function(self, function, args):
+        # Function bodies are resolved against a resolver of their own on the first
+        # call, so parameters and locals have slots in a frame list of their own
+        compiled = function.compiled
+        if compiled is None:
+            resolver = Resolver()
+            for param in function.params:
+                resolver.slot(param)
+            body = resolver.resolve(function.body)
+            frames = FramePool(lambda: SlotVariables(resolver, []), lambda frame: frame.slot_values.clear())
+            compiled = function.compiled = (resolver, body, frames)
+        resolver, body, frames = compiled
+        frame = frames.acquire()
+        slot_values = frame.slot_values
+        slot_values.extend(args)
+        slot_values.extend([UNSET] * (len(resolver.slots) - len(args)))
+        saved = self.current_scope()
+        self.enter_scope((resolver, slot_values, frame))
+        try:
+            result = self.execute_body(function, body)
+        finally:
+            self.enter_scope(saved)
+        if not isinstance(result, Stream):
+            frames.release(frame)
+        return result
+
+    def current_scope(self):
+        return self.resolver, self.slot_values, self.variables
+
+    def enter_scope(self, scope):
+        self.resolver, self.slot_values, self.variables = scope
+
+    def binder_name(self, node, function_name):
+        if node[0] == 'SLOT_LOAD':
+            return node[1]
+        return Interpreter.binder_name(self, node, function_name)
+
+    def lookup_array(self, array_name, types=ARRAY_TYPES):
+        slot = self.resolver.slots.get(array_name)
+        array = self.slot_values[slot] if slot is not None else None
+        if not isinstance(array, types):
+            raise array_error(array_name, array)
+        return array
+
+    def lookup_sequence(self, array_name):
+        slot = self.resolver.slots.get(array_name)
+        array = self.slot_values[slot] if slot is not None else None
+        if not isinstance(array, INDEXED_TYPES):
+            raise ValueError(f"Array '{array_name}' is not defined.")
+        return array
+
+    def lookup_slot_array(self, name, slot, types=ARRAY_TYPES):
+        array = self.slot_values[slot]
+        if not isinstance(array, types):
+            raise array_error(name, array)
+        return array
+
+    def lookup_slot_sequence(self, name, slot):
+        array = self.slot_values[slot]
+        if not isinstance(array, INDEXED_TYPES):
+            raise ValueError(f"Array '{name}' is not defined.")
+        return array
+
+    def evaluate_slot_load(self, expression):
+        value = self.slot_values[expression[2]]
+        if value is UNSET:
+            raise KeyError(expression[1])
+        return value
+
+    def evaluate_slot_assignment(self, statement):
+        self.slot_values[statement[3]] = self.evaluate_expression(statement[2])
+
+    def evaluate_slot_array_assignment(self, statement):
+        index = self.evaluate_expression(statement[2])
+        value = self.evaluate_expression(statement[3])
+        self.lookup_slot_array(statement[1], statement[4], ITEM_TYPES)[index] = value
+
+    def evaluate_slot_augmented_assignment(self, statement):
+        slot_values, slot = self.slot_values, statement[4]
+        current = slot_values[slot]
+        if current is UNSET:
+            raise KeyError(statement[1])
+        slot_values[slot] = BINARY_OPERATORS[statement[2]](current, self.evaluate_expression(statement[3]))
+
+    def evaluate_slot_array_augmented_assignment(self, statement):
+        index = self.evaluate_expression(statement[2])
+        array = self.lookup_slot_array(statement[1], statement[5], ITEM_TYPES)
+        array[index] = BINARY_OPERATORS[statement[3]](array[index], self.evaluate_expression(statement[4]))
+
+    def evaluate_slot_for_statement(self, statement):
+        slot_values, slot, body = self.slot_values, statement[4], statement[3]
+        if contains_loop_exit(body):
+            for value in self.evaluate_expression(statement[2]):
+                slot_values[slot] = value
+                if self.execute_block(body) is BREAK:
+                    break
+            return
+        for value in self.evaluate_expression(statement[2]):
+            slot_values[slot] = value
+            for stmt in body:
+                self.evaluate_statement(stmt)
+
+    def evaluate_array_access(self, expression):
+        array = expression[1]
+        index = self.evaluate_expression(expression[2])
+        if array[0] == 'SLOT_LOAD':
+            return self.lookup_slot_sequence(array[1], array[2])[index]
+        return self.lookup_sequence(array[1])[index]
+
+    statement_handlers = {
+        **Interpreter.statement_handlers,
+        'SLOT_ASSIGN': evaluate_slot_assignment,
+        'SLOT_ARRAY_ASSIGN': evaluate_slot_array_assignment,
+        'SLOT_AUG_ASSIGN': evaluate_slot_augmented_assignment,
+        'SLOT_ARRAY_AUG_ASSIGN': evaluate_slot_array_augmented_assignment,
+        'SLOT_FOR': evaluate_slot_for_statement,
+    }
+
+    expression_handlers = {
+        **Interpreter.expression_handlers,
+        'SLOT_LOAD': evaluate_slot_load,
+        'ARRAY_ACCESS': evaluate_array_access,
+    }
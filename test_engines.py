@@ -0,0 +1,248 @@
+# Engine tests: Runs the demo and feature scripts on every engine, lexer and mode and
+# compares the output and errors with the tree-walker's
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from main import DEMO_SOURCE, ENGINES, Lexer, main
+
+FUNCTIONS_SOURCE = """
+def sq(x) {
+    return x * x;
+}
+print(sq(7));
+pure def fib(n) {
+    if n < 2 {
+        return n;
+    }
+    return fib(n-1) + fib(n-2);
+}
+print(fib(30));
+def countTo(n) {
+    total = 0;
+    i = 0;
+    while i < n {
+        i = i + 1;
+        if i > 5 {
+            return total;
+        }
+        total = total + i;
+    }
+    return total;
+}
+print(countTo(3));
+print(countTo(100));
+def noreturn(a, b) {
+    c = a + b;
+}
+print(noreturn(1, 2));
+def early() {
+    for i in range(0, 10) {
+        if i == 3 {
+            return i;
+        }
+    }
+}
+print(early());
+def sumArr(xs) {
+    t = 0;
+    for x in xs {
+        t = t + x;
+    }
+    xs[0] = 100;
+    return t;
+}
+arr = [1, 2, 3];
+print(sumArr(arr));
+print(arr);
+def bare(x) {
+    if x > 0 {
+        return;
+    }
+    return x;
+}
+print(bare(1));
+print(bare(0-1));
+x = 5;
+def shadow(x) {
+    x = x + 1;
+    return x;
+}
+print(shadow(10));
+print(x);
+"""
+
+LOOP_EXITS_SOURCE = """
+arr = [4, 8, 15, 16, 23, 42];
+found = 0-1;
+for i in range(0, length(arr)) {
+  if arr[i] == 16 {
+    found = i;
+    break;
+  }
+}
+print(found);
+total = 0;
+for x in arr {
+  if x < 10 { continue; }
+  total = total + x;
+}
+print(total);
+i = 0;
+while 1 == 1 {
+  i = i + 1;
+  if i > 100 { break; }
+  if i > 5 { continue; } else { print(i); }
+}
+print(i);
+for a in range(0, 4) {
+  for b in range(0, 4) {
+    if b > a { break; }
+    if b == 1 { continue; }
+    print(^a, b^);
+  }
+  if a == 2 { break; }
+}
+def firstOver(xs, limit) {
+  for x in xs {
+    if x > limit { return x; }
+  }
+  n = 0;
+  while 1 {
+    n = n + 1;
+    if n == 3 { break; }
+  }
+  return n;
+}
+print(firstOver(arr, 20));
+print(firstOver(arr, 100));
+"""
+
+AUGMENTED_ASSIGNMENT_SOURCE = """
+total = 0;
+i = 0;
+while i < 10 {
+  total += i;
+  i += 1;
+}
+print(total);
+print(i);
+x = 100;
+x -= 1;
+x *= 2;
+x /= 4;
+print(x);
+s = "ab";
+s += "cd";
+print(s);
+arr = [1, 2, 3];
+j = 0;
+arr[j+1] += 10;
+arr[0] -= 5;
+arr[2] *= arr[1];
+arr[1] /= 4;
+print(arr);
+d = {"a": 1};
+d["a"] += 41;
+print(d);
+y = 2;
+y *= 3 + 4;
+print(y);
+def tally(xs) {
+  total = 0;
+  for v in xs { total += v; }
+  return total;
+}
+print(tally([1, 2, 3, 4]));
+"""
+
+# Scripts that print a line and then fail; every engine must raise the same error
+ERROR_SOURCES = {
+    'division by zero': 'print(1); print(1 / 0);',
+    'undefined variable': 'print(1); print(missing);',
+    'wrong argument count': 'def sq(x) { return x * x; } print(sq(2)); print(sq(2, 3));',
+    'builtin arity': 'print(1); print(ifElse(1, 2));',
+    'assignment into a range': 'r = range(0, 3); print(r); r[0] += 1;',
+}
+
+# Lexer and mode flags of every run; --stream needs the regex lexer
+MODES = ([], ['--optimize'], ['--stream'], ['--stream', '--optimize'])
+VARIANTS = [(lexer, mode) for lexer in Lexer.ENGINES for mode in MODES
+            if not (lexer == 'scan' and '--stream' in mode)]
+
+
+def run(argv):
+    # The printed output and the (type, message) of the raised error, or None
+    output = io.StringIO()
+    error = None
+    with contextlib.redirect_stdout(output):
+        try:
+            main(argv)
+        except Exception as exception:
+            error = (type(exception).__name__, str(exception))
+    return output.getvalue(), error
+
+
+class EngineTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def assert_engines_agree(self, name, source):
+        path = os.path.join(self.directory.name, name.replace(' ', '_') + '.txt')
+        with open(path, 'w') as script:
+            script.write(source)
+        expected = run([path, '--engine', 'tree', '--lexer', 'scan'])
+        for engine in ENGINES:
+            for lexer, mode in VARIANTS:
+                with self.subTest(engine=engine, lexer=lexer, mode=' '.join(mode)):
+                    self.assertEqual(run([path, '--engine', engine, '--lexer', lexer] + mode), expected)
+        return expected
+
+    def test_demo(self):
+        # The demo also prints its tokens and syntax tree, which differ with --optimize
+        for lexer in Lexer.ENGINES:
+            for mode in ([], ['--optimize']):
+                expected = run(['--engine', 'tree', '--lexer', lexer] + mode)
+                self.assertIsNone(expected[1])
+                for engine in ENGINES:
+                    with self.subTest(engine=engine, lexer=lexer, mode=' '.join(mode)):
+                        self.assertEqual(run(['--engine', engine, '--lexer', lexer] + mode), expected)
+
+    def test_demo_script(self):
+        output, error = self.assert_engines_agree('demo', DEMO_SOURCE)
+        self.assertIsNone(error)
+        self.assertTrue(output)
+
+    def test_functions(self):
+        output, error = self.assert_engines_agree('functions', FUNCTIONS_SOURCE)
+        self.assertIsNone(error)
+        self.assertIn('832040', output)
+
+    def test_loop_exits(self):
+        output, error = self.assert_engines_agree('loop exits', LOOP_EXITS_SOURCE)
+        self.assertIsNone(error)
+        self.assertTrue(output.startswith('3\n96\n'))
+
+    def test_augmented_assignment(self):
+        output, error = self.assert_engines_agree('augmented assignment', AUGMENTED_ASSIGNMENT_SOURCE)
+        self.assertIsNone(error)
+        self.assertIn('abcd', output)
+
+    def test_errors(self):
+        for name, source in ERROR_SOURCES.items():
+            with self.subTest(script=name):
+                output, error = self.assert_engines_agree(name, source)
+                self.assertIsNotNone(error)
+                self.assertTrue(output)
+
+
+if __name__ == '__main__':
+    unittest.main()
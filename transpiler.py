@@ -0,0 +1,441 @@
+# Transpiler: Translates the syntax tree into Python source and runs it with exec
+import marshal
+
+from main import (ARRAY_TYPES, BINDER_BUILTINS, INDEXED_TYPES, ITEM_TYPES, NAME_BUILTINS, SPECIALISED_BUILTINS,
+                  Interpreter, array_error, checked_length, checked_split, divide, list_length, str_split,
+                  vector_get_item)
+from values import LazyRange, PersistentVector, numeric_literal
+
+# Operator precedence of the generated Python, lowest first
+COMPARISON, SUM, PRODUCT, UNARY, POWER, ATOM = range(6)
+
+# INT_ADD is '+' specialised by the optimizer's types pass; Python's own int addition
+# needs no helper
+SUM_OPERATORS = {'+': '+', '-': '-', 'INT_ADD': '+'}
+COMPARISON_OPERATORS = {'Greater': '>', 'Smaller': '<', 'EQUAL': '==', 'NOTEQUAL': '!='}
+
+# Builtins that become plain Python, by name and expected argument count. They are only
+# used while the interpreter still has the stock handler for that name.
+INLINE_BUILTINS = {
+    'power': 2, 'square': 1, 'min': 2, 'max': 2, 'range': (1, 2, 3),
+    'length': 1, 'split': 2, 'append': 2, 'remove': 2, 'add': 3,
+    'and': 2, 'or': 2, 'ifElse': 3,
+}
+
+# Compiled programs by syntax tree, see Transpiler.cache_key
+CODE_CACHE = {}
+CODE_CACHE_SIZE = 128
+
+
+class Undefined:
+    # Value of a variable that has not been assigned yet
+    __slots__ = ()
+
+    def __repr__(self):
+        return '<undefined>'
+
+
+UNDEFINED = Undefined()
+
+
+# Runtime helpers used by the generated code. Each one keeps the message of the
+# Interpreter method it stands in for.
+
+def defined(value, name):
+    if value is UNDEFINED:
+        raise KeyError(name)
+    return value
+
+
+def item(array, name, index):
+    if not isinstance(array, INDEXED_TYPES):
+        raise ValueError(f"Array '{name}' is not defined.")
+    return array[index]
+
+
+def store_item(array, name, index, value):
+    if not isinstance(array, ITEM_TYPES):
+        raise array_error(name, array)
+    array[index] = value
+
+
+def updatable(array, name):
+    if not isinstance(array, ITEM_TYPES):
+        raise array_error(name, array)
+    return array
+
+
+def append(array, name, value):
+    if not isinstance(array, ARRAY_TYPES):
+        raise array_error(name, array)
+    array.append(value)
+    return array
+
+
+def remove(array, name, value):
+    if not isinstance(array, ARRAY_TYPES):
+        raise array_error(name, array)
+    array.remove(value)
+    return array
+
+
+def insert(array, name, index, value):
+    if not isinstance(array, ARRAY_TYPES):
+        raise array_error(name, array)
+    array.insert(index, value)
+    return array
+
+
+def store(variables, values):
+    # Variables the program never assigned, or deleted, are left out
+    for name, value in values:
+        if value is not UNDEFINED:
+            variables[name] = value
+        else:
+            variables.pop(name, None)
+
+
+HELPERS = {
+    '_UNDEFINED': UNDEFINED, '_defined': defined, '_item': item, '_store_item': store_item, '_updatable': updatable,
+    '_append': append, '_remove': remove, '_insert': insert, '_length': checked_length,
+    '_split': checked_split, '_divide': divide, '_store': store,
+    '_list_length': list_length, '_str_split': str_split, '_vector_get_item': vector_get_item,
+    '_LazyRange': LazyRange, '_numeric_literal': numeric_literal, '_PersistentVector': PersistentVector,
+}
+
+
+def local_name(name):
+    # Script names live in their own namespace; non-ASCII names are hex-encoded because
+    # Python NFKC-normalises identifiers, which could merge two distinct script names
+    if name.isascii():
+        return 'v_' + name
+    return 'u_' + name.encode().hex()
+
+
+class Transpiler:
+    def __init__(self, builtins, known_names=(), numeric_arrays=False, lazy_builtins=Interpreter.lazy_builtins):
+        # known_names are variables that already have a value when the program starts
+        self.builtins = builtins
+        self.lazy_builtins = lazy_builtins
+        self.known_names = frozenset(known_names)
+        self.numeric_arrays = numeric_arrays
+        self.inline = frozenset(name for name in INLINE_BUILTINS
+                                if builtins.get(name) is Interpreter.builtins[name])
+        self.names = {}
+        self.assigned = set(self.known_names)
+        self.lines = []
+        self.depth = 2
+
+    def cache_key(self, statements):
+        return marshal.dumps((statements, sorted(self.known_names), sorted(self.inline), self.numeric_arrays,
+                              sorted(self.lazy_builtins.items())))
+
+    def transpile(self, statements):
+        # Returns the source of `_program(_variables)`, which runs statements with every
+        # script variable held in a Python local, and writes them back on the way out
+        for statement in statements:
+            self.statement(statement)
+        body = self.lines or ['        pass']
+        names = sorted(self.names)
+        lines = ['def _program(_variables):']
+        for name in names:
+            lines.append(f"    {self.names[name]} = _variables.get({name!r}, _UNDEFINED)")
+        lines.append('    try:')
+        lines.extend(body)
+        lines.append('    finally:')
+        pairs = ''.join(f"({name!r}, {self.names[name]}), " for name in names)
+        lines.append(f"        _store(_variables, ({pairs}))")
+        return '\n'.join(lines) + '\n'
+
+    # Names
+
+    def local(self, name):
+        local = self.names.get(name)
+        if local is None:
+            local = self.names[name] = local_name(name)
+        return local
+
+    def read(self, name):
+        # Reads of a variable that may not be assigned yet raise KeyError, like the
+        # tree-walker's dictionary lookup
+        local = self.local(name)
+        if name in self.assigned:
+            return local
+        return f"_defined({local}, {name!r})"
+
+    # Statements
+
+    def emit(self, line):
+        self.lines.append('    ' * self.depth + line)
+
+    def block(self, statements):
+        # Assignments inside a block do not make a variable certain after the block
+        assigned = set(self.assigned)
+        self.depth += 1
+        start = len(self.lines)
+        for statement in statements:
+            self.statement(statement)
+        if len(self.lines) == start:
+            self.emit('pass')
+        self.depth -= 1
+        self.assigned = assigned
+
+    def statement(self, statement):
+        kind = statement[0]
+        if kind == 'ASSIGN':
+            value = self.expression(statement[2])
+            self.emit(f"{self.local(statement[1])} = {value}")
+            self.assigned.add(statement[1])
+        elif kind == 'ARRAY_ASSIGN':
+            name = statement[1]
+            index = self.expression(statement[2])
+            value = self.expression(statement[3])
+            self.emit(f"_store_item({self.local(name)}, {name!r}, {index}, {value})")
+        elif kind == 'AUG_ASSIGN':
+            # Not Python's +=, which would extend a list in place rather than make a new one
+            name = statement[1]
+            self.statement(('ASSIGN', name, (statement[2], ('IDENTIFIER', name), statement[3])))
+        elif kind == 'ARRAY_AUG_ASSIGN':
+            # The index is evaluated once, into a temporary outside the script's namespace
+            name = statement[1]
+            self.emit(f"_index = {self.expression(statement[2])}")
+            self.emit(f"_array = _updatable({self.local(name)}, {name!r})")
+            value = self.expression(statement[4], PRODUCT if statement[3] in SUM_OPERATORS else UNARY)
+            if statement[3] == '/':
+                self.emit(f"_array[_index] = _divide(_array[_index], {value})")
+            else:
+                self.emit(f"_array[_index] = _array[_index] {statement[3]} {value}")
+        elif kind == 'IF':
+            self.emit(f"if {self.expression(statement[1])}:")
+            self.block(statement[2])
+            if statement[3]:
+                self.emit('else:')
+                self.block(statement[3])
+        elif kind == 'WHILE':
+            self.emit(f"while {self.expression(statement[1])}:")
+            self.block(statement[2])
+        elif kind == 'FOR':
+            iterable = self.expression(statement[2], iterate=True)
+            self.emit(f"for {self.local(statement[1])} in {iterable}:")
+            assigned = set(self.assigned)
+            self.assigned.add(statement[1])
+            self.block(statement[3])
+            self.assigned = assigned
+        elif kind == 'PRINT':
+            self.emit(f"print({self.expression(statement[1])})")
+        elif kind == 'DEF':
+            self.function_definition(*statement[1:])
+        elif kind == 'RETURN':
+            self.emit(f"return {'None' if statement[1] is None else self.expression(statement[1])}")
+        elif kind == 'DELETE':
+            for name in statement[1]:
+                self.emit(f"{self.local(name)} = _UNDEFINED")
+                self.assigned.discard(name)
+        elif kind == 'BREAK':
+            self.emit('break')
+        elif kind == 'CONTINUE':
+            self.emit('continue')
+        else:
+            # Expression statements (including function calls)
+            self.emit(self.expression(statement))
+
+    def function_definition(self, name, params, body, pure):
+        # A nested Python function with the function's variables as its own locals; the
+        # ones that are not parameters start out undefined, as in a new frame
+        function = Transpiler(self.builtins, (), self.numeric_arrays, self.lazy_builtins)
+        function.assigned.update(params)
+        function.depth = self.depth + 1
+        arguments = ', '.join(function.local(param) for param in params)
+        for statement in body:
+            function.statement(statement)
+        python_name = '_def_' + local_name(name)
+        self.emit(f"def {python_name}({arguments}):")
+        self.depth += 1
+        for variable in sorted(set(function.names) - set(params)):
+            self.emit(f"{function.names[variable]} = _UNDEFINED")
+        self.lines.extend(function.lines)
+        if not body:
+            self.emit('pass')
+        self.depth -= 1
+        self.emit(f"_define({name!r}, {list(params)!r}, {pure!r}, {python_name})")
+
+    # Expressions
+
+    def expression(self, expression, precedence=COMPARISON, iterate=False):
+        # Returns Python source for expression, parenthesised if it binds looser than
+        # precedence. Parentheses are kept to a minimum, as CPython limits their nesting.
+        source, own = self.operation(expression, iterate)
+        if own < precedence:
+            return f"({source})"
+        return source
+
+    def operation(self, expression, iterate=False):
+        kind = expression[0]
+        if kind == 'NUMBER':
+            value = expression[1]
+            return repr(value), UNARY if value < 0 else ATOM
+        if kind == 'STRING':
+            return repr(expression[1]), ATOM
+        if kind == 'IDENTIFIER':
+            return self.read(expression[1]), ATOM
+        if kind in SUM_OPERATORS:
+            left = self.expression(expression[1], SUM)
+            right = self.expression(expression[2], PRODUCT)
+            return f"{left} {SUM_OPERATORS[kind]} {right}", SUM
+        if kind == '*':
+            left = self.expression(expression[1], PRODUCT)
+            right = self.expression(expression[2], UNARY)
+            return f"{left} * {right}", PRODUCT
+        if kind == '/':
+            # The helper raises the interpreter's own ZeroDivisionError message
+            return f"_divide({self.expression(expression[1])}, {self.expression(expression[2])})", ATOM
+        if kind in COMPARISON_OPERATORS:
+            # Python chains `a < b < c`; comparisons of comparisons need parentheses
+            left = self.expression(expression[1], SUM)
+            right = self.expression(expression[2], SUM)
+            return f"{left} {COMPARISON_OPERATORS[kind]} {right}", COMPARISON
+        if kind == 'UMINUS':
+            return f"-{self.expression(expression[1], UNARY)}", UNARY
+        if kind == 'ARRAY':
+            elements = f"[{', '.join(self.expression(element) for element in expression[1])}]"
+            if self.numeric_arrays:
+                return f"_numeric_literal({elements})", ATOM
+            return elements, ATOM
+        if kind == 'TUPLE':
+            elements = ', '.join(self.expression(element) for element in expression[1])
+            return f"_PersistentVector([{elements}])", ATOM
+        if kind == 'DICT':
+            entries = ', '.join(f"{self.expression(key)}: {self.expression(value)}"
+                                for key, value in zip(expression[1], expression[2]))
+            return f"{{{entries}}}", ATOM
+        if kind == 'SET':
+            return f"{{{', '.join(self.expression(element) for element in expression[1])}}}", ATOM
+        if kind == 'ARRAY_ACCESS':
+            name = expression[1][1]
+            return f"_item({self.local(name)}, {name!r}, {self.expression(expression[2])})", ATOM
+        if kind == 'FUNCTION_CALL' or kind == 'ARRAY_FUNCTION_CALL':
+            return self.call(expression[1], expression[2], iterate)
+        if kind in SPECIALISED_BUILTINS:
+            # Nodes of the optimizer's types pass call the guarded helper of the same name
+            return f"_{kind.lower()}({', '.join(self.expression(arg) for arg in expression[1:])})", ATOM
+        raise NotImplementedError(f"Cannot transpile {kind} nodes")
+
+    def call(self, name, args, iterate=False):
+        if name not in self.builtins:
+            # A user-defined function; _function raises for unknown names before any
+            # argument is evaluated, as in the tree-walker
+            values = ''.join(f", {self.expression(arg)}" for arg in args)
+            return f"_invoke(_function({name!r}){values})", ATOM
+        expected = INLINE_BUILTINS.get(name)
+        count = len(args)
+        if name in self.inline and (count == expected or isinstance(expected, tuple) and count in expected):
+            return self.inline_call(name, args, iterate)
+        if name in NAME_BUILTINS or name in BINDER_BUILTINS:
+            # These read and bind variables in interpreter.variables, which the generated
+            # code keeps in Python locals instead
+            raise NotImplementedError(f"Cannot transpile calls to {name}")
+        thunks = self.lazy_builtins.get(name)
+        if thunks:
+            # Arguments the builtin may skip become lambdas, run only if it evaluates them
+            values = ''.join(f", lambda: {self.expression(arg)}" if position in thunks else f", {self.expression(arg)}"
+                             for position, arg in enumerate(args))
+            return f"_call_lazy(_builtins[{name!r}], {tuple(thunks)!r}{values})", ATOM
+        values = ''.join(f", {self.expression(arg)}" for arg in args)
+        return f"_call(_builtins[{name!r}]{values})", ATOM
+
+    def inline_call(self, name, args, iterate):
+        if name in NAME_BUILTINS:
+            # The first argument names the array, as in Interpreter.evaluate_append
+            array_name = args[0][1]
+            if args[0][0] in ('IDENTIFIER', 'STRING'):
+                array = self.local(array_name)
+            else:
+                array = '_UNDEFINED'
+            values = ', '.join(self.expression(arg) for arg in args[1:])
+            helper = {'append': '_append', 'remove': '_remove', 'add': '_insert'}[name]
+            return f"{helper}({array}, {str(array_name)!r}, {values})", ATOM
+        values = [self.expression(arg) for arg in args]
+        if name == 'power':
+            return f"{self.expression(args[0], ATOM)} ** {self.expression(args[1], UNARY)}", POWER
+        if name == 'square':
+            return f"{self.expression(args[0], ATOM)} ** 0.5", POWER
+        if name == 'range':
+            # A for loop can walk a Python range directly
+            if iterate:
+                return f"range({', '.join(values)})", ATOM
+            return f"_LazyRange({', '.join(values)})", ATOM
+        if name in ('min', 'max'):
+            return f"{name}({', '.join(values)})", ATOM
+        if name in ('and', 'or'):
+            return f"({values[0]} {name} {values[1]})", ATOM
+        if name == 'ifElse':
+            return f"({values[1]} if {values[0]} else {values[2]})", ATOM
+        return f"_{name}({', '.join(values)})", ATOM
+
+
+# TranspiledInterpreter: Runs the program as generated Python code
+class TranspiledInterpreter(Interpreter):
+    def transpile(self, statements):
+        # Returns (source, code) for statements, compiled once per distinct program
+        transpiler = Transpiler(self.builtins, self.variables, self.numeric_arrays, self.lazy_builtins)
+        try:
+            key = transpiler.cache_key(statements)
+        except ValueError:
+            key = None  # too deeply nested to marshal; compiled but not cached
+        cached = CODE_CACHE.get(key) if key is not None else None
+        if cached is not None:
+            return cached
+        source = transpiler.transpile(statements)
+        code = compile(source, '<transpiled>', 'exec')
+        if key is not None:
+            if len(CODE_CACHE) >= CODE_CACHE_SIZE:
+                del CODE_CACHE[next(iter(CODE_CACHE))]
+            CODE_CACHE[key] = (source, code)
+        return source, code
+
+    def evaluate(self):
+        if isinstance(self.syntax_tree, list):
+            self.run(self.syntax_tree)
+        else:
+            for statement in self.syntax_tree:
+                self.run([statement])
+
+    def run(self, statements):
+        try:
+            _, code = self.transpile(statements)
+        except (NotImplementedError, RecursionError, SyntaxError, MemoryError):
+            # Programs the transpiler or CPython's compiler cannot handle are tree-walked
+            for statement in statements:
+                self.evaluate_statement(statement)
+            return
+        namespace = dict(HELPERS, _builtins=self.builtins, _call=self.call, _call_lazy=self.call_lazy,
+                         _function=self.lookup_function, _invoke=self.invoke, _define=self.define)
+        exec(code, namespace)
+        namespace['_program'](self.variables)
+
+    def call(self, handler, *values):
+        # Builtins without a Python translation get their arguments as VALUE nodes
+        return handler(self, [('VALUE', value) for value in values])
+
+    def call_lazy(self, handler, thunks, *values):
+        # The arguments at the positions in thunks are lambdas, passed as THUNK nodes
+        return handler(self, [('THUNK', value) if position in thunks else ('VALUE', value)
+                              for position, value in enumerate(values)])
+
+    def invoke(self, function, *values):
+        return self.call_function(function, list(values))
+
+    def define(self, name, params, pure, implementation):
+        self.evaluate_function_definition(('DEF', name, params, None, pure))
+        self.functions[name].compiled = implementation
+
+    def run_function(self, function, args):
+        # Functions defined by transpiled code run as the Python function made for them
+        if function.compiled is not None:
+            return function.compiled(*args)
+        return Interpreter.run_function(self, function, args)
+
+    def evaluate_expression(self, expression):
+        if expression[0] == 'VALUE':
+            return expression[1]
+        return Interpreter.evaluate_expression(self, expression)
@@ -0,0 +1,746 @@
+# Values: Runtime value types produced by builtins, beyond Python's own types
+import operator
+from array import array
+from itertools import compress, repeat
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional; without it numeric arrays are plain lists
+    numpy = None
+
+# Literal integers outside this range stay in plain lists, where they cannot overflow
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class LazyRange:
+    # The value of range(): iterates, indexes and measures itself in constant memory,
+    # instead of building the whole list up front. It compares equal to a list with the
+    # same items and prints like one, as range() values did when they were lists.
+    __slots__ = ('range',)
+
+    def __init__(self, *args):
+        # Takes the same arguments as Python's range
+        self.range = range(*args)
+
+    def __iter__(self):
+        return iter(self.range)
+
+    def __len__(self):
+        return len(self.range)
+
+    def __getitem__(self, index):
+        return self.range[index]
+
+    def __contains__(self, value):
+        return value in self.range
+
+    def index(self, value):
+        return self.range.index(value)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyRange):
+            return self.range == other.range
+        if isinstance(other, list):
+            return len(other) == len(self.range) and all(a == b for a, b in zip(self.range, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    # Concatenation and repetition give arrays, as they did for the list form
+
+    def __add__(self, other):
+        if isinstance(other, (list, LazyRange)):
+            return list(self.range) + list(other)
+        return NotImplemented
+
+    def __radd__(self, other):
+        if isinstance(other, list):
+            return other + list(self.range)
+        return NotImplemented
+
+    def __mul__(self, count):
+        if isinstance(count, int):
+            return list(self.range) * count
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __repr__(self):
+        return repr(list(self.range))
+
+
+class TypedArray(array):
+    # A compact array of 64-bit ints ('q') or floats ('d'): elements are stored unboxed,
+    # 8 bytes each, instead of as pointers to Python number objects. It supports the
+    # list operations scripts use, prints like a list and compares equal to one.
+    __slots__ = ()
+
+    def __eq__(self, other):
+        if isinstance(other, list):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return array.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    # Concatenation and repetition keep the type, as they do for lists
+
+    def __add__(self, other):
+        return typed_copy(array.__add__(self, other))
+
+    def __mul__(self, count):
+        return typed_copy(array.__mul__(self, count))
+
+    __rmul__ = __mul__
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+
+# Element type names of the typed array builtins
+TYPECODES = {'int': 'q', 'float': 'd'}
+
+
+def typed_copy(values):
+    # A TypedArray with the elements of the array.array values, copied as raw bytes
+    result = TypedArray(values.typecode)
+    result.frombytes(memoryview(values).cast('B'))
+    return result
+
+
+def zeros_array(count, typecode='q'):
+    # Zero bytes are both 0 and 0.0, so the array is built without any element objects
+    return TypedArray(typecode, bytes(count * 8))
+
+
+def filled_array(count, value):
+    # A TypedArray of count copies of value, which decides the element type
+    return typed_copy(array('d' if isinstance(value, float) else 'q', [value]) * count)
+
+
+class Stream:
+    # The value of the stream builtins (map, filter, take, zip, readLines). Iterating it
+    # runs the pipeline that produces its values, one at a time, without intermediate
+    # arrays. Every iteration starts over, so a stream can be consumed more than once.
+    __slots__ = ('source',)
+
+    def __init__(self, source):
+        # source is a callable that returns a fresh iterator over the values
+        self.source = source
+
+    def __iter__(self):
+        return iter(self.source())
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class Rope:
+    # A string built by concatenation, kept as a list of pieces until something needs
+    # the whole text. Ropes made by adding to the same rope share one piece list: each
+    # rope owns its first `count` pieces, and adding to the rope that owns the end of the
+    # list appends to it in place, so `s = s + "..."` in a loop is linear overall. The
+    # text is joined once, on first use, and compares, hashes and prints like a str.
+    __slots__ = ('pieces', 'count', 'length', 'text')
+
+    def __init__(self, pieces, count=None, length=None):
+        self.pieces = pieces
+        self.count = len(pieces) if count is None else count
+        self.length = sum(map(len, pieces)) if length is None else length
+        self.text = None
+
+    def __str__(self):
+        if self.text is None:
+            self.text = ''.join(self.pieces[:self.count])
+        return self.text
+
+    def __add__(self, other):
+        if isinstance(other, Rope):
+            other = str(other)
+        elif not isinstance(other, str):
+            return NotImplemented
+        if self.text is not None:
+            # Already joined: start a new piece list from the text
+            return Rope([self.text, other], 2, self.length + len(other))
+        if self.count == len(self.pieces):
+            self.pieces.append(other)
+            return Rope(self.pieces, self.count + 1, self.length + len(other))
+        # Another rope has already added to this one's pieces: copy the ones it owns
+        return Rope(self.pieces[:self.count] + [other], self.count + 1, self.length + len(other))
+
+    def __radd__(self, other):
+        if not isinstance(other, str):
+            return NotImplemented
+        return Rope([other] + self.pieces[:self.count], self.count + 1, len(other) + self.length)
+
+    def __mul__(self, count):
+        return str(self) * count
+
+    __rmul__ = __mul__
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(str(self))
+
+    def __getitem__(self, index):
+        return str(self)[index]
+
+    def __contains__(self, value):
+        return str(value) in str(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (str, Rope)):
+            return self.length == len(other) and str(self) == str(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __lt__(self, other):
+        if isinstance(other, (str, Rope)):
+            return str(self) < str(other)
+        return NotImplemented
+
+    def __gt__(self, other):
+        if isinstance(other, (str, Rope)):
+            return str(self) > str(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return repr(str(self))
+
+
+# Persistent vectors: a 32-way trie of tuples plus a tail of up to 32 items, as in
+# Clojure's PersistentVector. Item i sits in leaf i >> 5, at position i & 31.
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+
+class PersistentVector:
+    # The value of tuple literals. Adding items makes a new vector that shares every
+    # full leaf with the old one, so `acc = acc + ^x^;` in a loop costs amortised
+    # O(log32 n) per item instead of copying the whole tuple. Reading an item is
+    # O(log32 n) too. Vectors compare equal to Python tuples with the same items, hash
+    # like them and print like them.
+    __slots__ = ('size', 'shift', 'root', 'tail', 'hash')
+
+    def __init__(self, items=()):
+        self.size, self.shift, self.root, self.tail = 0, BITS, (), ()
+        self.hash = None
+        if items:
+            self.size, self.shift, self.root, self.tail = self.extended_state(items)
+
+    @classmethod
+    def from_state(cls, size, shift, root, tail):
+        vector = cls.__new__(cls)
+        vector.size, vector.shift, vector.root, vector.tail = size, shift, root, tail
+        vector.hash = None
+        return vector
+
+    def extended_state(self, items):
+        # The (size, shift, root, tail) of this vector with items added at the end
+        size, shift, root, tail = self.size, self.shift, self.root, list(self.tail)
+        for value in items:
+            if len(tail) == WIDTH:
+                # The tail is full: it becomes a leaf, and a new tail starts
+                if (size >> BITS) > (1 << shift):
+                    root = (root, new_path(shift, tuple(tail)))
+                    shift += BITS
+                else:
+                    root = push_tail(size, shift, root, tuple(tail))
+                tail = []
+            tail.append(value)
+            size += 1
+        return size, shift, root, tuple(tail)
+
+    def extended(self, items):
+        return PersistentVector.from_state(*self.extended_state(items))
+
+    def tail_offset(self):
+        return self.size - len(self.tail)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("tuple index out of range")
+        offset = self.tail_offset()
+        if index >= offset:
+            return self.tail[index - offset]
+        node = self.root
+        level = self.shift
+        while level > 0:
+            node = node[(index >> level) & MASK]
+            level -= BITS
+        return node[index & MASK]
+
+    def __iter__(self):
+        for leaf in leaves(self.root, self.shift):
+            yield from leaf
+        yield from self.tail
+
+    def __contains__(self, value):
+        return any(item == value for item in self)
+
+    def index(self, value):
+        for position, item in enumerate(self):
+            if item == value:
+                return position
+        raise ValueError("tuple.index(x): x not in tuple")
+
+    def __add__(self, other):
+        if isinstance(other, (PersistentVector, tuple)):
+            return self.extended(other)
+        return NotImplemented
+
+    def __radd__(self, other):
+        if isinstance(other, tuple):
+            return PersistentVector(other).extended(self)
+        return NotImplemented
+
+    def __mul__(self, count):
+        if not isinstance(count, int):
+            return NotImplemented
+        result = PersistentVector()
+        for _ in range(count):
+            result = result.extended(self)
+        return result
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        if isinstance(other, (PersistentVector, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __lt__(self, other):
+        if isinstance(other, (PersistentVector, tuple)):
+            return tuple(self) < tuple(other)
+        return NotImplemented
+
+    def __gt__(self, other):
+        if isinstance(other, (PersistentVector, tuple)):
+            return tuple(self) > tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        if self.hash is None:
+            self.hash = hash(tuple(self))
+        return self.hash
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+
+def new_path(level, node):
+    # node, wrapped in single-child parents up to level
+    while level > 0:
+        node = (node,)
+        level -= BITS
+    return node
+
+
+def push_tail(size, level, parent, leaf):
+    # A copy of parent, the node at level, with leaf added as the last leaf of a vector
+    # that holds size items including those of leaf; only the path to it is copied
+    child_index = ((size - 1) >> level) & MASK
+    if level == BITS:
+        child = leaf
+    elif child_index < len(parent):
+        child = push_tail(size, level - BITS, parent[child_index], leaf)
+    else:
+        child = new_path(level - BITS, leaf)
+    return parent[:child_index] + (child,) + parent[child_index + 1:]
+
+
+def leaves(node, level):
+    # The leaves below node, which sits at level, from first to last
+    if level == BITS:
+        yield from node
+    else:
+        for child in node:
+            yield from leaves(child, level - BITS)
+
+
+# Comparisons the where builtin accepts, by their operator in the language
+COMPARISONS = {'>': operator.gt, '<': operator.lt, '==': operator.eq, '!=': operator.ne}
+
+# Aggregations of the groupBy builtin, by name
+AGGREGATIONS = {
+    'sum': sum,
+    'count': len,
+    'min': min,
+    'max': max,
+    'mean': lambda values: sum(values) / len(values),
+}
+
+
+def column_of(values):
+    # A TypedArray if every value is an int that fits in 64 bits, or every value is a
+    # float; a list otherwise, which holds any mix of values
+    values = list(values)
+    if values and all(type(value) is int and INT64_MIN <= value <= INT64_MAX for value in values):
+        return TypedArray('q', values)
+    if values and all(type(value) is float for value in values):
+        return TypedArray('d', values)
+    return values
+
+
+def taken(column, items):
+    # The items of column that items selects (a list of positions, or an iterator over
+    # the column's flags for compress), in a column of the same type
+    if isinstance(column, TypedArray):
+        return TypedArray(column.typecode, items)
+    return list(items)
+
+
+class Table:
+    # Columnar record array: one column per named field, instead of one tuple per row.
+    # Number columns are TypedArrays, so a table of numbers holds 8 bytes per value, and
+    # filters, sorts and groupings walk whole columns. Rows are made on access as plain
+    # tuples, which getItem and the other tuple builtins accept.
+    __slots__ = ('fields', 'columns')
+
+    def __init__(self, fields, columns):
+        self.fields = tuple(fields)
+        self.columns = list(columns)
+
+    @classmethod
+    def from_rows(cls, fields, rows):
+        fields = tuple(fields)
+        rows = list(rows)
+        for row in rows:
+            if len(row) != len(fields):
+                raise ValueError(f"Table rows must have {len(fields)} values, one per field; got {len(row)}")
+        columns = zip(*rows) if rows else [()] * len(fields)
+        return cls(fields, [column_of(column) for column in columns])
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getitem__(self, index):
+        return tuple(column[index] for column in self.columns)
+
+    def __iter__(self):
+        return zip(*self.columns)
+
+    def __repr__(self):
+        return f"Table({list(self.fields)!r}, {list(self)!r})"
+
+    def field_index(self, field):
+        try:
+            return self.fields.index(field)
+        except ValueError:
+            raise ValueError(f"Table has no field {field!r}; its fields are {', '.join(self.fields)}") from None
+
+    def column(self, field):
+        # A copy of the column, so changing it leaves the table as it is
+        column = self.columns[self.field_index(field)]
+        return typed_copy(column) if isinstance(column, TypedArray) else list(column)
+
+    def taken(self, positions):
+        return Table(self.fields, [taken(column, map(column.__getitem__, positions)) for column in self.columns])
+
+    def where(self, field, comparison, value):
+        column = self.columns[self.field_index(field)]
+        keep = list(map(comparison, column, repeat(value)))
+        return Table(self.fields, [taken(column, compress(column, keep)) for column in self.columns])
+
+    def sorted_by(self, field, descending=False):
+        # Stable, like sort: rows with equal values keep their order
+        column = self.columns[self.field_index(field)]
+        return self.taken(sorted(range(len(column)), key=column.__getitem__, reverse=descending))
+
+    def grouped(self, key_field, value_field, aggregation):
+        # One row per distinct key, in order of first appearance, with the aggregation
+        # of the values of value_field in that key's rows
+        groups = {}
+        keys = self.columns[self.field_index(key_field)]
+        for key, value in zip(keys, self.columns[self.field_index(value_field)]):
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [value]
+            else:
+                group.append(value)
+        aggregate = AGGREGATIONS[aggregation]
+        return Table((key_field, aggregation), [
+            column_of(groups), column_of(aggregate(group) for group in groups.values())])
+
+
+class NumPyValue:
+    # Base of the values stored in a NumPy array. Arithmetic and comparisons apply
+    # element by element and broadcast scalars and rows, so `prices * 2` or `a + b` run
+    # as one NumPy operation instead of an interpreted loop. Integer elements are 64-bit,
+    # so arithmetic on them wraps around instead of growing like Python integers.
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __bool__(self):
+        raise ValueError("The truth value of a numeric array is ambiguous; compare its elements instead")
+
+    __hash__ = None
+
+    def __neg__(self):
+        return wrapped(-self.data)
+
+    def __truediv__(self, other):
+        other = operand(other)
+        if numpy.any(other == 0):
+            raise ZeroDivisionError("Cannot divide by zero")
+        return wrapped(self.data / other)
+
+    def __rtruediv__(self, other):
+        if not self.data.all():
+            raise ZeroDivisionError("Cannot divide by zero")
+        return wrapped(operand(other) / self.data)
+
+    def __repr__(self):
+        return repr(self.data.tolist())
+
+
+class NumericArray(NumPyValue):
+    # An array of numbers in a 1-D NumPy array. Reading an element gives back a Python
+    # number, and the array prints like a list.
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.data.tolist())
+
+    def __getitem__(self, index):
+        return self.data[index].item()
+
+    def __setitem__(self, index, value):
+        self.data = widened(self.data, value)
+        self.data[index] = value
+
+    def __contains__(self, value):
+        return bool((self.data == value).any())
+
+    def index(self, value):
+        positions = numpy.flatnonzero(self.data == value)
+        if not len(positions):
+            raise ValueError(f"{value!r} is not in list")
+        return int(positions[0])
+
+    # The in-place builtins copy the NumPy array, so growing one element at a time is
+    # slower than with a list; they are here so that list code keeps working
+
+    def append(self, value):
+        self.data = numpy.append(widened(self.data, value), value)
+
+    def insert(self, index, value):
+        self.data = numpy.insert(widened(self.data, value), index, value)
+
+    def remove(self, value):
+        self.data = numpy.delete(self.data, self.index(value))
+
+
+class Matrix(NumPyValue):
+    # A 2-D grid of numbers in a NumPy array. Matrices cannot be changed in place, like
+    # tuples; the builtins and operators return new ones. Iterating a matrix gives its
+    # rows as numeric arrays, and it prints like an array of arrays.
+    __slots__ = ()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return (NumericArray(row.copy()) for row in self.data)
+
+
+def wrapped(result):
+    # The interpreter value for the result of a NumPy operation
+    if isinstance(result, numpy.ndarray):
+        if result.ndim == 2:
+            return Matrix(result)
+        if result.ndim == 1:
+            return NumericArray(result)
+        return result.item()
+    if isinstance(result, numpy.generic):
+        return result.item()
+    return result
+
+
+def operand(value):
+    # The NumPy form of the other operand of an element-wise operation
+    if isinstance(value, NumPyValue):
+        return value.data
+    if isinstance(value, LazyRange):
+        return numpy.asarray(value.range)
+    if isinstance(value, (list, TypedArray)):
+        return numpy.array(value)
+    return value
+
+
+def widened(data, value):
+    # data, converted to a type that can hold value without truncating it
+    if isinstance(value, float) and data.dtype.kind in 'biu':
+        return data.astype(float)
+    if isinstance(value, int) and not isinstance(value, bool) and data.dtype.kind == 'b':
+        return data.astype(numpy.int64)
+    if not isinstance(value, (int, float)):
+        raise ValueError("Numeric arrays can only hold numbers")
+    return data
+
+
+def element_wise(operation):
+    def apply(self, other):
+        return wrapped(operation(self.data, operand(other)))
+
+    def apply_reflected(self, other):
+        return wrapped(operation(operand(other), self.data))
+    return apply, apply_reflected
+
+
+for _name, _operation in (('add', operator.add), ('sub', operator.sub), ('mul', operator.mul)):
+    _apply, _apply_reflected = element_wise(_operation)
+    setattr(NumPyValue, f'__{_name}__', _apply)
+    setattr(NumPyValue, f'__r{_name}__', _apply_reflected)
+for _name, _operation in (('gt', operator.gt), ('lt', operator.lt), ('eq', operator.eq), ('ne', operator.ne)):
+    setattr(NumPyValue, f'__{_name}__', element_wise(_operation)[0])
+
+
+def require_numpy(function_name):
+    if numpy is None:
+        raise ValueError(f"{function_name} needs NumPy, which is not installed")
+
+
+def numeric_data(value, function_name):
+    # The NumPy array for an interpreter value of numbers: a matrix, a numeric array, or
+    # an array, range, tuple or stream of numbers or of equally long rows of numbers
+    require_numpy(function_name)
+    if isinstance(value, NumPyValue):
+        return value.data
+    if isinstance(value, LazyRange):
+        return numpy.asarray(value.range)
+    if isinstance(value, TypedArray):
+        return numpy.array(value)
+    if isinstance(value, Stream):
+        value = list(value)
+    if not isinstance(value, (list, tuple, PersistentVector)):
+        raise ValueError(f"Argument to {function_name} must be a matrix or an array of numbers")
+    row_types = (list, tuple, PersistentVector, LazyRange, NumericArray, TypedArray)
+    rows = [list(row) if isinstance(row, row_types) else row for row in value]
+    try:
+        data = numpy.array(rows)
+    except (ValueError, OverflowError):
+        raise ValueError(f"Argument to {function_name} must have rows of equal length, of numbers") from None
+    if data.dtype.kind not in 'biuf' or data.ndim > 2:
+        raise ValueError(f"Argument to {function_name} must have rows of equal length, of numbers")
+    return data
+
+
+def numeric_array(values):
+    # The NumericArray of values, which must all be numbers. Unlike numeric_literal, this
+    # has no list fallback: the numarray builtin asks for element-wise arithmetic.
+    require_numpy('numarray')
+    values = list(values)
+    if not all(isinstance(value, (int, float)) for value in values):
+        raise ValueError("Numeric arrays can only hold numbers")
+    try:
+        return NumericArray(numpy.array(values))
+    except OverflowError:
+        raise ValueError("Integer too large for a numeric array") from None
+
+
+def numeric_literal(elements):
+    # The value of an array literal when numeric arrays are enabled: a NumericArray if
+    # every element is an int, or every element is a float, and a list otherwise
+    if numpy is None or not elements:
+        return elements
+    kind = type(elements[0])
+    if kind is int:
+        if not all(type(element) is int and INT64_MIN <= element <= INT64_MAX for element in elements):
+            return elements
+    elif kind is not float or not all(type(element) is float for element in elements):
+        return elements
+    return NumericArray(numpy.array(elements))
+
+
+# Matrix operations behind the matrix builtins. Each takes the interpreter values the
+# builtin was given, which the builtin has already checked for count and type.
+
+def matrix_of(value, function_name):
+    data = numeric_data(value, function_name)
+    if data.ndim != 2:
+        raise ValueError(f"Argument to {function_name} must be a matrix or an array of rows")
+    return Matrix(data)
+
+
+def zeros_matrix(rows, columns):
+    require_numpy('matrixZeros')
+    return Matrix(numpy.zeros((rows, columns), dtype=numpy.int64))
+
+
+def identity_matrix(size):
+    require_numpy('identity')
+    return Matrix(numpy.identity(size, dtype=numpy.int64))
+
+
+def matrix_row(matrix, index):
+    return NumericArray(matrix.data[index].copy())
+
+
+def matrix_column(matrix, index):
+    return NumericArray(matrix.data[:, index].copy())
+
+
+def matrix_element(matrix, row, column):
+    return matrix.data[row, column].item()
+
+
+def submatrix(matrix, first_row, end_row, first_column, end_column):
+    # Rows first_row to end_row and columns first_column to end_column, ends excluded
+    return Matrix(matrix.data[first_row:end_row, first_column:end_column].copy())
+
+
+def transpose(matrix):
+    return Matrix(matrix.data.T.copy())
+
+
+def matmul(left, right):
+    # Matrix product; either side may also be a vector of numbers
+    left_data, right_data = numeric_data(left, 'matmul'), numeric_data(right, 'matmul')
+    if left_data.shape[-1] != right_data.shape[0]:
+        raise ValueError(f"Cannot multiply shapes {left_data.shape} and {right_data.shape}")
+    return wrapped(left_data @ right_data)
+
+
+def dot(left, right):
+    # Inner product of two vectors of numbers
+    left_data, right_data = numeric_data(left, 'dot'), numeric_data(right, 'dot')
+    if left_data.ndim != 1 or right_data.ndim != 1:
+        raise ValueError("Arguments to dot must be arrays of numbers; use matmul for matrices")
+    if len(left_data) != len(right_data):
+        raise ValueError(f"Arguments to dot must have the same length, not {len(left_data)} and {len(right_data)}")
+    return numpy.dot(left_data, right_data).item()
+
+
+def reduce_numbers(value, function_name, reduction, axis=None):
+    # numpy.sum, min, max or mean of all the numbers, or along axis 0 (one result per
+    # column) or 1 (one result per row)
+    data = numeric_data(value, function_name)
+    if axis is not None and not 0 <= axis < data.ndim:
+        raise ValueError(f"Axis of {function_name} must be 0 or 1 for a matrix, or 0 for an array")
+    if not data.size:
+        raise ValueError(f"Argument to {function_name} must not be empty")
+    return wrapped(getattr(numpy, reduction)(data, axis=axis))
@@ -0,0 +1,509 @@
+# VM: Compiles the syntax tree to bytecode and runs it on a stack machine
+from array import array
+
+from main import BINARY_OPERATORS, BINDER_BUILTINS, ITEM_TYPES, NAME_BUILTINS, SPECIALISED_BUILTINS, Interpreter
+from values import PersistentVector, numeric_literal
+
+# Every instruction is two ints in CodeObject.instructions: an opcode and its argument
+OPCODES = (
+    'LOAD_CONST',         # push constants[arg]
+    'LOAD_NAME',          # push the variable names[arg]
+    'STORE_NAME',         # pop into the variable names[arg]
+    'BINARY',             # pop right and left, push OPERATIONS[arg](left, right)
+    'UNARY_NEGATIVE',     # negate the top of the stack
+    'BUILD_LIST',         # pop arg values into a list
+    'BUILD_TUPLE',        # pop arg values into a tuple value (a persistent vector)
+    'BUILD_MAP',          # pop arg key/value pairs into a dict
+    'BUILD_SET',          # pop arg values into a set
+    'LOAD_ITEM',          # pop an index, push the array names[arg] at that index
+    'STORE_ITEM',         # pop a value and an index, store into the array names[arg]
+    'LOAD_ITEM_FOR_UPDATE',  # pop an index, push the array names[arg], the index and its item
+    'STORE_SUBSCRIPT',    # pop a value, an index and an array, store the value at the index
+    'CALL_BUILTIN',       # call the builtin described by constants[arg] (see call_template)
+    'CALL_SPECIALISED',   # (function, count) = constants[arg]: pop count values, push function(*values)
+    'PRINT',              # pop and print
+    'POP_TOP',            # discard the top of the stack
+    'JUMP',               # continue at instruction arg
+    'POP_JUMP_IF_FALSE',  # pop, and continue at instruction arg if it is falsy
+    'GET_ITER',           # replace the top of the stack with an iterator over it
+    'FOR_ITER',           # push the iterator's next value, or pop it and jump to arg
+    'EVAL_NODE',          # push the tree-walker's value for the expression constants[arg]
+    'LOAD_FUNCTION',      # push the user-defined function named constants[arg]
+    'CALL_FUNCTION',      # pop arg values and a function, push the result of calling it
+    'RETURN_VALUE',       # pop and return from the function body being run
+    'DEFINE',             # define the function of the DEF statement constants[arg]
+    'DELETE_NAME',        # remove the variable names[arg], if it is set
+    # Superinstructions for the most common shapes; constants[arg] holds the operands
+    'BINARY_NAME_CONST',  # (operation, name, value): push operation(variable, value)
+    'BINARY_NAME_NAME',   # (operation, name, other): push operation(variable, other variable)
+    'BINARY_CONST',       # (operation, value): replace the top with operation(top, value)
+    'ASSIGN_NAME_CONST',  # (operation, name, value, target): target = operation(variable, value)
+    'JUMP_UNLESS_NAME_CONST',  # [operation, name, value, target]: jump unless operation(...)
+)
+(LOAD_CONST, LOAD_NAME, STORE_NAME, BINARY, UNARY_NEGATIVE, BUILD_LIST, BUILD_TUPLE,
+ BUILD_MAP, BUILD_SET, LOAD_ITEM, STORE_ITEM, LOAD_ITEM_FOR_UPDATE, STORE_SUBSCRIPT, CALL_BUILTIN,
+ CALL_SPECIALISED, PRINT, POP_TOP, JUMP, POP_JUMP_IF_FALSE,
+ GET_ITER, FOR_ITER, EVAL_NODE, LOAD_FUNCTION, CALL_FUNCTION, RETURN_VALUE, DEFINE, DELETE_NAME,
+ BINARY_NAME_CONST, BINARY_NAME_NAME, BINARY_CONST, ASSIGN_NAME_CONST,
+ JUMP_UNLESS_NAME_CONST) = range(len(OPCODES))
+
+# Binary operator nodes. Every operation is a call here, so INT_ADD of the types pass
+# gains nothing over '+' and runs as '+'.
+BINARY_OPERATIONS = {**BINARY_OPERATORS, 'INT_ADD': BINARY_OPERATORS['+']}
+OPERATOR_NAMES = tuple(BINARY_OPERATIONS)
+OPERATIONS = tuple(BINARY_OPERATIONS.values())
+OPERATOR_INDEX = {name: index for index, name in enumerate(OPERATOR_NAMES)}
+OPERATION_NAMES = {operation: name for name, operation in BINARY_OPERATORS.items()}
+
+# Marks an argument of CALL_BUILTIN that is taken from the stack
+STACK_ARGUMENT = object()
+
+
+class CodeObject:
+    __slots__ = ('instructions', 'constants', 'names')
+
+    def __init__(self):
+        self.instructions = array('i')
+        self.constants = []
+        self.names = []
+
+
+class Compiler:
+    def __init__(self, builtins, lazy_builtins=Interpreter.lazy_builtins):
+        self.builtins = builtins
+        self.lazy_builtins = lazy_builtins
+        self.code = CodeObject()
+        self.constant_index = {}
+        self.name_index = {}
+        # Per enclosing loop: (continue target, break jumps to patch, whether an
+        # iterator is on the stack)
+        self.loops = []
+
+    def compile_program(self, statements):
+        for statement in statements:
+            self.compile_statement(statement)
+        return self.code
+
+    # Emitting
+
+    def emit(self, opcode, arg=0):
+        self.code.instructions.extend((opcode, arg))
+        return len(self.code.instructions) - 2
+
+    def position(self):
+        return len(self.code.instructions)
+
+    def patch(self, instruction, target):
+        if self.code.instructions[instruction] == JUMP_UNLESS_NAME_CONST:
+            self.code.constants[self.code.instructions[instruction + 1]][3] = target
+        else:
+            self.code.instructions[instruction + 1] = target
+
+    def compile_jump_unless(self, condition):
+        # Emits the test of an IF or WHILE and returns the jump to patch with the exit
+        if condition[0] in OPERATOR_INDEX and condition[1][0] == 'IDENTIFIER' and condition[2][0] == 'NUMBER':
+            # A list is never shared between instructions, so its target can be patched
+            operands = [BINARY_OPERATIONS[condition[0]], condition[1][1], condition[2][1], 0]
+            return self.emit(JUMP_UNLESS_NAME_CONST, self.constant(operands))
+        self.compile_expression(condition)
+        return self.emit(POP_JUMP_IF_FALSE)
+
+    def constant(self, value):
+        # The type is part of the key so that 1, 1.0 and True stay distinct
+        try:
+            key = (type(value), value)
+            index = self.constant_index.get(key)
+        except TypeError:
+            key = index = None
+        if index is None:
+            index = len(self.code.constants)
+            self.code.constants.append(value)
+            if key is not None:
+                self.constant_index[key] = index
+        return index
+
+    def name(self, name):
+        index = self.name_index.get(name)
+        if index is None:
+            index = self.name_index[name] = len(self.code.names)
+            self.code.names.append(name)
+        return index
+
+    # Statements
+
+    def compile_block(self, statements):
+        for statement in statements:
+            self.compile_statement(statement)
+
+    def compile_statement(self, statement):
+        kind = statement[0]
+        if kind == 'ASSIGN':
+            value = statement[2]
+            # `i = i + 1` compiles to a single instruction
+            if value[0] in OPERATOR_INDEX and value[1][0] == 'IDENTIFIER' and value[2][0] == 'NUMBER':
+                operands = (BINARY_OPERATIONS[value[0]], value[1][1], value[2][1], statement[1])
+                self.emit(ASSIGN_NAME_CONST, self.constant(operands))
+                return
+            self.compile_expression(value)
+            self.emit(STORE_NAME, self.name(statement[1]))
+        elif kind == 'ARRAY_ASSIGN':
+            self.compile_expression(statement[2])
+            self.compile_expression(statement[3])
+            self.emit(STORE_ITEM, self.name(statement[1]))
+        elif kind == 'AUG_ASSIGN':
+            # `x += value` runs as `x = x + value`, which reads x once and gets the
+            # fused instructions of plain assignments
+            name = statement[1]
+            self.compile_statement(('ASSIGN', name, (statement[2], ('IDENTIFIER', name), statement[3])))
+        elif kind == 'ARRAY_AUG_ASSIGN':
+            # The index is evaluated once; the array stays on the stack until the store
+            self.compile_expression(statement[2])
+            self.emit(LOAD_ITEM_FOR_UPDATE, self.name(statement[1]))
+            self.compile_expression(statement[4])
+            self.emit(BINARY, OPERATOR_INDEX[statement[3]])
+            self.emit(STORE_SUBSCRIPT)
+        elif kind == 'IF':
+            jump_to_else = self.compile_jump_unless(statement[1])
+            self.compile_block(statement[2])
+            if statement[3]:
+                jump_to_end = self.emit(JUMP)
+                self.patch(jump_to_else, self.position())
+                self.compile_block(statement[3])
+                self.patch(jump_to_end, self.position())
+            else:
+                self.patch(jump_to_else, self.position())
+        elif kind == 'WHILE':
+            start = self.position()
+            jump_to_end = self.compile_jump_unless(statement[1])
+            breaks = self.compile_loop_body(statement[2], start, False)
+            self.emit(JUMP, start)
+            self.patch(jump_to_end, self.position())
+            for jump in breaks:
+                self.patch(jump, self.position())
+        elif kind == 'FOR':
+            self.compile_expression(statement[2])
+            self.emit(GET_ITER)
+            start = self.emit(FOR_ITER)
+            self.emit(STORE_NAME, self.name(statement[1]))
+            breaks = self.compile_loop_body(statement[3], start, True)
+            self.emit(JUMP, start)
+            self.patch(start, self.position())
+            for jump in breaks:
+                self.patch(jump, self.position())
+        elif kind == 'BREAK':
+            _, breaks, iterates = self.loops[-1]
+            if iterates:
+                self.emit(POP_TOP)  # the loop's iterator, which FOR_ITER pops when it ends
+            breaks.append(self.emit(JUMP))
+        elif kind == 'CONTINUE':
+            self.emit(JUMP, self.loops[-1][0])
+        elif kind == 'PRINT':
+            self.compile_expression(statement[1])
+            self.emit(PRINT)
+        elif kind == 'DEF':
+            self.emit(DEFINE, self.constant(statement))
+        elif kind == 'RETURN':
+            if statement[1] is None:
+                self.emit(LOAD_CONST, self.constant(None))
+            else:
+                self.compile_expression(statement[1])
+            self.emit(RETURN_VALUE)
+        elif kind == 'DELETE':
+            for name in statement[1]:
+                self.emit(DELETE_NAME, self.name(name))
+        else:
+            # Expression statements (including function calls)
+            self.compile_expression(statement)
+            self.emit(POP_TOP)
+
+    def compile_loop_body(self, body, start, iterates):
+        # Compiles a loop body, where continue jumps to start; returns the jumps of its
+        # breaks, for the caller to patch with the position after the loop
+        self.loops.append((start, [], iterates))
+        self.compile_block(body)
+        return self.loops.pop()[1]
+
+    # Expressions
+
+    def compile_expression(self, expression):
+        # Post-order walk with an explicit stack, so deeply nested expressions compile
+        # without recursion. Entries are nodes to visit, or (opcode, arg) to emit.
+        pending = [expression]
+        while pending:
+            node = pending.pop()
+            if node[0] is None:
+                self.emit(*node[1])
+                continue
+            kind = node[0]
+            if kind == 'NUMBER' or kind == 'STRING':
+                self.emit(LOAD_CONST, self.constant(node[1]))
+            elif kind == 'IDENTIFIER':
+                self.emit(LOAD_NAME, self.name(node[1]))
+            elif kind in OPERATOR_INDEX:
+                operation = BINARY_OPERATIONS[kind]
+                left, right = node[1], node[2]
+                if left[0] == 'IDENTIFIER' and right[0] == 'NUMBER':
+                    self.emit(BINARY_NAME_CONST, self.constant((operation, left[1], right[1])))
+                elif left[0] == 'IDENTIFIER' and right[0] == 'IDENTIFIER':
+                    self.emit(BINARY_NAME_NAME, self.constant((operation, left[1], right[1])))
+                elif right[0] == 'NUMBER':
+                    pending.append((None, (BINARY_CONST, self.constant((operation, right[1])))))
+                    pending.append(left)
+                else:
+                    pending.append((None, (BINARY, OPERATOR_INDEX[kind])))
+                    pending.append(right)
+                    pending.append(left)
+            elif kind == 'UMINUS':
+                pending.append((None, (UNARY_NEGATIVE, 0)))
+                pending.append(node[1])
+            elif kind == 'ARRAY' or kind == 'TUPLE':
+                opcode = BUILD_LIST if kind == 'ARRAY' else BUILD_TUPLE
+                pending.append((None, (opcode, len(node[1]))))
+                pending.extend(reversed(node[1]))
+            elif kind == 'DICT':
+                pending.append((None, (BUILD_MAP, len(node[1]))))
+                for key, value in reversed(list(zip(node[1], node[2]))):
+                    pending.append(value)
+                    pending.append(key)
+            elif kind == 'SET':
+                pending.append((None, (BUILD_SET, len(node[1]))))
+                pending.extend(reversed(node[1]))
+            elif kind == 'ARRAY_ACCESS':
+                pending.append((None, (LOAD_ITEM, self.name(node[1][1]))))
+                pending.append(node[2])
+            elif kind == 'FUNCTION_CALL' and node[1] in self.builtins:
+                template, stack_args = self.call_template(node)
+                pending.append((None, (CALL_BUILTIN, self.constant((node[1], template)))))
+                pending.extend(reversed(stack_args))
+            elif kind in SPECIALISED_BUILTINS:
+                # Guarded builtins of the types pass take their arguments as plain values
+                args = node[1:]
+                pending.append((None, (CALL_SPECIALISED, self.constant((SPECIALISED_BUILTINS[kind], len(args))))))
+                pending.extend(reversed(args))
+            elif kind == 'FUNCTION_CALL':
+                # Other names are user-defined functions; unknown ones raise from
+                # LOAD_FUNCTION before any argument runs
+                pending.append((None, (CALL_FUNCTION, len(node[2]))))
+                pending.extend(reversed(node[2]))
+                pending.append((None, (LOAD_FUNCTION, self.constant(node[1]))))
+            else:
+                self.emit(EVAL_NODE, self.constant(node))
+
+    def call_template(self, expression):
+        # Arguments are evaluated onto the stack and handed to the builtin as VALUE
+        # nodes. Arguments that name a variable (the array of append/remove/add, the
+        # variables of map/filter/reduce) and expressions a binder evaluates once per
+        # element are passed as they are. Arguments a lazy builtin may skip are
+        # compiled on their own and passed as CODE nodes, which run only if evaluated.
+        name, args = expression[1], expression[2]
+        names, lazy = BINDER_BUILTINS.get(name, (int(name in NAME_BUILTINS), None))
+        thunks = self.lazy_builtins.get(name, ())
+        template = []
+        stack_args = []
+        for position, arg in enumerate(args):
+            if position < names or position == lazy:
+                template.append(arg)
+            elif position in thunks:
+                template.append(('CODE', self.compile_thunk(arg)))
+            else:
+                template.append(STACK_ARGUMENT)
+                stack_args.append(arg)
+        return tuple(template), stack_args
+
+    def compile_thunk(self, expression):
+        compiler = Compiler(self.builtins, self.lazy_builtins)
+        compiler.compile_expression(expression)
+        compiler.emit(RETURN_VALUE)
+        return compiler.code
+
+
+def disassemble(code):
+    lines = []
+    instructions = code.instructions
+    for offset in range(0, len(instructions), 2):
+        opcode, arg = instructions[offset], instructions[offset + 1]
+        name = OPCODES[opcode]
+        if opcode in (LOAD_NAME, STORE_NAME, LOAD_ITEM, STORE_ITEM, LOAD_ITEM_FOR_UPDATE, DELETE_NAME):
+            detail = code.names[arg]
+        elif opcode in (LOAD_CONST, EVAL_NODE, LOAD_FUNCTION):
+            detail = repr(code.constants[arg])
+        elif opcode == DEFINE:
+            detail = code.constants[arg][1]
+        elif opcode == CALL_BUILTIN:
+            detail = code.constants[arg][0]
+        elif opcode == CALL_SPECIALISED:
+            detail = code.constants[arg][0].__name__
+        elif opcode == BINARY:
+            detail = OPERATOR_NAMES[arg]
+        elif opcode in (BINARY_NAME_CONST, BINARY_NAME_NAME, BINARY_CONST, ASSIGN_NAME_CONST,
+                        JUMP_UNLESS_NAME_CONST):
+            operation, *operands = code.constants[arg]
+            if opcode == BINARY_CONST:
+                operands.insert(0, '<top>')
+            detail = f"{operands[0]} {OPERATION_NAMES[operation]} {operands[1]!r}"
+            if opcode == ASSIGN_NAME_CONST:
+                detail = f"{operands[2]} = {detail}"
+            elif opcode == JUMP_UNLESS_NAME_CONST:
+                detail = f"{detail}, else to {operands[2]}"
+        elif opcode in (JUMP, POP_JUMP_IF_FALSE, FOR_ITER):
+            detail = f"to {arg}"
+        else:
+            detail = ''
+        lines.append(f"{offset:6} {name:<22} {arg:<6} {detail}".rstrip())
+    return '\n'.join(lines)
+
+
+# VMInterpreter: Runs compiled bytecode, sharing variables and builtins with Interpreter
+class VMInterpreter(Interpreter):
+    def compile(self, statements):
+        return Compiler(self.builtins, self.lazy_builtins).compile_program(statements)
+
+    def evaluate(self):
+        for statement in self.syntax_tree:
+            self.run(self.compile([statement]))
+
+    def evaluate_expression(self, expression):
+        # Builtin arguments taken from the stack arrive as ('VALUE', value) nodes, and
+        # lazily evaluated ones as ('CODE', code) nodes
+        if expression[0] == 'VALUE':
+            return expression[1]
+        if expression[0] == 'CODE':
+            return self.run(expression[1])
+        return Interpreter.evaluate_expression(self, expression)
+
+    def execute_body(self, function, body=None):
+        # Function bodies are compiled on their first call; RETURN_VALUE ends run
+        if function.compiled is None:
+            function.compiled = self.compile(function.body)
+        return self.run(function.compiled)
+
+    def run(self, code):
+        instructions = code.instructions
+        constants = code.constants
+        names = code.names
+        variables = self.variables
+        operations = OPERATIONS
+        lookup_array = self.lookup_array
+        lookup_sequence = self.lookup_sequence
+        numeric_arrays = self.numeric_arrays
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        end = len(instructions)
+        while pc < end:
+            opcode = instructions[pc]
+            arg = instructions[pc + 1]
+            pc += 2
+            # Ordered by how often each instruction runs in loop-heavy code
+            if opcode == BINARY_NAME_CONST:
+                operation, name, value = constants[arg]
+                push(operation(variables[name], value))
+            elif opcode == JUMP_UNLESS_NAME_CONST:
+                operation, name, value, target = constants[arg]
+                if not operation(variables[name], value):
+                    pc = target
+            elif opcode == POP_JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif opcode == LOAD_NAME:
+                push(variables[names[arg]])
+            elif opcode == ASSIGN_NAME_CONST:
+                operation, name, value, target = constants[arg]
+                variables[target] = operation(variables[name], value)
+            elif opcode == STORE_NAME:
+                variables[names[arg]] = pop()
+            elif opcode == JUMP:
+                pc = arg
+            elif opcode == BINARY:
+                right = pop()
+                stack[-1] = operations[arg](stack[-1], right)
+            elif opcode == BINARY_NAME_NAME:
+                operation, name, other = constants[arg]
+                push(operation(variables[name], variables[other]))
+            elif opcode == LOAD_CONST:
+                push(constants[arg])
+            elif opcode == BINARY_CONST:
+                operation, value = constants[arg]
+                stack[-1] = operation(stack[-1], value)
+            elif opcode == FOR_ITER:
+                for value in stack[-1]:
+                    push(value)
+                    break
+                else:
+                    pop()
+                    pc = arg
+            elif opcode == LOAD_ITEM:
+                index = pop()
+                push(lookup_sequence(names[arg])[index])
+            elif opcode == STORE_ITEM:
+                value = pop()
+                index = pop()
+                lookup_array(names[arg], ITEM_TYPES)[index] = value
+            elif opcode == LOAD_ITEM_FOR_UPDATE:
+                index = stack[-1]
+                array = lookup_array(names[arg], ITEM_TYPES)
+                stack[-1] = array
+                push(index)
+                push(array[index])
+            elif opcode == STORE_SUBSCRIPT:
+                value = pop()
+                index = pop()
+                pop()[index] = value
+            elif opcode == CALL_BUILTIN:
+                name, template = constants[arg]
+                args = []
+                count = template.count(STACK_ARGUMENT)
+                values = iter(stack[len(stack) - count:]) if count else None
+                for item in template:
+                    args.append(('VALUE', next(values)) if item is STACK_ARGUMENT else item)
+                if count:
+                    del stack[len(stack) - count:]
+                push(self.builtins[name](self, args))
+            elif opcode == CALL_SPECIALISED:
+                function, count = constants[arg]
+                if count == 1:
+                    stack[-1] = function(stack[-1])
+                else:
+                    right = pop()
+                    stack[-1] = function(stack[-1], right)
+            elif opcode == POP_TOP:
+                pop()
+            elif opcode == PRINT:
+                print(pop())
+            elif opcode == UNARY_NEGATIVE:
+                stack[-1] = -stack[-1]
+            elif opcode == BUILD_LIST:
+                values = stack[len(stack) - arg:] if arg else []
+                del stack[len(stack) - arg:]
+                push(numeric_literal(values) if numeric_arrays else values)
+            elif opcode == BUILD_TUPLE:
+                values = PersistentVector(stack[len(stack) - arg:] if arg else ())
+                del stack[len(stack) - arg:]
+                push(values)
+            elif opcode == BUILD_MAP:
+                items = stack[len(stack) - 2 * arg:]
+                del stack[len(stack) - 2 * arg:]
+                push(dict(zip(items[::2], items[1::2])))
+            elif opcode == BUILD_SET:
+                values = set(stack[len(stack) - arg:])
+                del stack[len(stack) - arg:]
+                push(values)
+            elif opcode == GET_ITER:
+                stack[-1] = iter(stack[-1])
+            elif opcode == EVAL_NODE:
+                push(self.evaluate_expression(constants[arg]))
+            elif opcode == LOAD_FUNCTION:
+                push(self.lookup_function(constants[arg]))
+            elif opcode == CALL_FUNCTION:
+                args = stack[len(stack) - arg:] if arg else []
+                del stack[len(stack) - arg:]
+                push(self.call_function(pop(), args))
+            elif opcode == RETURN_VALUE:
+                return pop()
+            elif opcode == DEFINE:
+                self.evaluate_function_definition(constants[arg])
+            elif opcode == DELETE_NAME:
+                variables.pop(names[arg], None)
+            else:
+                raise ValueError(f"Unknown opcode: {opcode}")